@@ -182,9 +182,15 @@ docker pull jamesrule4/django-app:latest
 echo "Starting Django container..."
 docker-compose up -d
 
-# Wait for container to be ready
+# Wait for container to be ready - it bootstraps the database, then serves
 echo "Waiting for container to start..."
-sleep 15
+for i in $(seq 1 60); do
+    if curl -fs -o /dev/null http://localhost:8000/login/; then
+        echo "Container ready after ${i}s"
+        break
+    fi
+    sleep 1
+done
 
 # Check container status
 echo "Container status:"
@@ -305,6 +311,11 @@ except Exception as e:
     print("This may be normal if AD is still initializing")
 
 PYTHON_EOF
+
+# Per-phase LDAP latency (DNS, connect, binds, searches)
+echo "Measuring LDAP login latency..."
+docker-compose exec -T django python manage.py ldap_probe --username testuser --iterations 5 || \
+    echo "⚠️  LDAP probe failed - AD may still be initializing"
 LDAP_TEST
 
 else
@@ -0,0 +1,218 @@
+"""
+The user admin, for auth_user tables that hold every account of the directory.
+
+The stock changelist counts the whole table for its paginator, and again for
+the "N total" link. It searches with icontains over four columns, which no
+index can serve, so every search reads every row. It also pages with OFFSET,
+which reads every row before the page. All of these grow with the table
+(see benchmarks/user_admin.py). UserAdmin instead:
+
+- counts with EstimatedCountPaginator: MAX(id) for the unfiltered table
+  (ldap_sync never deletes users, so it is close), and an exact count of at
+  most COUNT_LIMIT rows when there is a search or a filter
+- pages with Previous and Next links that carry a cursor, the sort key of the
+  row the page starts after (?after=) or ends before (?before=), which an
+  index finds directly
+- searches by prefix (istartswith) over the username and the fields of
+  AUTH_LDAP_USER_ATTR_MAP, through the NOCASE indexes of migration 0003
+- sorts only by the columns that have a (column, username) index in
+  migration 0003
+"""
+
+import base64
+import json
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+# Searches and filters are counted exactly up to this many rows
+COUNT_LIMIT = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator whose count never reads the whole table. estimated is set when
+    count is MAX(id), and capped when there are more than COUNT_LIMIT rows.
+    """
+
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            # The last entry of the primary key index
+            self.estimated = True
+            return queryset.aggregate(last=Max('pk'))['last'] or 0
+
+        count = queryset[:COUNT_LIMIT + 1].count()
+        if count > COUNT_LIMIT:
+            self.capped = True
+            return COUNT_LIMIT
+        return count
+
+
+def keyset_fields(opts, ordering):
+    """
+    Returns the (name, field, descending) of each part of ordering up to the
+    first unique field, or None if the ordering cannot be paged by cursor:
+    an expression, a relation, a nullable field, or no unique field at all.
+    """
+    keys = []
+    for part in ordering:
+        if not isinstance(part, str):
+            return None
+        name = part.lstrip('-')
+        try:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.null or field.is_relation:
+            return None
+
+        keys.append((name, field, part.startswith('-')))
+        if field.unique:
+            return keys
+
+    return None
+
+
+def encode_cursor(obj, keys):
+    """The cursor for the position of obj in the order of keys."""
+    values = [field.value_to_string(obj) for _, field, _ in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [field.to_python(value) for (_, field, _), value in zip(keys, values)]
+    except (ValueError, ValidationError):
+        raise IncorrectLookupParameters
+
+
+def keyset_filter(keys, values, forward=True):
+    """The rows after values in the order of keys, or before them if not forward."""
+    terms = []
+    equal = Q()
+    for (name, _, descending), value in zip(keys, values):
+        lookup = 'lt' if descending == forward else 'gt'
+        terms.append(equal & Q(**{'{}__{}'.format(name, lookup): value}))
+        equal &= Q(**{name: value})
+
+    # The terms alone are an OR that SQLite checks row by row; a range on the
+    # leading column lets it seek to the cursor in the index first
+    name, _, descending = keys[0]
+    bound = Q(**{'{}__{}'.format(name, 'lte' if descending == forward else 'gte'): values[0]})
+    return bound & reduce(operator.or_, terms)
+
+
+class UserChangeList(ChangeList):
+    """A ChangeList paged by cursor (?after= / ?before=) instead of page number."""
+
+    keyset = False
+    next_url = None
+    previous_url = None
+    first_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting, filtering and searching start again from the first page
+        return super().get_query_string(new_params, [AFTER_VAR, BEFORE_VAR, *(remove or [])])
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        # Ties are broken by the default ordering (username), or by -pk.
+        # Running those in the direction of the sort lets one index on
+        # (column, username) serve both directions.
+        if ORDER_VAR in self.params and ordering and isinstance(ordering[0], str):
+            prefix = '-' if ordering[0].startswith('-') else ''
+            tie_breaks = {'pk', *(part.lstrip('-') for part in self.model_admin.get_ordering(request))}
+            ordering = ordering[:1] + [
+                prefix + part.lstrip('-') if isinstance(part, str) and part.lstrip('-') in tie_breaks else part
+                for part in ordering[1:]
+            ]
+        return ordering
+
+    def get_results(self, request):
+        keys = keyset_fields(self.lookup_opts, self.queryset.query.order_by)
+        if keys is None:
+            return super().get_results(request)
+
+        after, before = request.GET.get(AFTER_VAR), request.GET.get(BEFORE_VAR)
+        queryset = self.queryset
+        if after or before:
+            values = decode_cursor(after or before, keys)
+            queryset = queryset.filter(keyset_filter(keys, values, forward=not before))
+        if before:
+            queryset = queryset.reverse()
+
+        # One row more than the page shows whether there is another page
+        rows = list(queryset[:self.list_per_page + 1])
+        more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if before:
+            rows.reverse()
+
+        has_next = bool(rows) and (more if not before else True)
+        has_previous = bool(rows) and (more if before else bool(after))
+        if has_next:
+            self.next_url = self.get_query_string({AFTER_VAR: encode_cursor(rows[-1], keys)})
+        if has_previous:
+            self.previous_url = self.get_query_string({BEFORE_VAR: encode_cursor(rows[0], keys)})
+            self.first_url = self.get_query_string()
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or has_previous
+        self.paginator = paginator
+
+
+User = get_user_model()
+
+
+class UserAdmin(BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_help_text = 'Finds users whose username, name or email starts with each word.'
+    sortable_by = ('username', 'email', 'first_name', 'last_name')
+
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
+    def get_search_fields(self, request):
+        # The attributes mirrored from AD; migration 0003 indexes those of
+        # the shipped AUTH_LDAP_USER_ATTR_MAP
+        names = ['username', *getattr(settings, 'AUTH_LDAP_USER_ATTR_MAP', {})]
+        return ['^' + name for name in names]
+
+
+admin.site.unregister(User)
+admin.site.register(User, UserAdmin)
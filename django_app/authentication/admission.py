@@ -0,0 +1,345 @@
+"""
+Admission control for the LDAP work of every worker on a host.
+
+At the start of the working day every gunicorn worker can be logging someone
+in at once, and nothing capped how many of their binds and searches reached
+the domain controller together. Two limits sit in front of the DC:
+
+- HostSemaphore caps the LDAP work in flight on the host at
+  AUTH_LDAP_ADMISSION_MAX_CONCURRENT. Each slot is a lock file in
+  AUTH_LDAP_ADMISSION_DIR held with flock(), so the kernel releases it if
+  the worker dies and a crash never leaks a slot. Work that finds every slot
+  taken polls for one for up to AUTH_LDAP_ADMISSION_TIMEOUT seconds and is
+  then refused.
+- TokenBuckets limits how often one username and one client address may
+  have the DC check a password (AUTH_LDAP_THROTTLE_USER_* and
+  AUTH_LDAP_THROTTLE_IP_*, per minute with a burst). The buckets are records
+  in one memory-mapped file in the same directory, so every worker draws from
+  the same ones.
+
+The directory must be shared by the workers of one host and by nothing else.
+A refusal raises AdmissionRefused, which the login view shows on its form and
+AdmissionMiddleware answers with 503 (busy) or 429 (throttled) and
+Retry-After elsewhere. The queue depth, the work in flight and the time spent
+waiting are reported to authentication.metrics.
+
+Both limits need fcntl, so they are off where it is missing (not POSIX).
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+
+from django.conf import settings as django_settings
+
+from .metrics import record_admission_in_flight, record_admission_wait, record_admission_waiting, record_throttled
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Polling for a free slot: the first retry is quick, later ones back off
+POLL_MIN = 0.002
+POLL_MAX = 0.05
+
+BUCKETS_FILE = 'buckets'
+# Records in the bucket file; a key whose record another key has taken
+# since starts again with a full bucket
+BUCKET_RECORDS = 4096
+# Key fingerprint, tokens left, time of the last update
+BUCKET_RECORD = struct.Struct('<Qdd')
+
+BUSY = 'busy'
+THROTTLED = 'throttled'
+
+
+class AdmissionRefused(Exception):
+    """LDAP work that was not let through to the domain controller."""
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        if reason == THROTTLED:
+            message = 'Too many login attempts. Please wait a minute and try again.'
+        else:
+            message = 'The directory is busy. Please try again in a few seconds.'
+        super().__init__(message)
+
+    @property
+    def status(self):
+        return 429 if self.reason == THROTTLED else 503
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] = _stats.get(counter, 0) + amount
+
+
+def admission_stats():
+    """
+    Returns this process's counters: work admitted and refused, logins
+    throttled by scope, and the total and longest wait in seconds.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+class HostSemaphore:
+    """A counting semaphore over the workers of a host, one lock file per slot."""
+
+    def __init__(self, directory, slots):
+        self.directory = directory
+        self.paths = [os.path.join(directory, 'slot-{}.lock'.format(n)) for n in range(slots)]
+
+    def try_acquire(self):
+        """Takes a free slot. Returns its file descriptor, or None if all are taken."""
+        # A random first slot spreads the workers over the files
+        first = random.randrange(len(self.paths))
+        for n in range(len(self.paths)):
+            path = self.paths[(first + n) % len(self.paths)]
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            except FileNotFoundError:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+
+        return None
+
+    def acquire(self, timeout):
+        """Takes a slot, waiting up to timeout seconds. Returns its file descriptor or None."""
+        fd = self.try_acquire()
+        if fd is not None or timeout <= 0:
+            return fd
+
+        deadline = time.monotonic() + timeout
+        delay = POLL_MIN
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+            delay = min(delay * 2, POLL_MAX)
+
+            fd = self.try_acquire()
+            if fd is not None:
+                return fd
+
+    def release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def in_use(self):
+        """How many slots are taken, by any worker on the host."""
+        taken = 0
+        for path in self.paths:
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                taken += 1
+            finally:
+                # Also releases the slot if it was free
+                os.close(fd)
+        return taken
+
+
+class TokenBuckets:
+    """
+    Token buckets shared by the workers of a host, kept in a memory-mapped
+    file of BUCKET_RECORDS fixed-size records. A key's record is chosen by a
+    keyed hash, so clients cannot pick keys that share one on purpose. Each
+    update holds a POSIX lock on the record (for the other workers) and a
+    thread lock (for the other threads of this one).
+    """
+
+    def __init__(self, path, records=BUCKET_RECORDS):
+        self.records = records
+        self._secret = hashlib.sha256(django_settings.SECRET_KEY.encode()).digest()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = records * BUCKET_RECORD.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _fingerprint(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=8, key=self._secret).digest()
+        # 0 marks a record no key has used
+        return int.from_bytes(digest, 'little') or 1
+
+    def take(self, key, rate, burst):
+        """
+        Takes a token from key's bucket, which refills at rate per second up
+        to burst. Returns 0 if there was one, otherwise the seconds until
+        there will be.
+        """
+        fingerprint = self._fingerprint(key)
+        offset = (fingerprint % self.records) * BUCKET_RECORD.size
+
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET_RECORD.size, offset)
+            try:
+                owner, tokens, updated = BUCKET_RECORD.unpack_from(self._map, offset)
+                now = time.time()
+                if owner != fingerprint:
+                    tokens, updated = burst, now
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+                BUCKET_RECORD.pack_into(self._map, offset, fingerprint, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET_RECORD.size, offset)
+
+        return wait
+
+    def refund(self, key, burst):
+        """Puts back a token taken from key's bucket, up to burst."""
+        fingerprint = self._fingerprint(key)
+        offset = (fingerprint % self.records) * BUCKET_RECORD.size
+
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET_RECORD.size, offset)
+            try:
+                owner, tokens, updated = BUCKET_RECORD.unpack_from(self._map, offset)
+                # Unless another key has taken the record over since
+                if owner == fingerprint:
+                    BUCKET_RECORD.pack_into(self._map, offset, owner, min(burst, tokens + 1), updated)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET_RECORD.size, offset)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# Set while this context holds a slot, so that nested entry points do not
+# take a second one
+_admitted = contextvars.ContextVar('authentication_admission_admitted', default=False)
+
+
+def get_buckets(directory):
+    """Returns this process's TokenBuckets for directory, opening it on first use."""
+    with _buckets_lock:
+        buckets = _buckets.get(directory)
+        if buckets is None:
+            buckets = _buckets[directory] = TokenBuckets(os.path.join(directory, BUCKETS_FILE))
+
+    return buckets
+
+
+@contextlib.contextmanager
+def admit(settings):
+    """
+    Holds one of the host's AUTH_LDAP_ADMISSION_MAX_CONCURRENT slots for the
+    duration of the block. Raises AdmissionRefused if none came free within
+    AUTH_LDAP_ADMISSION_TIMEOUT seconds. settings is the backend's
+    LDAPSettings.
+    """
+    if fcntl is None or settings.ADMISSION_MAX_CONCURRENT <= 0 or _admitted.get():
+        yield
+        return
+
+    semaphore = HostSemaphore(settings.ADMISSION_DIR, settings.ADMISSION_MAX_CONCURRENT)
+    fd = semaphore.try_acquire()
+    waited = 0.0
+    if fd is None:
+        record_admission_waiting(1)
+        start = time.perf_counter()
+        try:
+            fd = semaphore.acquire(settings.ADMISSION_TIMEOUT)
+        finally:
+            waited = time.perf_counter() - start
+            record_admission_waiting(-1)
+
+        _count('wait_seconds', waited)
+        with _stats_lock:
+            _stats['max_wait_seconds'] = max(_stats.get('max_wait_seconds', 0.0), waited)
+
+    if fd is None:
+        _count('refused')
+        record_admission_wait('refused', waited)
+        raise AdmissionRefused(BUSY, settings.ADMISSION_TIMEOUT)
+
+    _count('admitted')
+    record_admission_wait('admitted', waited)
+    record_admission_in_flight(1)
+    token = _admitted.set(True)
+    try:
+        yield
+    finally:
+        _admitted.reset(token)
+        semaphore.release(fd)
+        record_admission_in_flight(-1)
+
+
+def throttle(settings, username, request=None):
+    """
+    Takes a token from the buckets of username and of the client address of
+    request, if any. Raises AdmissionRefused if either is empty, and then
+    takes nothing: a user over their rate does not use up the address's
+    tokens, which other users behind it share, nor the other way round.
+    settings is the backend's LDAPSettings.
+    """
+    if fcntl is None:
+        return
+
+    address = request.META.get('REMOTE_ADDR') if request is not None else None
+    limits = [
+        ('ip', address, settings.THROTTLE_IP_RATE, settings.THROTTLE_IP_BURST),
+        ('user', username.lower(), settings.THROTTLE_USER_RATE, settings.THROTTLE_USER_BURST),
+    ]
+
+    taken = []
+    for scope, key, rate, burst in limits:
+        if not key or rate <= 0 or burst <= 0:
+            continue
+
+        buckets = get_buckets(settings.ADMISSION_DIR)
+        bucket = '{}:{}'.format(scope, key)
+        # Rates are configured per minute
+        wait = buckets.take(bucket, rate / 60, burst)
+        if wait:
+            for previous, previous_burst in taken:
+                buckets.refund(previous, previous_burst)
+            _count('throttled_' + scope)
+            record_throttled(scope)
+            raise AdmissionRefused(THROTTLED, wait)
+        taken.append((bucket, burst))
+
+
+def reset_admission():
+    """Forgets the bucket files in a forked child; they are reopened on first use."""
+    global _buckets_lock
+
+    _buckets.clear()
+    _buckets_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_admission)
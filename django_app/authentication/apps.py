@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+class AuthenticationConfig(AppConfig):
+    name = 'authentication'
+
+    def ready(self):
+        # Connect the logout handler that drops cached group memberships
+        from . import signals  # noqa: F401
+
+        # Tune each new SQLite connection per settings.SQLITE_PRAGMAS
+        from config.sqlite import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid='config.sqlite.apply_pragmas')
+
+        # Count and time queries for the metrics middleware
+        if settings.METRICS_ENABLED:
+            from .metrics import install_db_wrapper
+            connection_created.connect(install_db_wrapper, dispatch_uid='authentication.metrics.install_db_wrapper')
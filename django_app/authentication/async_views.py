@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.urls import reverse
+from django.contrib import messages
+
+from .admission import AdmissionRefused
+from .executor import run_ldap
+from .views import PROBE_TIME_BUDGET, PROBE_TIMEOUT, probe_iterations
+
+# Async versions of the views in authentication.views, which config.urls
+# routes to under ASGI (ASYNC_VIEWS) so that a login waiting on the domain
+# controller does not hold up other requests. LDAP calls run in the bounded
+# LDAP thread pool; session and database work runs through sync_to_async.
+# Under WSGI each of these would be run through async_to_sync, which costs
+# more than the view itself, so WSGI keeps the synchronous ones.
+
+
+def _load_user(request):
+    # request.user is lazy and loading it touches the session and the database
+    request.user.is_authenticated
+    return request.user
+
+
+async def login_view(request):
+    user = await sync_to_async(_load_user)(request)
+    if user.is_authenticated:
+        return redirect('home')
+
+    status, retry_after = 200, None
+    if request.method == 'POST':
+        try:
+            user = await run_ldap(
+                authenticate,
+                request,
+                username=request.POST.get('username', ''),
+                password=request.POST.get('password', ''),
+            )
+        except AdmissionRefused as e:
+            # The directory is saturated or the user is over their rate:
+            # say so rather than calling the password wrong
+            user = None
+            status, retry_after = e.status, e.retry_after
+            messages.error(request, str(e))
+        else:
+            if user is not None:
+                await sync_to_async(login)(request, user)
+                return redirect('home')
+            messages.error(request, 'Invalid username or password.')
+
+    response = await sync_to_async(render)(request, 'authentication/login.html', status=status)
+    if retry_after is not None:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+async def logout_view(request):
+    await sync_to_async(logout)(request)
+    messages.success(request, 'Successfully logged out.')
+    return redirect('login')
+
+async def home(request):
+    # login_required only wraps sync views before Django 5.1
+    user = await sync_to_async(_load_user)(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    return await sync_to_async(render)(request, 'authentication/home.html')
+
+async def test_ldap(request):
+    # See authentication.views.test_ldap
+    user = await sync_to_async(_load_user)(request)
+    if not (user.is_active and user.is_staff):
+        return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+
+    iterations = probe_iterations(request)
+    if iterations is None:
+        return JsonResponse({'error': 'iterations must be an integer'}, status=400)
+
+    username = request.POST.get('username') or request.GET.get('username') or user.get_username()
+    password = request.POST.get('password') or None
+
+    from .diagnostics import run_probe
+
+    report = await run_ldap(run_probe, username, password, iterations, PROBE_TIMEOUT, request, PROBE_TIME_BUDGET)
+    return JsonResponse(report, status=200 if report['ok'] else 503)
@@ -0,0 +1,498 @@
+"""
+Authentication backends for the Rule4 POC project.
+
+LDAPBackend extends django_auth_ldap's backend so that the LDAP work done for a
+login reuses connections from a per-worker pool (see authentication.pool)
+instead of connecting and binding to the domain controller from scratch,
+resolves only the group memberships the project uses (see
+authentication.groups), short-circuits repeated logins with recently seen
+credentials (see authentication.cache), does not re-mirror the attributes
+of users the bulk sync has recently brought up to date (see
+authentication.sync), moves a login to another domain controller when the
+one it is using fails (see authentication.servers), checks passwords
+against recently verified ones while no domain controller can be reached (see
+authentication.offline), and waits for one of the host's admission slots
+before it contacts a domain controller, after the username and client
+address have passed their rate limits (see authentication.admission).
+
+RealmRoutingBackend sits in front of it and ModelBackend and hands each login
+to just one of them.
+
+Both load the users of logged-in sessions from the user cache (see
+authentication.usercache).
+"""
+
+from datetime import timedelta
+
+import ldap
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.utils import timezone
+from django_auth_ldap.backend import LDAPBackend as BaseLDAPBackend
+from django_auth_ldap.backend import _LDAPUser
+
+from .admission import admit, throttle
+from .cache import FAILED, AuthResultCache
+from .groups import STRATEGIES, ScopedLDAPUserGroups
+from .metrics import instrument_connection, record_failover, record_login
+from .offline import OfflineCredentials
+from .pool import connection_options, get_pool
+from .servers import SERVER_ERRORS, any_available, failures_in_thread, ordered_servers, server_uris
+from .usercache import CachedUserMixin
+
+
+class _SyncedSettings:
+    """The backend settings with AUTH_LDAP_ALWAYS_UPDATE_USER turned off."""
+
+    ALWAYS_UPDATE_USER = False
+
+    def __init__(self, settings):
+        self._settings = settings
+
+    def __getattr__(self, name):
+        return getattr(self._settings, name)
+
+
+class _PooledLDAPUser(_LDAPUser):
+    """
+    An _LDAPUser whose service connection comes from the process pool.
+
+    The borrowed connection is already bound as AUTH_LDAP_BIND_DN and is
+    returned to the pool when each entry point finishes. User password checks
+    run on a separate credential connection so the service connection never
+    changes identity.
+
+    Each entry point runs against the best server from ordered_servers(). If
+    it raises a server error, or ends without a result after that server
+    failed (django_auth_ldap has already turned the error into a failed
+    login), it is run again from the start on the next server. A failure the
+    pool recovered from by retrying does not count. All of it, failovers
+    included, runs holding one admission slot.
+    """
+
+    _pool = None
+    _server = None
+
+    # Set when the directory rejected the user's password, as opposed to the
+    # login failing for some other reason.
+    credentials_rejected = False
+    bind_error = None
+
+    # Set when the last entry point failed because every server it tried did
+    directory_unreachable = False
+
+    _settings_override = None
+
+    @property
+    def settings(self):
+        return self._settings_override or self.backend.settings
+
+    def authenticate(self, password):
+        return self._with_failover(super().authenticate, password)
+
+    def populate_user(self):
+        return self._with_failover(super().populate_user)
+
+    def get_group_permissions(self):
+        if self._group_permissions is not None:
+            # Worked out already, or restored with a cached user
+            return self._group_permissions
+
+        if not self.settings.FIND_GROUP_PERMS:
+            # django_auth_ldap does no LDAP work for it, so there is nothing
+            # to hold a slot for: admin permission checks would only queue
+            # behind logins
+            return super().get_group_permissions()
+
+        return self._with_failover(super().get_group_permissions)
+
+    def _with_failover(self, entry_point, *args):
+        with admit(self.settings):
+            return self._run_with_failover(entry_point, *args)
+
+    def _run_with_failover(self, entry_point, *args):
+        servers = ordered_servers(self._server_uris(), self.settings)
+
+        for server in servers:
+            self._server = server
+            # Only this login's own operations count: other requests on the
+            # same server may fail or succeed meanwhile
+            with failures_in_thread() as failed_uris:
+                result, raised = None, False
+                try:
+                    result = entry_point(*args)
+                except SERVER_ERRORS:
+                    raised = True
+                    if server is servers[-1]:
+                        self.directory_unreachable = True
+                        raise
+                finally:
+                    # django_auth_ldap turns a server error into no result. A
+                    # result, or a password the server rejected, despite a
+                    # recorded failure means the pool recovered from it, e.g.
+                    # by reconnecting a stale connection.
+                    failed = raised or (
+                        not result and not self.credentials_rejected and server.uri in failed_uris
+                    )
+                    self._release_connection(discard=failed)
+
+            if not failed or server is servers[-1]:
+                self.directory_unreachable = failed
+                return result
+
+            record_failover(server.uri)
+            self._forget_directory_state()
+
+    def _forget_directory_state(self):
+        # Whatever was read before the server failed may be incomplete
+        self._user_dn = None
+        self._user_attrs = None
+        self._groups = None
+        self._group_permissions = None
+        self.credentials_rejected = False
+        self.bind_error = None
+
+    def _get_or_create_user(self, force_populate=False):
+        # A user the sync has brought up to date is loaded without
+        # re-mirroring their attributes: no populate_user signal, and no save
+        # unless a flag has changed
+        if not force_populate and self.settings.ALWAYS_UPDATE_USER and self._recently_synced():
+            self._settings_override = _SyncedSettings(self.backend.settings)
+            try:
+                super()._get_or_create_user()
+            finally:
+                self._settings_override = None
+            self._update_flags()
+            return
+
+        return super()._get_or_create_user(force_populate)
+
+    def _update_flags(self):
+        # Group memberships change the group's uSNChanged in AD, not the
+        # user's, so a revoked is_staff or is_superuser may not have reached
+        # the sync yet. With the memberof strategy this costs no LDAP request.
+        flags = list(self.settings.USER_FLAGS_BY_GROUP)
+        before = [getattr(self._user, flag) for flag in flags]
+        self._populate_user_from_group_memberships()
+        changed = [flag for flag, value in zip(flags, before) if getattr(self._user, flag) != value]
+        if changed:
+            self._user.save(update_fields=changed)
+
+    def _recently_synced(self):
+        from .models import DirectoryUser
+
+        max_age = self.settings.SYNC_MAX_AGE
+        if max_age <= 0:
+            return False
+
+        username = self.backend.ldap_to_django_username(self._username).lower()
+        return DirectoryUser.objects.filter(
+            user__username=username,
+            checkpoint__last_sync__gte=timezone.now() - timedelta(seconds=max_age),
+        ).exists()
+
+    def _authenticate_user_dn(self, password):
+        try:
+            super()._authenticate_user_dn(password)
+        except self.AuthenticationFailed as e:
+            if isinstance(e.__context__, ldap.INVALID_CREDENTIALS):
+                self.credentials_rejected = True
+                self.bind_error = e.__context__
+            raise
+
+    def directory_available(self):
+        """Whether any of the servers is in rotation."""
+        return any_available(self._server_uris(), self.settings)
+
+    def _server_uris(self):
+        uri = self.settings.SERVER_URI
+        if callable(uri):
+            uri = uri(self._request)
+
+        return server_uris(uri)
+
+    def _server_uri(self):
+        if self._server is None:
+            self._server = ordered_servers(self._server_uris(), self.settings)[0]
+
+        return self._server.uri
+
+    def _bind(self):
+        # Pooled connections are handed out already bound.
+        self._get_connection()
+
+        if not self._connection_bound:
+            super()._bind()
+
+    def _bind_as(self, bind_dn, bind_password, sticky=False):
+        if not sticky:
+            pool = get_pool(self._server_uri(), self.settings, self.ldap, bound=False)
+            pool.check_credentials(bind_dn, bind_password)
+            return
+
+        # AUTH_LDAP_BIND_AS_AUTHENTICATING_USER rebinds the search connection
+        # as the user, so it gets a private connection that is never pooled.
+        self._release_connection()
+        uri = self._server_uri()
+        self._connection = instrument_connection(
+            self._server.track(self.ldap.initialize(uri, bytes_mode=False)), uri,
+        )
+        for opt, value in connection_options(self.settings, self.ldap).items():
+            self._connection.set_option(opt, value)
+        if self.settings.START_TLS:
+            self._connection.start_tls_s()
+
+        super()._bind_as(bind_dn, bind_password, sticky=sticky)
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._pool = get_pool(self._server_uri(), self.settings, self.ldap)
+            self._connection = self._pool.acquire()
+            self._connection_bound = True
+
+        return self._connection
+
+    def _get_groups(self):
+        strategy = self.settings.GROUP_STRATEGY
+        if strategy not in STRATEGIES:
+            raise ImproperlyConfigured(
+                'AUTH_LDAP_GROUP_STRATEGY must be one of {}.'.format(', '.join(STRATEGIES))
+            )
+
+        if strategy == 'search':
+            return super()._get_groups()
+
+        if self._groups is None:
+            self._groups = ScopedLDAPUserGroups(self)
+
+        return self._groups
+
+    def _release_connection(self, discard=False):
+        if self._connection is not None:
+            if self._pool is not None and discard:
+                self._pool.discard(self._connection)
+            elif self._pool is not None:
+                self._pool.release(self._connection)
+            else:
+                try:
+                    self._connection.unbind_s()
+                except self.ldap.LDAPError:
+                    pass
+
+        self._connection = None
+        self._connection_bound = False
+        self._pool = None
+
+
+class _CachedLDAPUserMixin(CachedUserMixin):
+    """
+    CachedUserMixin for users that may carry an ldap_user: it is left out of
+    the cache entry and reattached, with the group permissions worked out
+    for the entry, when the user is loaded from it.
+    """
+
+    def dump_cached_user(self, user):
+        ldap_user = getattr(user, 'ldap_user', None)
+        if ldap_user is None:
+            return None
+        return {'group_permissions': ldap_user._group_permissions}
+
+    def restore_cached_user(self, user, extra):
+        if extra is None:
+            return
+
+        backend = LDAPBackend()
+        ldap_user = backend.ldap_user_class(backend, user=user)  # This sets user.ldap_user
+        ldap_user._group_permissions = extra['group_permissions']
+
+
+class LDAPBackend(_CachedLDAPUserMixin, BaseLDAPBackend):
+    """
+    django_auth_ldap's LDAPBackend with per-worker connection pooling, scoped
+    group resolution and an authentication result cache.
+
+    Pool behaviour is controlled by the AUTH_LDAP_POOL_* settings, timeouts
+    and failover by AUTH_LDAP_CONNECT_TIMEOUT, AUTH_LDAP_OPERATION_TIMEOUT and
+    AUTH_LDAP_FAILOVER_*, admission control by AUTH_LDAP_ADMISSION_* and
+    AUTH_LDAP_THROTTLE_*, group resolution by AUTH_LDAP_GROUP_STRATEGY and
+    AUTH_LDAP_GROUP_CACHE_TIMEOUT, result caching by the
+    AUTH_LDAP_RESULT_CACHE_* settings, the bulk sync by the AUTH_LDAP_SYNC_*
+    settings and offline logins by AUTH_LDAP_OFFLINE_CACHE_MAX_AGE. The
+    users of logged-in sessions come from the user cache.
+    """
+
+    default_settings = {
+        'POOL_SIZE': 4,
+        'POOL_IDLE_TIMEOUT': 300,
+        'POOL_HEALTH_CHECK_INTERVAL': 30,
+        'POOL_RETRY_MAX': 1,
+        'POOL_RETRY_DELAY': 0.5,
+        'CONNECT_TIMEOUT': 5,
+        'OPERATION_TIMEOUT': 10,
+        'FAILOVER_BACKOFF': 5,
+        'FAILOVER_MAX_BACKOFF': 60,
+        'GROUP_STRATEGY': 'search',
+        'GROUP_CACHE_TIMEOUT': 300,
+        'RESULT_CACHE_ALIAS': None,
+        'RESULT_CACHE_FAILURE_TIMEOUT': 30,
+        'RESULT_CACHE_SUCCESS_TIMEOUT': 0,
+        'SYNC_BASE_DN': None,
+        'SYNC_FILTER': '(&(objectCategory=person)(objectClass=user))',
+        'SYNC_USERNAME_ATTR': 'sAMAccountName',
+        'SYNC_PAGE_SIZE': 500,
+        'SYNC_MAX_AGE': 0,
+        'OFFLINE_CACHE_MAX_AGE': 0,
+        'ADMISSION_MAX_CONCURRENT': 0,
+        'ADMISSION_TIMEOUT': 3,
+        'ADMISSION_DIR': '/tmp/django_ldap_admission',
+        'THROTTLE_USER_RATE': 0,
+        'THROTTLE_USER_BURST': 5,
+        'THROTTLE_IP_RATE': 0,
+        'THROTTLE_IP_BURST': 60,
+    }
+
+    ldap_user_class = _PooledLDAPUser
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            return None
+
+        if not password and not self.settings.PERMIT_EMPTY_PASSWORD:
+            return None
+
+        username = username.strip()
+        result_cache = AuthResultCache(self.settings)
+
+        cached = result_cache.lookup(username, password)
+        if cached == FAILED:
+            return None
+        if cached is not None:
+            user = self.get_user(cached)
+            if user is not None:
+                return user
+
+        # Raises AdmissionRefused for a username or address over its rate,
+        # offline guesses included
+        throttle(self.settings, username, request)
+
+        ldap_user = self.ldap_user_class(self, username=username, request=request)
+        offline = OfflineCredentials(self.settings)
+        if offline.enabled and not ldap_user.directory_available():
+            # Every server failed recently; do not wait for them to time out
+            return offline.authenticate(self.ldap_to_django_username(username), password)
+
+        user = self.authenticate_ldap_user(ldap_user, password)
+
+        if user is not None:
+            result_cache.record_success(username, password, user)
+            # _user_attrs rather than attrs, which would search for them again
+            offline.record_success(user, password, ldap_user._user_attrs)
+        elif ldap_user.credentials_rejected:
+            result_cache.record_failure(username, password, ldap_user.bind_error)
+            offline.record_failure(
+                self.ldap_to_django_username(username), password, ldap_user.bind_error, ldap_user._user_attrs,
+            )
+        elif ldap_user.directory_unreachable:
+            user = offline.authenticate(self.ldap_to_django_username(username), password)
+
+        return user
+
+    def get_uncached_user(self, user_id):
+        user = None
+
+        try:
+            user = self.get_user_model().objects.get(pk=user_id)
+            self.ldap_user_class(self, user=user)  # This sets user.ldap_user
+        except self.get_user_model().DoesNotExist:
+            pass
+
+        return user
+
+    def get_group_permissions(self, user, obj=None):
+        if not hasattr(user, 'ldap_user') and self.settings.AUTHORIZE_ALL_USERS:
+            self.ldap_user_class(self, user=user)  # This sets user.ldap_user
+
+        return super().get_group_permissions(user, obj)
+
+    def populate_user(self, username):
+        ldap_user = self.ldap_user_class(self, username=username)
+        return ldap_user.populate_user()
+
+
+# The realms RealmRoutingBackend sends a login to
+LOCAL = 'local'
+DIRECTORY = 'ldap'
+
+
+class RealmRoutingBackend(_CachedLDAPUserMixin, ModelBackend):
+    """
+    Sends each password login to one realm, so that it costs at most one
+    expensive check: an LDAP search and bind, or a local password hash.
+
+    - usernames in AUTH_LOCAL_USERS (the bootstrap accounts by default) are
+      local
+    - so is any other Django user with a usable password
+    - everyone else, including usernames Django has not seen yet, is a
+      directory user and is handed to LDAPBackend
+
+    Deciding costs one query by primary username and no hashing. The backend
+    is listed first, and a login that its realm rejects raises
+    PermissionDenied, so the backends after it do not check the password a
+    second time. They stay listed for the permissions they grant and the
+    sessions they created.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            # Not a password login; the other backends may know what it is
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = None
+
+        realm = self.realm(username, user)
+        if realm == LOCAL:
+            user = self._authenticate_local(user, password)
+        else:
+            user = LDAPBackend().authenticate(request, username=username, password=password)
+
+        record_login(realm, 'rejected' if user is None else 'ok')
+        if user is None:
+            raise PermissionDenied
+        return user
+
+    def realm(self, username, user):
+        """The realm for a login as username; user is the Django user by that name, if any."""
+        local_users = getattr(django_settings, 'AUTH_LOCAL_USERS', ())
+        if username.lower() in {name.lower() for name in local_users}:
+            return LOCAL
+        if user is not None and user.has_usable_password():
+            return LOCAL
+        return DIRECTORY
+
+    def _authenticate_local(self, user, password):
+        if user is None:
+            # Hash anyway, so the response time does not tell whether the
+            # user exists (as ModelBackend does)
+            get_user_model()().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_uncached_user(self, user_id):
+        user = super().get_uncached_user(user_id)
+        if user is not None and not user.has_usable_password():
+            # As LDAPBackend.get_uncached_user() does for the users it logged in
+            backend = LDAPBackend()
+            backend.ldap_user_class(backend, user=user)  # This sets user.ldap_user
+
+        return user
@@ -0,0 +1,218 @@
+"""
+Authentication result caching for the LDAP backend.
+
+A rejected password normally costs a user search and a bind against the
+domain controller, so a client retrying stale credentials in a loop puts all
+of its load on the DC. AuthResultCache remembers recent outcomes for a
+(username, password) pair for a short time:
+
+- failures are always cached for AUTH_LDAP_RESULT_CACHE_FAILURE_TIMEOUT
+  seconds, so a repeated bad password is rejected without touching LDAP
+- successes are cached only if AUTH_LDAP_RESULT_CACHE_SUCCESS_TIMEOUT is
+  non-zero, in which case a repeat login skips the user search and bind
+
+Passwords are never stored; entries are keyed by an HMAC of the credentials.
+All entries for a user live under a per-user generation token, so they can
+be evicted together by replacing it. This happens whenever the directory says
+anything new about the account: a successful bind evicts cached failures, and
+a rejection that Active Directory attributes to the account state (locked,
+disabled, expired) evicts cached successes so they cannot outlive a lockout.
+
+Entries go to the cache alias named by AUTH_LDAP_RESULT_CACHE_ALIAS. LRUCache
+below is the intended backend for it: a bounded local-memory cache that
+evicts strictly least-recently-used entries and counts what it does.
+"""
+
+import hashlib
+import hmac
+import re
+import threading
+import uuid
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import record_cache_event
+
+# Active Directory reports why a bind failed as "data <code>" in the
+# diagnostic message. These codes mean the account itself is unusable, as
+# opposed to the password being wrong.
+ACCOUNT_STATE_CODES = {
+    '530',  # Logon not permitted at this time
+    '531',  # Logon not permitted from this workstation
+    '532',  # Password expired
+    '533',  # Account disabled
+    '701',  # Account expired
+    '773',  # Password must be reset
+    '775',  # Account locked out
+}
+
+# Stored for a rejected password; successes store the user's primary key.
+FAILED = 'failed'
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def valid_cache_key(key):
+    """
+    Makes key safe for memcached, as django_auth_ldap's does; importing that
+    one would import python-ldap with the cache.
+    """
+    return re.sub(r'\s+', '+', key)[:250]
+
+
+def _count(name, counter):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {})
+        counters[counter] = counters.get(counter, 0) + 1
+    record_cache_event(name, counter)
+
+
+def cache_stats():
+    """
+    Returns this process's counters, keyed by cache name: evictions and
+    expirations from LRUCache, hits and misses from AuthResultCache.
+    """
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+class LRUCache(LocMemCache):
+    """
+    A LocMemCache that, once MAX_ENTRIES is reached, drops the single least
+    recently used entry rather than culling a fraction of the cache. Expired
+    entries are left for get() to drop, or to reach the least recently used
+    end: finding them all would scan the cache under its lock on every set.
+    Drops are counted per cache name, as expirations if the entry had expired
+    and as evictions otherwise.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._name = name
+
+    def _cull(self):
+        # Entries are moved to the front on access, so the back is the
+        # least recently used.
+        key = next(reversed(self._cache))
+        _count(self._name, 'expirations' if self._has_expired(key) else 'evictions')
+        self._delete(key)
+
+
+def account_state_code(exc):
+    """
+    Returns the Active Directory sub-code from an LDAP bind error if it
+    describes the state of the account, otherwise None.
+    """
+    try:
+        info = exc.args[0].get('info', '')
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+    if isinstance(info, bytes):
+        info = info.decode('utf-8', 'replace')
+
+    match = re.search(r'\bdata ([0-9a-f]+)', info)
+    if match and match.group(1) in ACCOUNT_STATE_CODES:
+        return match.group(1)
+
+    return None
+
+
+class AuthResultCache:
+    """
+    Remembers recent authentication outcomes for the LDAP backend.
+
+    settings is the backend's LDAPSettings.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @property
+    def enabled(self):
+        return self.settings.RESULT_CACHE_ALIAS is not None
+
+    @property
+    def cache(self):
+        return caches[self.settings.RESULT_CACHE_ALIAS]
+
+    def lookup(self, username, password):
+        """
+        Returns FAILED for a cached rejection, the user's primary key for a
+        cached success, or None if nothing is cached.
+        """
+        if not self.enabled:
+            return None
+
+        result = self.cache.get(self._key(username, password))
+        if result is None:
+            _count(self.settings.RESULT_CACHE_ALIAS, 'misses')
+        elif result == FAILED:
+            _count(self.settings.RESULT_CACHE_ALIAS, 'failure_hits')
+        else:
+            _count(self.settings.RESULT_CACHE_ALIAS, 'success_hits')
+
+        return result
+
+    def record_failure(self, username, password, exc=None):
+        """
+        Caches a rejected password. exc is the LDAP error from the bind, if
+        any; an account-state rejection first evicts everything cached for
+        the user.
+        """
+        if not self.enabled or self.settings.RESULT_CACHE_FAILURE_TIMEOUT <= 0:
+            return
+
+        if exc is not None and account_state_code(exc) is not None:
+            self.invalidate(username)
+
+        self.cache.set(
+            self._key(username, password),
+            FAILED,
+            self.settings.RESULT_CACHE_FAILURE_TIMEOUT,
+        )
+
+    def record_success(self, username, password, user):
+        """
+        Evicts cached failures for the user and, if enabled, caches this
+        success.
+        """
+        if not self.enabled:
+            return
+
+        self.invalidate(username)
+
+        if self.settings.RESULT_CACHE_SUCCESS_TIMEOUT > 0:
+            self.cache.set(
+                self._key(username, password),
+                user.pk,
+                self.settings.RESULT_CACHE_SUCCESS_TIMEOUT,
+            )
+
+    def invalidate(self, username):
+        """
+        Evicts every cached result for username.
+        """
+        if not self.enabled:
+            return
+
+        # A fresh random generation rather than a counter: if the generation
+        # key is ever evicted, lookups fall back to the initial generation,
+        # under which no success is ever stored.
+        self.cache.set(self._generation_key(username), uuid.uuid4().hex, None)
+
+    def _generation_key(self, username):
+        return valid_cache_key('authentication.result.gen.{}'.format(username.lower()))
+
+    def _key(self, username, password):
+        generation = self.cache.get(self._generation_key(username), '0')
+        digest = hmac.new(
+            django_settings.SECRET_KEY.encode(),
+            '{}\0{}'.format(username.lower(), password).encode(),
+            hashlib.sha256,
+        ).hexdigest()
+
+        return 'authentication.result.{}.{}'.format(generation, digest)
@@ -0,0 +1,264 @@
+"""
+Per-phase latency probe for the LDAP login path.
+
+A login against Active Directory is a chain of round trips, and when logins
+are slow the question is which one. run_probe() walks the same chain the
+backend does, on fresh connections so that the connection pool cannot hide
+anything, against each domain controller in AUTH_LDAP_SERVER_URI, and times
+each phase:
+
+- dns: resolving the server's host
+- tcp_connect: a plain TCP connect to it
+- service_bind: opening an LDAP connection and binding as AUTH_LDAP_BIND_DN
+- user_search: AUTH_LDAP_USER_SEARCH for the username
+- user_bind: binding as the user (only when a password is given)
+- group_search: the group query of AUTH_LDAP_GROUP_STRATEGY
+
+It is used by the /test-ldap/ view and the ldap_probe management command.
+Each run holds an admission slot like a login, and a probe with a password
+takes a token from the login throttle first.
+"""
+
+import socket
+import statistics
+import time
+import urllib.parse
+
+import ldap
+import ldap.dn
+import ldap.filter
+
+from .admission import admit, throttle
+from .backends import LDAPBackend
+from .groups import configured_group_dns, targeted_group_filter
+from .servers import ordered_servers, server_uris
+
+PHASES = ('dns', 'tcp_connect', 'service_bind', 'user_search', 'user_bind', 'group_search')
+
+DEFAULT_PORTS = {'ldap': 389, 'ldaps': 636}
+
+
+class ProbeError(Exception):
+    """A phase of the probe failed."""
+
+    def __init__(self, phase, message):
+        super().__init__('{}: {}'.format(phase, message))
+        self.phase = phase
+        self.message = message
+
+
+def _ldap_error_message(exc):
+    if exc.args and isinstance(exc.args[0], dict):
+        info = exc.args[0]
+        return ' - '.join(filter(None, [info.get('desc'), info.get('info')]))
+    return str(exc)
+
+
+class _Timer:
+    """Records how long each phase takes; turns exceptions into ProbeError."""
+
+    def __init__(self):
+        self.timings = {}
+        self._phase = None
+
+    def __call__(self, phase):
+        self._phase = phase
+        return self
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.timings[self._phase] = (time.perf_counter() - self._start) * 1000
+            return False
+        if isinstance(exc, ProbeError):
+            return False
+        if isinstance(exc, ldap.LDAPError):
+            raise ProbeError(self._phase, _ldap_error_message(exc)) from exc
+        if isinstance(exc, OSError):
+            raise ProbeError(self._phase, str(exc)) from exc
+        return False
+
+
+def _open(settings, uri, timeout):
+    connection = ldap.initialize(uri, bytes_mode=False)
+    connection.set_option(ldap.OPT_NETWORK_TIMEOUT, timeout)
+    connection.set_option(ldap.OPT_TIMEOUT, timeout)
+    for opt, value in settings.CONNECTION_OPTIONS.items():
+        connection.set_option(opt, value)
+    if settings.START_TLS:
+        connection.start_tls_s()
+    return connection
+
+
+def _unbind(connection):
+    if connection is not None:
+        try:
+            connection.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+
+def _find_user(settings, connection, username):
+    if settings.USER_DN_TEMPLATE:
+        dn = settings.USER_DN_TEMPLATE % {'user': ldap.dn.escape_dn_chars(username)}
+        results = connection.search_s(dn, ldap.SCOPE_BASE, '(objectClass=*)', ['memberOf'])
+    else:
+        search = settings.USER_SEARCH
+        filterstr = search.filterstr % {'user': ldap.filter.escape_filter_chars(username)}
+        results = connection.search_s(search.base_dn, search.scope, filterstr, search.attrlist)
+
+    results = [(dn, attrs) for dn, attrs in results if dn is not None]
+    if len(results) != 1:
+        raise ProbeError('user_search', '{} entries found for {!r}'.format(len(results), username))
+    return results[0][0]
+
+
+def _search_groups(settings, connection, user_dn):
+    strategy = settings.GROUP_STRATEGY
+    if strategy == 'memberof':
+        # memberOf comes with the user entry, so there is no query to time
+        return []
+
+    if strategy == 'targeted':
+        group_dns = configured_group_dns(settings)
+        if not group_dns:
+            return []
+        return connection.search_s(
+            settings.GROUP_SEARCH.base_dn, ldap.SCOPE_SUBTREE,
+            targeted_group_filter(user_dn, group_dns), ['cn'],
+        )
+
+    member_attr = getattr(settings.GROUP_TYPE, 'member_attr', 'member')
+    search = settings.GROUP_SEARCH.search_with_additional_term_string(
+        '({}={})'.format(member_attr, ldap.filter.escape_filter_chars(user_dn))
+    )
+    return connection.search_s(search.base_dn, search.scope, search.filterstr, search.attrlist)
+
+
+def probe_once(settings, uri, username=None, password=None, timeout=5):
+    """
+    Runs each phase once and returns {phase: milliseconds}. Phases that need
+    a username or password are skipped without them. Raises ProbeError.
+    """
+    timer = _Timer()
+    try:
+        _run_phases(timer, settings, uri, username, password, timeout)
+    except ProbeError as e:
+        e.timings = timer.timings
+        raise
+
+    return timer.timings
+
+
+def _run_phases(timer, settings, uri, username, password, timeout):
+    parsed = urllib.parse.urlsplit(uri)
+    host = parsed.hostname
+    port = parsed.port or DEFAULT_PORTS.get(parsed.scheme, 389)
+
+    with timer('dns'):
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+    with timer('tcp_connect'):
+        family, socktype, proto, _, address = addresses[0]
+        with socket.socket(family, socktype, proto) as sock:
+            sock.settimeout(timeout)
+            sock.connect(address)
+
+    connection = user_connection = None
+    try:
+        with timer('service_bind'):
+            connection = _open(settings, uri, timeout)
+            connection.simple_bind_s(settings.BIND_DN, settings.BIND_PASSWORD)
+
+        if username:
+            with timer('user_search'):
+                user_dn = _find_user(settings, connection, username)
+
+            if password:
+                with timer('user_bind'):
+                    user_connection = _open(settings, uri, timeout)
+                    user_connection.simple_bind_s(user_dn, password)
+
+            with timer('group_search'):
+                _search_groups(settings, connection, user_dn)
+    finally:
+        _unbind(connection)
+        _unbind(user_connection)
+
+
+def _summarise(samples):
+    ordered = sorted(samples)
+    return {
+        'min_ms': ordered[0],
+        'median_ms': statistics.median(ordered),
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def _probe_server(settings, server, username, password, iterations, timeout, deadline):
+    result = {'server_uri': server.uri, 'in_rotation': server.available(), 'ok': True}
+
+    runs = []
+    for iteration in range(iterations):
+        # Every server gets one run; the rest stop at the deadline
+        if runs and deadline is not None and time.monotonic() >= deadline:
+            break
+        try:
+            with admit(settings):
+                runs.append(probe_once(settings, server.uri, username, password, timeout))
+        except ProbeError as e:
+            result['ok'] = False
+            result['error'] = {
+                'phase': e.phase,
+                'message': e.message,
+                'iteration': iteration + 1,
+                'completed_phases': e.timings,
+            }
+            break
+
+    for run in runs:
+        run['total'] = sum(run.values())
+
+    names = [phase for phase in PHASES + ('total',) if any(phase in run for run in runs)]
+    if iterations == 1:
+        result['phases'] = runs[0] if runs else {}
+    else:
+        result['completed'] = len(runs)
+        result['phases'] = {
+            phase: _summarise([run[phase] for run in runs if phase in run]) for phase in names
+        }
+
+    return result
+
+
+def run_probe(username=None, password=None, iterations=1, timeout=5, request=None, time_budget=None):
+    """
+    Runs the probe against each server in AUTH_LDAP_SERVER_URI, in the order
+    a login would try them, and returns a JSON-ready report with one entry
+    per server under 'servers'. With one iteration each phase is reported in
+    milliseconds; with more, as min/median/p99. A server's probe stops at its
+    first failure and reports it under 'error'; 'ok' is whether every server
+    passed.
+
+    With a password, takes a token from the throttle of username (and of the
+    client address of request) first. No iteration after the first starts
+    once time_budget seconds have passed. Raises AdmissionRefused.
+    """
+    settings = LDAPBackend().settings
+    if username and password:
+        throttle(settings, username, request)
+
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    servers = [
+        _probe_server(settings, server, username, password, iterations, timeout, deadline)
+        for server in ordered_servers(server_uris(settings.SERVER_URI), settings)
+    ]
+    return {
+        'username': username,
+        'group_strategy': settings.GROUP_STRATEGY,
+        'iterations': iterations,
+        'ok': all(server['ok'] for server in servers),
+        'servers': servers,
+    }
@@ -0,0 +1,69 @@
+"""
+Bounded thread pool for blocking LDAP work in async views.
+
+python-ldap is blocking, so under ASGI a bind or search made directly from a
+view would stall the event loop and every request on it. run_ldap() runs the
+call in a small per-process pool of threads instead. The pool is bounded by
+AUTH_LDAP_THREADS so that a slow domain controller cannot tie up an unbounded
+number of threads or LDAP connections; further logins queue for a thread.
+
+The calls usually touch the database too (django-auth-ldap creates and updates
+the user), so each thread's connection is recycled the same way Django does it
+at the start and end of a request.
+"""
+
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process's LDAP thread pool, created on first use."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AUTH_LDAP_THREADS,
+                thread_name_prefix='ldap',
+            )
+        return _executor
+
+
+def _call(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_ldap(func, *args, **kwargs):
+    """Run a blocking LDAP call (e.g. authenticate) in the LDAP thread pool."""
+    return await sync_to_async(
+        functools.partial(_call, func),
+        thread_sensitive=False,
+        executor=get_executor(),
+    )(*args, **kwargs)
+
+
+def reset_executor():
+    """
+    Forget the pool in a forked child; its threads were not copied by fork.
+    """
+    global _executor, _executor_lock
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_executor)
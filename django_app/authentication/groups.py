@@ -0,0 +1,172 @@
+"""
+Scoped LDAP group-membership resolution.
+
+django_auth_ldap resolves group membership through AUTH_LDAP_GROUP_TYPE and
+AUTH_LDAP_GROUP_SEARCH, which for this project means subtree searches over
+every group in the domain. The project only cares about the handful of groups
+named in AUTH_LDAP_USER_FLAGS_BY_GROUP (plus REQUIRE_GROUP and DENY_GROUP), so
+the resolver here asks Active Directory for those alone.
+
+AUTH_LDAP_GROUP_STRATEGY selects how:
+
+- 'memberof': read the memberOf attribute of the user entry, which the user
+  search has already fetched, so resolution costs no extra round trip. An
+  entry without memberOf is a user in no group.
+- 'targeted': a single search for the configured group DNs that list the user
+  as a member
+- 'search': django_auth_ldap's own GROUP_TYPE/GROUP_SEARCH behaviour
+
+Resolved memberships are cached per user for AUTH_LDAP_GROUP_CACHE_TIMEOUT
+seconds in the GROUP_CACHE_ALIAS cache, which all workers share, and dropped
+when the user logs out (see authentication.signals).
+"""
+
+import ldap
+import ldap.dn
+import ldap.filter
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django_auth_ldap.backend import valid_cache_key
+from django_auth_ldap.config import LDAPGroupQuery
+
+from .metrics import record_cache_event
+
+STRATEGIES = ('memberof', 'targeted', 'search')
+
+
+def group_cache_key(username):
+    return valid_cache_key('authentication.groups.{}'.format(username.lower()))
+
+
+def group_cache():
+    return caches[django_settings.GROUP_CACHE_ALIAS]
+
+
+def invalidate_groups(username):
+    """
+    Drops the cached group memberships of username.
+    """
+    group_cache().delete(group_cache_key(username))
+
+
+def _query_dns(query):
+    """
+    Yields every group DN referenced by a USER_FLAGS_BY_GROUP style value.
+    """
+    if query is None:
+        return
+    if isinstance(query, str):
+        yield query
+    elif isinstance(query, LDAPGroupQuery):
+        for child in query.children:
+            yield from _query_dns(child)
+    else:
+        for item in query:
+            yield from _query_dns(item)
+
+
+def configured_group_dns(settings):
+    """
+    Returns the lower-cased DNs of every group the settings refer to.
+    """
+    dns = set()
+    for query in settings.USER_FLAGS_BY_GROUP.values():
+        dns.update(_query_dns(query))
+    dns.update(_query_dns(settings.REQUIRE_GROUP))
+    dns.update(_query_dns(settings.DENY_GROUP))
+
+    return {dn.lower() for dn in dns}
+
+
+def targeted_group_filter(user_dn, group_dns):
+    """
+    The filter for the configured groups (of group_dns) that list user_dn as
+    a member.
+    """
+    escape = ldap.filter.escape_filter_chars
+    return '(&(objectClass=group)(member={})(|{}))'.format(
+        escape(user_dn),
+        ''.join('(distinguishedName={})'.format(escape(dn)) for dn in sorted(group_dns)),
+    )
+
+
+def _attr_values(attrs, name):
+    """
+    Case-insensitive attribute lookup; returns None if the attribute is absent.
+    """
+    name = name.lower()
+    return next((values for key, values in attrs.items() if key.lower() == name), None)
+
+
+class ScopedLDAPUserGroups:
+    """
+    Stands in for django_auth_ldap's _LDAPUserGroups when a scoped strategy is
+    configured. It answers the same three questions - is_member_of(),
+    get_group_dns() and get_group_names() - from one cached set of group DNs.
+    """
+
+    def __init__(self, ldap_user):
+        self.settings = ldap_user.settings
+        self._ldap_user = ldap_user
+        self._group_dns = None
+
+    def is_member_of(self, group_dn):
+        return group_dn.lower() in self.get_group_dns()
+
+    def get_group_dns(self):
+        if self._group_dns is None:
+            key = group_cache_key(self._ldap_user._username)
+            timeout = self.settings.GROUP_CACHE_TIMEOUT
+
+            group_dns = group_cache().get(key) if timeout > 0 else None
+            if group_dns is None:
+                record_cache_event('groups', 'misses')
+                group_dns = self._load_group_dns()
+                if timeout > 0:
+                    group_cache().set(key, group_dns, timeout)
+            else:
+                record_cache_event('groups', 'hits')
+
+            self._group_dns = group_dns
+
+        return self._group_dns
+
+    def get_group_names(self):
+        names = set()
+        for group_dn in self.get_group_dns():
+            rdn = ldap.dn.str2dn(group_dn)[0][0]
+            names.add(rdn[1])
+
+        return names
+
+    def _load_group_dns(self):
+        if self._ldap_user.dn is None:
+            return frozenset()
+
+        if self.settings.GROUP_STRATEGY == 'memberof':
+            return self._load_member_of()
+
+        return self._load_targeted()
+
+    def _load_member_of(self):
+        # The user search and AUTH_LDAP_USER_ATTRLIST ask for memberOf, and
+        # Active Directory leaves it out of the entry of a user in no group
+        member_of = _attr_values(self._ldap_user.attrs or {}, 'memberOf') or []
+
+        return frozenset(
+            (dn.decode() if isinstance(dn, bytes) else dn).lower() for dn in member_of
+        )
+
+    def _load_targeted(self):
+        group_dns = configured_group_dns(self.settings)
+        if not group_dns:
+            return frozenset()
+
+        filterstr = targeted_group_filter(self._ldap_user.dn, group_dns)
+        base_dn = self.settings.GROUP_SEARCH.base_dn
+
+        results = self._ldap_user.connection.search_s(
+            base_dn, ldap.SCOPE_SUBTREE, filterstr, ['cn']
+        )
+
+        return frozenset(dn.lower() for dn, _ in results if dn is not None)
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from config.bootstrap import ensure_users, restore_snapshot, unapplied_migrations
+
+class Command(BaseCommand):
+    help = ('Restores the seed database if there is none, applies missing migrations and '
+            'creates or updates BOOTSTRAP_USERS, timing each step')
+
+    # gunicorn imports the same code straight afterwards; --check runs them
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Run the system checks first')
+        parser.add_argument('--reset-passwords', action='store_true',
+                            help='Set the passwords of existing bootstrap users too')
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings.append((name, elapsed))
+            self.stdout.write('  {:<18} {:8.1f} ms'.format(name, elapsed))
+
+    def handle(self, *args, **options):
+        self.timings = []
+
+        if options['check']:
+            with self.step('system checks'):
+                self.check()
+
+        if settings.SQLITE_SEED_PATH:
+            with self.step('seed snapshot'):
+                _, reason = restore_snapshot(settings.SQLITE_SEED_PATH)
+            self.stdout.write('Seed snapshot: {}'.format(reason))
+
+        with self.step('migration check'):
+            unapplied = unapplied_migrations()
+
+        if unapplied:
+            self.stdout.write('{} unapplied migrations'.format(len(unapplied)))
+            with self.step('migrate'):
+                call_command('migrate', interactive=False, skip_checks=True,
+                             verbosity=max(0, options['verbosity'] - 1))
+
+        with self.step('bootstrap users'):
+            results = ensure_users(settings.BOOTSTRAP_USERS, options['reset_passwords'])
+
+        for username, result in results.items():
+            self.stdout.write('User {}: {}'.format(username, result))
+
+        self.stdout.write(self.style.SUCCESS('Bootstrap finished in {:.1f} ms'.format(
+            sum(elapsed for _, elapsed in self.timings))))
@@ -0,0 +1,32 @@
+import json
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from config.bootstrap import build_snapshot
+
+class Command(BaseCommand):
+    help = 'Builds a migrated, vacuumed seed database and its manifest at the configured SQLite path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Replace an existing database file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The seed database must be SQLite')
+
+        path = connection.settings_dict['NAME']
+        if os.path.exists(path):
+            if not options['force']:
+                raise CommandError('{} already exists; pass --force to replace it'.format(path))
+            os.remove(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        call_command('migrate', interactive=False, verbosity=max(0, options['verbosity'] - 1))
+        manifest = build_snapshot()
+
+        self.stdout.write(json.dumps(manifest, indent=2))
+        self.stdout.write(self.style.SUCCESS('Seed database written to {} ({} bytes)'.format(
+            path, os.path.getsize(path))))
@@ -0,0 +1,70 @@
+import getpass
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.admission import AdmissionRefused
+from authentication.diagnostics import PHASES, run_probe
+
+class Command(BaseCommand):
+    help = 'Times each phase of an LDAP login against each server in AUTH_LDAP_SERVER_URI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Account to search for (and bind as, with a password)')
+        parser.add_argument('--password-env', metavar='VAR',
+                            help='Environment variable holding the password for the user bind')
+        parser.add_argument('--ask-password', action='store_true', help='Prompt for the password')
+        parser.add_argument('--iterations', type=int, default=1, help='Repeat and report min/median/p99')
+        parser.add_argument('--timeout', type=float, default=5, help='Network timeout in seconds')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        password = None
+        if options['password_env']:
+            password = os.environ.get(options['password_env'])
+        elif options['ask_password']:
+            password = getpass.getpass('Password for {}: '.format(options['username']))
+
+        try:
+            report = run_probe(options['username'], password, max(1, options['iterations']), options['timeout'])
+        except AdmissionRefused as e:
+            raise CommandError('LDAP probe refused: {}'.format(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_report(report)
+
+        if not report['ok']:
+            raise CommandError('LDAP probe failed on {}'.format(', '.join(
+                '{server_uri} in {error[phase]} (iteration {error[iteration]}): {error[message]}'.format(**server)
+                for server in report['servers'] if not server['ok']
+            )))
+
+    def write_report(self, report):
+        self.stdout.write('Strategy: {}  iterations: {}'.format(report['group_strategy'], report['iterations']))
+        for server in report['servers']:
+            self.write_server(server)
+
+        if report['ok']:
+            self.stdout.write(self.style.SUCCESS('LDAP probe succeeded'))
+
+    def write_server(self, server):
+        self.stdout.write('Server: {}{}'.format(
+            server['server_uri'], '' if server['in_rotation'] else '  (out of rotation)'))
+
+        phases = server['phases']
+        for phase in PHASES + ('total',):
+            if phase not in phases:
+                continue
+            timing = phases[phase]
+            if isinstance(timing, dict):
+                line = 'min {min_ms:8.1f}  median {median_ms:8.1f}  p99 {p99_ms:8.1f} ms'.format(**timing)
+            else:
+                line = '{:8.1f} ms'.format(timing)
+            self.stdout.write('  {:<13} {}'.format(phase, line))
+
+        if 'error' in server:
+            self.stdout.write(self.style.ERROR('  failed in {phase} (iteration {iteration}): {message}'.format(
+                **server['error'])))
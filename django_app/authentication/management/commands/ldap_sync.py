@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.sync import SyncError, sync_users
+
+class Command(BaseCommand):
+    help = 'Creates and updates Django users from the directory, incrementally by uSNChanged'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Fetch every user instead of only those changed since the last run')
+        parser.add_argument('--page-size', type=int, help='Entries per page (default AUTH_LDAP_SYNC_PAGE_SIZE)')
+        parser.add_argument('--base-dn', help='Subtree to sync (default AUTH_LDAP_SYNC_BASE_DN)')
+        parser.add_argument('--json', action='store_true', help='Print the statistics as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            stats = sync_users(options['full'], options['page_size'], options['base_dn'])
+        except SyncError as e:
+            raise CommandError('LDAP sync failed: {}'.format(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        self.stdout.write('Server: {}  base: {}  mode: {}'.format(
+            stats['server_uri'], stats['base_dn'], stats['mode']))
+        self.stdout.write('  {fetched} entries in {pages} pages: {created} created, {updated} updated, '
+                          '{unchanged} unchanged, {skipped} skipped'.format(**stats))
+        if stats['revoked']:
+            self.stdout.write('  {revoked} users lost their flags after leaving the groups or the directory'.format(
+                **stats))
+        if stats['credentials_forgotten']:
+            self.stdout.write('  {credentials_forgotten} offline credentials dropped after a password change'.format(
+                **stats))
+        self.stdout.write(self.style.SUCCESS('LDAP sync finished in {:.1f}s at USN {}'.format(
+            stats['seconds'], stats['highest_usn'])))
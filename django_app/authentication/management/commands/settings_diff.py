@@ -0,0 +1,76 @@
+import importlib
+import json
+import sys
+
+from django.conf import global_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.functional import LazyObject
+from django.views.debug import SafeExceptionReporterFilter
+
+from config.settings import PROFILES
+
+UNSET = ('(unset)', '(unset)')
+
+
+def profile_settings(profile):
+    """
+    The effective settings of a profile as {name: (repr, masked repr)}:
+    Django's defaults overlaid with the profile module, evaluated afresh
+    against this process's environment. Lazy LDAP objects are described, not
+    built.
+    """
+    # Profiles adjust what they import from base, so each needs its own copy
+    for name in [name for name in sys.modules if name.startswith('config.settings.')]:
+        del sys.modules[name]
+    module = importlib.import_module('config.settings.{}'.format(profile))
+
+    values = {name: getattr(global_settings, name) for name in dir(global_settings) if name.isupper()}
+    values.update((name, getattr(module, name)) for name in dir(module) if name.isupper())
+    cleanse = SafeExceptionReporterFilter().cleanse_setting
+    return {
+        # cleanse_setting() would build a lazy object to see if it is a dict
+        name: (repr(value), repr(value if isinstance(value, LazyObject) else cleanse(name, value)))
+        for name, value in values.items()
+    }
+
+
+class Command(BaseCommand):
+    help = 'Shows the settings that differ between the settings profiles, with secrets masked'
+
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('profiles', nargs='*', help='Profiles to compare: {} (default: all of them)'.format(
+            ', '.join(PROFILES)))
+        parser.add_argument('--json', action='store_true', help='Print the differences as JSON')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(PROFILES)
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError('Unknown profiles: {}'.format(', '.join(sorted(unknown))))
+        if len(profiles) < 2:
+            raise CommandError('Name at least two profiles to compare')
+
+        effective = {profile: profile_settings(profile) for profile in profiles}
+        names = sorted(set().union(*effective.values()))
+
+        differences = {}
+        for name in names:
+            values = [effective[profile].get(name, UNSET) for profile in profiles]
+            # Compared unmasked, so that a changed secret is still reported
+            if len({value for value, _ in values}) > 1:
+                differences[name] = {profile: masked for profile, (_, masked) in zip(profiles, values)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(differences, indent=2))
+            return
+
+        width = max(len(profile) for profile in profiles)
+        for name, values in differences.items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            for profile, value in values.items():
+                self.stdout.write('  {:<{}}  {}'.format(profile, width, value))
+
+        self.stdout.write('{} of {} settings differ between {}'.format(
+            len(differences), len(names), ', '.join(profiles)))
@@ -0,0 +1,322 @@
+"""
+Prometheus metrics for the request hot path.
+
+MetricsMiddleware (authentication.middleware) times every request per view
+and, through a context variable, totals the database queries and LDAP
+operations the request caused. The LDAP connection pool, admission control,
+the authentication result cache, the offline credential cache and the group
+cache report their events here too, and each domain controller its health (see
+authentication.servers). Everything is served in the Prometheus text format
+at /metrics.
+
+gunicorn runs several worker processes, so when METRICS_DIR is set each
+worker writes its samples to memory-mapped files there (prometheus_client's
+multiprocess mode) and a scrape of any worker reports the sum over all of
+them. The directory must be private to one server and emptied before it
+starts.
+
+prometheus_client is optional: without it, or with METRICS_ENABLED off, every
+function here is a no-op and /metrics answers 404.
+"""
+
+import contextvars
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+
+if settings.METRICS_ENABLED and settings.METRICS_DIR:
+    # Must be set before prometheus_client is imported
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', settings.METRICS_DIR)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+enabled = settings.METRICS_ENABLED and prometheus_client is not None
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LDAP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# python-ldap method -> operation label
+LDAP_OPERATIONS = {
+    'simple_bind_s': 'bind',
+    'search_s': 'search',
+    'search_ext': 'search',
+    'search_ext_s': 'search',
+    'result3': 'result',
+    'whoami_s': 'whoami',
+    'compare_s': 'compare',
+    'start_tls_s': 'start_tls',
+    'unbind_s': 'unbind',
+}
+
+if enabled:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        'django_request_duration_seconds', 'Request latency by view',
+        ['view', 'method'], buckets=REQUEST_BUCKETS,
+    )
+    RESPONSES = prometheus_client.Counter(
+        'django_responses', 'Responses by view and status code', ['view', 'status'],
+    )
+    DB_QUERIES = prometheus_client.Counter(
+        'django_db_queries', 'Database queries by view', ['view'],
+    )
+    DB_SECONDS = prometheus_client.Counter(
+        'django_db_query_seconds', 'Time spent in database queries by view', ['view'],
+    )
+    VIEW_LDAP_OPERATIONS = prometheus_client.Counter(
+        'django_ldap_operations', 'LDAP operations by view', ['view'],
+    )
+    VIEW_LDAP_SECONDS = prometheus_client.Counter(
+        'django_ldap_seconds', 'Time spent in LDAP operations by view', ['view'],
+    )
+    LDAP_LATENCY = prometheus_client.Histogram(
+        'ldap_operation_duration_seconds', 'LDAP operation latency by server',
+        ['server', 'operation', 'result'], buckets=LDAP_BUCKETS,
+    )
+    # Per worker; the multiprocess modes report the worst live worker's view
+    LDAP_SERVER_UP = prometheus_client.Gauge(
+        'ldap_server_up', 'Whether the LDAP server is in rotation', ['server'],
+        multiprocess_mode='livemin',
+    )
+    LDAP_SERVER_LATENCY = prometheus_client.Gauge(
+        'ldap_server_latency_seconds', 'Smoothed LDAP operation latency used to pick a server', ['server'],
+        multiprocess_mode='livemax',
+    )
+    LDAP_SERVER_FAILURES = prometheus_client.Counter(
+        'ldap_server_failures', 'LDAP operations that found the server down or timed out', ['server'],
+    )
+    LDAP_FAILOVERS = prometheus_client.Counter(
+        'ldap_failovers', 'LDAP work moved to another server, by the server that failed', ['server'],
+    )
+    # Summed over the live workers: the host's queue and work in flight
+    LDAP_ADMISSION_WAITING = prometheus_client.Gauge(
+        'ldap_admission_waiting', 'LDAP work waiting for an admission slot', multiprocess_mode='livesum',
+    )
+    LDAP_ADMISSION_IN_FLIGHT = prometheus_client.Gauge(
+        'ldap_admission_in_flight', 'LDAP work holding an admission slot', multiprocess_mode='livesum',
+    )
+    LDAP_ADMISSION_WAIT = prometheus_client.Histogram(
+        'ldap_admission_wait_seconds', 'Time spent waiting for an admission slot, by outcome',
+        ['result'], buckets=LDAP_BUCKETS,
+    )
+    AUTH_THROTTLED = prometheus_client.Counter(
+        'auth_throttled', 'Logins refused by a token bucket, by scope (user or ip)', ['scope'],
+    )
+    LDAP_POOL_EVENTS = prometheus_client.Counter(
+        'ldap_pool_events', 'LDAP connection pool events (hits, misses, binds, ...)', ['event'],
+    )
+    CACHE_EVENTS = prometheus_client.Counter(
+        'auth_cache_events', 'Authentication cache events (hits, misses, evictions, ...)', ['cache', 'event'],
+    )
+    LOGINS = prometheus_client.Counter(
+        'auth_logins', 'Password logins by the realm that checked them and outcome', ['realm', 'result'],
+    )
+    OFFLINE_LOGINS = prometheus_client.Counter(
+        'auth_offline_logins', 'Logins checked against the offline credential cache, by outcome', ['result'],
+    )
+
+
+class RequestStats:
+    """Database and LDAP work done on behalf of the current request."""
+
+    __slots__ = ('db_queries', 'db_seconds', 'ldap_operations', 'ldap_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.ldap_operations = 0
+        self.ldap_seconds = 0.0
+
+
+# Context variables follow the request into sync_to_async and the LDAP
+# thread pool, so work done there is still attributed to it
+_request_stats = contextvars.ContextVar('authentication_metrics_request_stats', default=None)
+
+
+def start_request():
+    """Starts collecting for a request. Returns a token for finish_request()."""
+    return _request_stats.set(RequestStats())
+
+
+def finish_request(token, request, response, duration):
+    """Records the request that start_request() returned token for."""
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else 'unresolved'
+
+    REQUEST_LATENCY.labels(view, request.method).observe(duration)
+    RESPONSES.labels(view, str(response.status_code)).inc()
+    if stats.db_queries:
+        DB_QUERIES.labels(view).inc(stats.db_queries)
+        DB_SECONDS.labels(view).inc(stats.db_seconds)
+    if stats.ldap_operations:
+        VIEW_LDAP_OPERATIONS.labels(view).inc(stats.ldap_operations)
+        VIEW_LDAP_SECONDS.labels(view).inc(stats.ldap_seconds)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Counts and times queries made while a request is being measured."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: adds db_execute_wrapper to the connection."""
+    if enabled and db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+class InstrumentedLDAPObject:
+    """
+    Wraps a python-ldap connection and times the operations in
+    LDAP_OPERATIONS; everything else passes straight through.
+    """
+
+    def __init__(self, connection, server):
+        self._connection = connection
+        self._server = server
+
+    def __getattr__(self, name):
+        attr = getattr(self._connection, name)
+        operation = LDAP_OPERATIONS.get(name)
+        if operation is None:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = 'error'
+            try:
+                value = attr(*args, **kwargs)
+                result = 'ok'
+                return value
+            finally:
+                record_ldap_operation(operation, result, time.perf_counter() - start, self._server)
+
+        return timed
+
+
+def instrument_connection(connection, server=''):
+    """
+    Returns connection, to the server URI server, wrapped for timing, or
+    unchanged if metrics are off.
+    """
+    if not enabled:
+        return connection
+    return InstrumentedLDAPObject(connection, server)
+
+
+def record_ldap_operation(operation, result, duration, server=''):
+    LDAP_LATENCY.labels(server, operation, result).observe(duration)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.ldap_operations += 1
+        stats.ldap_seconds += duration
+
+
+def record_pool_event(event, amount=1):
+    if enabled:
+        LDAP_POOL_EVENTS.labels(event).inc(amount)
+
+
+def record_admission_waiting(delta):
+    if enabled:
+        LDAP_ADMISSION_WAITING.inc(delta)
+
+
+def record_admission_in_flight(delta):
+    if enabled:
+        LDAP_ADMISSION_IN_FLIGHT.inc(delta)
+
+
+def record_admission_wait(result, seconds):
+    if enabled:
+        LDAP_ADMISSION_WAIT.labels(result).observe(seconds)
+
+
+def record_throttled(scope):
+    if enabled:
+        AUTH_THROTTLED.labels(scope).inc()
+
+
+def record_server_state(server, up, latency):
+    if enabled:
+        LDAP_SERVER_UP.labels(server).set(1 if up else 0)
+        if latency is not None:
+            LDAP_SERVER_LATENCY.labels(server).set(latency)
+
+
+def record_server_failure(server):
+    if enabled:
+        LDAP_SERVER_FAILURES.labels(server).inc()
+
+
+def record_failover(server):
+    if enabled:
+        LDAP_FAILOVERS.labels(server).inc()
+
+
+def record_cache_event(cache, event):
+    if enabled:
+        CACHE_EVENTS.labels(cache, event).inc()
+
+
+def record_login(realm, result):
+    if enabled:
+        LOGINS.labels(realm, result).inc()
+
+
+def record_offline_login(result):
+    if enabled:
+        OFFLINE_LOGINS.labels(result).inc()
+
+
+def client_allowed(request):
+    """Whether the client address is in METRICS_ALLOWED_NETWORKS."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+
+    return any(
+        address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def render():
+    """
+    Returns (body, content_type) for a scrape, aggregated over every worker
+    in multiprocess mode, or None if metrics are unavailable.
+    """
+    if not enabled:
+        return None
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """For gunicorn's child_exit hook: drops a dead worker's live gauges."""
+    if enabled and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,101 @@
+"""
+Request instrumentation, user loading and admission middleware.
+
+MetricsMiddleware should be first in MIDDLEWARE so that it measures the whole
+request. CachedUserMiddleware loads request.user through the user cache (see
+authentication.usercache). AdmissionMiddleware answers requests whose LDAP
+work was refused (see authentication.admission). They work in sync (WSGI)
+and async (ASGI) stacks, so they never force Django to switch threads around
+the async views.
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .admission import AdmissionRefused
+from .usercache import load_user
+
+
+class MetricsMiddleware:
+    """
+    Records latency, response status, database and LDAP work per view (see
+    authentication.metrics).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.enabled:
+            raise MiddlewareNotUsed('prometheus_client is not installed')
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = metrics.start_request()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        metrics.finish_request(token, request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        token = metrics.start_request()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        metrics.finish_request(token, request, response, time.perf_counter() - start)
+        return response
+
+
+class CachedUserMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware whose request.user tells the session's backend
+    which session it is loading the user for, so that the backend can answer
+    from the user cache.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: load_user(request))
+
+
+def refused_response(exc):
+    """The response for an AdmissionRefused: 503 or 429, with Retry-After."""
+    response = HttpResponse(str(exc), status=exc.status, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+class AdmissionMiddleware:
+    """
+    Turns an AdmissionRefused raised by a view (e.g. the admin's login form
+    calling authenticate()) into refused_response() rather than a server
+    error.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, AdmissionRefused):
+            return refused_response(exception)
+        return None
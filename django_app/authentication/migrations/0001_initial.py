@@ -0,0 +1,51 @@
+# Generated by Django 4.2.21 on 2026-10-18 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dn', models.CharField(max_length=512)),
+                ('usn_changed', models.BigIntegerField()),
+                ('synced_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('server_uri', models.CharField(max_length=255)),
+                ('base_dn', models.CharField(max_length=255)),
+                ('highest_usn', models.BigIntegerField(default=0)),
+                ('last_full_sync', models.DateTimeField(blank=True, null=True)),
+                ('last_sync', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='synccheckpoint',
+            constraint=models.UniqueConstraint(fields=('server_uri', 'base_dn'), name='unique_sync_checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='directoryuser',
+            name='checkpoint',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='users', to='authentication.synccheckpoint'),
+        ),
+        migrations.AddField(
+            model_name='directoryuser',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='directory_entry', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Indexes on auth_user for authentication.admin.UserAdmin
+
+from django.db import migrations
+
+# SQLite's LIKE is case-insensitive, so only a NOCASE index can serve the
+# admin's istartswith searches. Its sorts by column break ties by username.
+INDEXES = {
+    'auth_user_username_nocase': 'username COLLATE NOCASE',
+    'auth_user_first_name_nocase': 'first_name COLLATE NOCASE',
+    'auth_user_last_name_nocase': 'last_name COLLATE NOCASE',
+    'auth_user_email_nocase': 'email COLLATE NOCASE',
+    'auth_user_first_name_username': 'first_name, username',
+    'auth_user_last_name_username': 'last_name, username',
+    'auth_user_email_username': 'email, username',
+}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0002_cachedcredential'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS {} ON auth_user ({})'.format(name, columns),
+            'DROP INDEX IF EXISTS {}'.format(name),
+        )
+        for name, columns in INDEXES.items()
+    ] + [
+        # Statistics for the query planner to choose between them
+        migrations.RunSQL('ANALYZE auth_user', migrations.RunSQL.noop),
+    ]
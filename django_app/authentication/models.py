@@ -0,0 +1,77 @@
+"""
+Bookkeeping for the bulk directory sync (see authentication.sync) and the
+offline credential cache (see authentication.offline).
+"""
+
+from django.conf import settings
+from django.db import models
+
+
+class DirectoryUser(models.Model):
+    """
+    The directory entry a Django user was last synced from.
+
+    usn_changed is the entry's uSNChanged when it was last written. A user
+    whose checkpoint has completed a run recently has up to date attributes
+    (an incremental run fetches every entry whose uSNChanged has moved on), so
+    the login path can skip re-mirroring them (see AUTH_LDAP_SYNC_MAX_AGE).
+    Group memberships do not move the user's uSNChanged, so the login path
+    still resolves the flags, and each run re-reads the members of the groups
+    and the users who hold a flag (see authentication.sync).
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='directory_entry',
+    )
+    checkpoint = models.ForeignKey('SyncCheckpoint', on_delete=models.CASCADE, related_name='users')
+    dn = models.CharField(max_length=512)
+    usn_changed = models.BigIntegerField()
+    synced_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.dn
+
+
+class SyncCheckpoint(models.Model):
+    """
+    How far the sync of one subtree on one domain controller has got.
+
+    uSNChanged values are local to the DC that assigned them, so the
+    checkpoint is only meaningful against the same server.
+    """
+
+    server_uri = models.CharField(max_length=255)
+    base_dn = models.CharField(max_length=255)
+    highest_usn = models.BigIntegerField(default=0)
+    last_full_sync = models.DateTimeField(null=True, blank=True)
+    last_sync = models.DateTimeField(null=True, blank=True)  # Completed runs only
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['server_uri', 'base_dn'], name='unique_sync_checkpoint'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.server_uri, self.base_dn)
+
+
+class CachedCredential(models.Model):
+    """
+    A salted, slow hash of the password a user last logged in with through the
+    directory, so that they can still log in while no domain controller
+    answers (see AUTH_LDAP_OFFLINE_CACHE_MAX_AGE).
+
+    pwd_last_set is the entry's pwdLastSet when the password was verified, or
+    None if the directory did not return it. The entry is dropped when the
+    directory reports a newer one.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cached_credential',
+    )
+    password = models.CharField(max_length=128)  # As User.password
+    pwd_last_set = models.BigIntegerField(null=True, blank=True)
+    verified_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.user)
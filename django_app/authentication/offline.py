@@ -0,0 +1,175 @@
+"""
+Offline credential verification for domain controller outages.
+
+When no domain controller can be reached, the LDAP backend cannot check a
+password and the login falls through to ModelBackend, where directory users
+have unusable passwords, so nobody can log in. With
+AUTH_LDAP_OFFLINE_CACHE_MAX_AGE set, OfflineCredentials keeps one
+CachedCredential per user: the password of their last successful directory
+login, hashed with the first of PASSWORD_HASHERS (salted and deliberately
+slow, as for local passwords).
+
+The backend checks a password against it only when the directory is
+unreachable: straight away while every server is out of rotation (see
+authentication.servers), so that logins during an outage do not wait out the
+timeouts, and after a login that failed because its last server did. An entry
+verified more than MAX_AGE seconds ago is not used, and an entry is dropped as
+soon as the directory says its password is no longer current:
+
+- a successful login with a different pwdLastSet replaces it
+- a rejected login deletes it if the user entry that the login searched for
+  shows a different pwdLastSet, or if Active Directory attributes the
+  rejection to the account state (locked, disabled, expired, must change)
+- ldap_sync deletes it when it sees pwdLastSet change (see authentication.sync)
+
+Hashing costs as much as checking, so a login whose pwdLastSet matches the
+stored one only moves verified_at, and a rejected login compares pwdLastSet
+rather than checking the password against the hash. Only where the directory
+returns no pwdLastSet is the rejected password checked, to tell a changed
+password from a mistyped one.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.utils import timezone
+
+from .cache import account_state_code
+from .metrics import record_offline_login
+
+
+def pwd_last_set(attrs):
+    """The pwdLastSet of an entry's attributes as an int, or None."""
+    # Attribute names are case-insensitive. Looked up here rather than with
+    # authentication.groups, which imports python-ldap.
+    values = next((values for name, values in (attrs or {}).items() if name.lower() == 'pwdlastset'), None)
+    if not values:
+        return None
+
+    value = values[0]
+    try:
+        return int(value.decode() if isinstance(value, bytes) else value)
+    except ValueError:
+        return None
+
+
+def forget_changed(last_set_by_user):
+    """
+    Deletes the entries of the users in last_set_by_user, {user pk:
+    pwdLastSet}, whose password the directory has changed since. Returns how
+    many were deleted.
+    """
+    from .models import CachedCredential
+
+    stale = [
+        pk for pk, user_id, last_set in CachedCredential.objects.filter(
+            user_id__in=list(last_set_by_user),
+        ).values_list('pk', 'user_id', 'pwd_last_set')
+        if last_set != last_set_by_user[user_id]
+    ]
+    if stale:
+        CachedCredential.objects.filter(pk__in=stale).delete()
+
+    return len(stale)
+
+
+class OfflineCredentials:
+    """
+    The offline credential cache for the LDAP backend. Usernames are Django
+    usernames.
+
+    settings is the backend's LDAPSettings.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @property
+    def enabled(self):
+        return self.settings.OFFLINE_CACHE_MAX_AGE > 0
+
+    def authenticate(self, username, password):
+        """
+        Returns the user if password is the one they last logged in with
+        through the directory, no more than MAX_AGE seconds ago, otherwise
+        None.
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._entry(username)
+        max_age = timedelta(seconds=self.settings.OFFLINE_CACHE_MAX_AGE)
+        if entry is None:
+            # Hash anyway, so the response time does not tell whether the
+            # user has an entry (as ModelBackend does)
+            make_password(password)
+            result = 'missing'
+        elif entry.verified_at < timezone.now() - max_age:
+            make_password(password)
+            entry.delete()
+            result = 'expired'
+        elif not check_password(password, entry.password):
+            result = 'rejected'
+        elif not entry.user.is_active:
+            result = 'inactive'
+        else:
+            result = 'ok'
+
+        record_offline_login(result)
+        return entry.user if result == 'ok' else None
+
+    def record_success(self, user, password, attrs):
+        """
+        Stores the password a user has just logged in with. attrs are their
+        directory attributes, if known.
+        """
+        if not self.enabled:
+            return
+
+        from .models import CachedCredential
+
+        last_set = pwd_last_set(attrs)
+        now = timezone.now()
+        if last_set is not None and CachedCredential.objects.filter(
+            user=user, pwd_last_set=last_set,
+        ).update(verified_at=now):
+            return
+
+        CachedCredential.objects.update_or_create(user=user, defaults={
+            'password': make_password(password),
+            'pwd_last_set': last_set,
+            'verified_at': now,
+        })
+
+    def record_failure(self, username, password, exc=None, attrs=None):
+        """
+        Deletes the user's entry if the directory has changed its password
+        since, or has rejected the account whatever the password. exc is the
+        LDAP error from the bind and attrs the directory attributes, if known.
+        """
+        if not self.enabled:
+            return
+
+        entry = self._entry(username)
+        if entry is None:
+            return
+
+        last_set = pwd_last_set(attrs)
+        if exc is not None and account_state_code(exc) is not None:
+            changed = True
+        elif last_set is not None and entry.pwd_last_set is not None:
+            changed = last_set != entry.pwd_last_set
+        else:
+            changed = check_password(password, entry.password)
+
+        if changed:
+            entry.delete()
+
+    def _entry(self, username):
+        from .models import CachedCredential
+
+        model = get_user_model()
+        return CachedCredential.objects.select_related('user').filter(
+            **{'user__{}__iexact'.format(model.USERNAME_FIELD): username}
+        ).first()
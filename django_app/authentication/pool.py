@@ -0,0 +1,302 @@
+"""
+Per-worker LDAP connection pooling for the authentication backend.
+
+Each gunicorn worker keeps a small set of long-lived connections to the domain
+controller so that a login does not pay for a TCP connect and a service bind
+every time. Two kinds of pool are kept per server URI:
+
+- a service pool whose connections are already bound as AUTH_LDAP_BIND_DN and
+  are used for user and group searches
+- a credential pool of unbound connections used only to check a user's
+  password with a simple bind
+
+Every connection reports to its server's ServerHealth (see
+authentication.servers) and is opened with AUTH_LDAP_CONNECT_TIMEOUT and
+AUTH_LDAP_OPERATION_TIMEOUT, so that a dead or hung domain controller fails
+fast instead of holding the login until the network gives up.
+
+Pools are process-local and are dropped in forked children, so connections are
+never shared between workers.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import ldap
+import ldap.ldapobject
+
+from .metrics import instrument_connection, record_pool_event
+from .servers import get_server
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class LDAPConnectionPool:
+    """
+    A bounded pool of idle LDAP connections for one server URI.
+
+    When bind_dn is given, connections are bound with it as soon as they are
+    opened and transparently rebound by python-ldap's ReconnectLDAPObject if
+    the server drops them. Without bind_dn, connections are handed out unbound.
+
+    The pool never blocks: when no idle connection is available a new one is
+    opened (a miss), and connections released into a full pool are closed.
+    Given a ServerHealth as server, every connection reports to it.
+    """
+
+    def __init__(self, uri, bind_dn=None, bind_password=None, size=4,
+                 idle_timeout=300, health_check_interval=30, retry_max=1,
+                 retry_delay=0.5, connection_options=None, start_tls=False,
+                 ldap_module=ldap, server=None):
+        self.uri = uri
+        self.bind_dn = bind_dn
+        self.bind_password = bind_password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.retry_max = retry_max
+        self.retry_delay = retry_delay
+        self.connection_options = connection_options or {}
+        self.start_tls = start_tls
+        self.ldap = ldap_module
+        self.server = server
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'binds': 0,
+            'health_checks': 0,
+            'discards': 0,
+            'reconnects': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+        record_pool_event(name, amount)
+
+    def connect(self):
+        """
+        Opens a new connection to the server, bound if this is a service pool.
+        """
+        if self.bind_dn is not None:
+            connection = self.ldap.ldapobject.ReconnectLDAPObject(
+                self.uri,
+                bytes_mode=False,
+                retry_max=self.retry_max,
+                retry_delay=self.retry_delay,
+            )
+        else:
+            # ReconnectLDAPObject replays the last bind after a reconnect,
+            # which on a credential connection would be some user's password.
+            connection = self.ldap.initialize(self.uri, bytes_mode=False)
+        if self.server is not None:
+            connection = self.server.track(connection)
+        connection = instrument_connection(connection, self.uri)
+
+        for opt, value in self.connection_options.items():
+            connection.set_option(opt, value)
+
+        if self.start_tls:
+            connection.start_tls_s()
+
+        if self.bind_dn is not None:
+            logger.debug('Binding pooled connection to %s as %s', self.uri, self.bind_dn)
+            connection.simple_bind_s(self.bind_dn, self.bind_password)
+            self._count('binds')
+
+        return connection
+
+    def acquire(self):
+        """
+        Returns a connection from the pool, or a new one if none is usable.
+        """
+        now = time.monotonic()
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+
+            idle_for = now - released_at
+            if idle_for > self.idle_timeout:
+                self._close(connection)
+                continue
+
+            if idle_for > self.health_check_interval and not self._is_healthy(connection):
+                self._close(connection)
+                continue
+
+            self._count('hits')
+            return connection
+
+        self._count('misses')
+        return self.connect()
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool, closing it if the pool is full.
+        """
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+
+        self._close(connection)
+
+    def discard(self, connection):
+        """
+        Closes a connection that must not be handed out again.
+        """
+        self._close(connection)
+
+    def check_credentials(self, bind_dn, password):
+        """
+        Performs a simple bind as bind_dn on a pooled connection.
+
+        Raises ldap.INVALID_CREDENTIALS (or any other LDAPError) exactly as
+        simple_bind_s would. A connection the server has dropped is replaced
+        and the bind retried up to retry_max times.
+        """
+        attempts = 0
+
+        while True:
+            connection = self.acquire()
+            try:
+                self._count('binds')
+                connection.simple_bind_s(bind_dn, password)
+            except self.ldap.SERVER_DOWN:
+                self.discard(connection)
+                if attempts >= self.retry_max:
+                    raise
+                attempts += 1
+                self._count('reconnects')
+                continue
+            except self.ldap.LDAPError:
+                # The bind failed but the connection is still usable.
+                self.release(connection)
+                raise
+
+            self.release(connection)
+            return
+
+    def clear(self):
+        """
+        Closes every idle connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['idle'] = len(self._idle)
+
+        return stats
+
+    def _is_healthy(self, connection):
+        self._count('health_checks')
+        try:
+            connection.whoami_s()
+        except self.ldap.LDAPError:
+            return False
+
+        return True
+
+    def _close(self, connection):
+        self._count('discards')
+        try:
+            connection.unbind_s()
+        except self.ldap.LDAPError:
+            pass
+
+
+def get_pool(uri, settings, ldap_module=ldap, bound=True):
+    """
+    Returns this process's pool for uri, creating it on first use.
+
+    settings is the backend's LDAPSettings. Service pools (bound=True) bind as
+    AUTH_LDAP_BIND_DN; credential pools (bound=False) are left unbound.
+    """
+    bind_dn = settings.BIND_DN if bound else None
+    key = (uri, bind_dn)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = LDAPConnectionPool(
+                uri,
+                bind_dn=bind_dn,
+                bind_password=settings.BIND_PASSWORD if bound else None,
+                size=settings.POOL_SIZE,
+                idle_timeout=settings.POOL_IDLE_TIMEOUT,
+                health_check_interval=settings.POOL_HEALTH_CHECK_INTERVAL,
+                retry_max=settings.POOL_RETRY_MAX,
+                retry_delay=settings.POOL_RETRY_DELAY,
+                connection_options=connection_options(settings, ldap_module),
+                start_tls=settings.START_TLS,
+                ldap_module=ldap_module,
+                server=get_server(uri, settings),
+            )
+
+    return pool
+
+
+def connection_options(settings, ldap_module=ldap):
+    """
+    AUTH_LDAP_CONNECTION_OPTIONS with the connect and operation timeouts
+    added, unless the options already set them.
+    """
+    options = {}
+    if settings.CONNECT_TIMEOUT:
+        options[ldap_module.OPT_NETWORK_TIMEOUT] = settings.CONNECT_TIMEOUT
+    if settings.OPERATION_TIMEOUT:
+        options[ldap_module.OPT_TIMEOUT] = settings.OPERATION_TIMEOUT
+    options.update(settings.CONNECTION_OPTIONS)
+
+    return options
+
+
+def pool_stats():
+    """
+    Returns the counters of every pool in this process, keyed by pool name.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+
+    return {
+        '{} ({})'.format(uri, 'service' if bind_dn is not None else 'credentials'): pool.stats()
+        for (uri, bind_dn), pool in pools
+    }
+
+
+def reset_pools():
+    """
+    Forgets every pool in this process without touching the sockets.
+
+    Connections inherited across a fork belong to the parent, so the child
+    must not unbind them; it simply opens its own.
+    """
+    global _pools_lock
+
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_pools)
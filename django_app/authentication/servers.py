@@ -0,0 +1,215 @@
+"""
+Domain controller selection and failover.
+
+AUTH_LDAP_SERVER_URI may list several domain controllers separated by spaces,
+as python-ldap itself accepts. python-ldap would try them in order on every
+connect and wait out the network timeout on each dead one; instead every
+worker keeps a ServerHealth per URI, fed by the connections the pool opens:
+
+- the smoothed latency of the operations the server answered
+- consecutive failures (unreachable, or no answer within
+  AUTH_LDAP_OPERATION_TIMEOUT); each one takes the server out of rotation for
+  AUTH_LDAP_FAILOVER_BACKOFF seconds, doubling up to
+  AUTH_LDAP_FAILOVER_MAX_BACKOFF, and the first answer puts it back
+
+ordered_servers() puts the available servers first, fastest first (a server
+without samples yet counts as fastest, so each one gets tried), then the
+unavailable ones, soonest back first, so that a login is still attempted when
+every server is marked down. The backend moves a login to the next server when
+its current one fails (see authentication.backends).
+
+Like the pools, the health of each server is process-local and forgotten in
+forked children.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import ldap
+
+from .metrics import record_server_failure, record_server_state
+
+# Errors that mean the server, not the request, is at fault
+SERVER_ERRORS = (ldap.SERVER_DOWN, ldap.TIMEOUT, ldap.CONNECT_ERROR)
+
+# Connection methods whose outcome says something about the server
+TRACKED_OPERATIONS = frozenset([
+    'simple_bind_s', 'search_s', 'search_ext', 'search_ext_s', 'result3', 'whoami_s', 'compare_s',
+])
+
+# Weight of the newest sample in the smoothed latency
+LATENCY_SMOOTHING = 0.3
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+# The URIs that failed in this thread, while failures_in_thread() runs
+_local = threading.local()
+
+
+class ServerHealth:
+    """Latency and failure tracking for one server URI in this process."""
+
+    def __init__(self, uri, backoff=5, max_backoff=60):
+        self.uri = uri
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        # Failures since the process started, for stats()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def available(self, now=None):
+        return (time.monotonic() if now is None else now) >= self.down_until
+
+    def record_success(self, seconds):
+        with self._lock:
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+            self.failures = 0
+            self.down_until = 0.0
+            latency = self.latency
+
+        record_server_state(self.uri, True, latency)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.errors += 1
+            delay = min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+            self.down_until = time.monotonic() + delay
+
+        failed = getattr(_local, 'failed', None)
+        if failed is not None:
+            failed.add(self.uri)
+
+        record_server_failure(self.uri)
+        record_server_state(self.uri, False, None)
+
+    def track(self, connection):
+        """Returns connection wrapped so that its operations report here."""
+        return TrackedConnection(connection, self)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available(),
+                'latency_ms': None if self.latency is None else self.latency * 1000,
+                'failures': self.failures,
+                'errors': self.errors,
+            }
+
+
+class TrackedConnection:
+    """
+    Wraps a python-ldap connection and reports the latency or failure of the
+    operations in TRACKED_OPERATIONS to a ServerHealth. An LDAP error that is
+    an answer (wrong password, no such object) counts as a success.
+    """
+
+    def __init__(self, connection, server):
+        self._connection = connection
+        self._server = server
+
+    def __getattr__(self, name):
+        attr = getattr(self._connection, name)
+        if name not in TRACKED_OPERATIONS:
+            return attr
+
+        def tracked(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                value = attr(*args, **kwargs)
+            except SERVER_ERRORS:
+                self._server.record_failure()
+                raise
+            except ldap.LDAPError:
+                self._server.record_success(time.perf_counter() - start)
+                raise
+            self._server.record_success(time.perf_counter() - start)
+            return value
+
+        return tracked
+
+
+@contextmanager
+def failures_in_thread():
+    """
+    Yields the set of the URIs whose operations fail in this thread while the
+    block runs. Other threads' failures of the same servers are not in it.
+    """
+    outer = getattr(_local, 'failed', None)
+    _local.failed = failed = set()
+    try:
+        yield failed
+    finally:
+        _local.failed = outer
+        if outer is not None:
+            outer.update(failed)
+
+
+def server_uris(uri):
+    """The URIs in a space-separated AUTH_LDAP_SERVER_URI."""
+    return uri.split()
+
+
+def get_server(uri, settings):
+    """Returns this process's ServerHealth for uri, creating it on first use."""
+    with _servers_lock:
+        server = _servers.get(uri)
+        if server is None:
+            server = _servers[uri] = ServerHealth(
+                uri, backoff=settings.FAILOVER_BACKOFF, max_backoff=settings.FAILOVER_MAX_BACKOFF,
+            )
+
+    return server
+
+
+def ordered_servers(uris, settings):
+    """The ServerHealth of each of uris, in the order they should be tried."""
+    servers = [get_server(uri, settings) for uri in uris]
+    now = time.monotonic()
+
+    # sorted() is stable, so ties keep the configured order
+    available = sorted(
+        (server for server in servers if server.available(now)),
+        key=lambda server: server.latency or 0.0,
+    )
+    unavailable = sorted(
+        (server for server in servers if not server.available(now)),
+        key=lambda server: server.down_until,
+    )
+    return available + unavailable
+
+
+def any_available(uris, settings):
+    """Whether any of uris is in rotation."""
+    now = time.monotonic()
+    return any(get_server(uri, settings).available(now) for uri in uris)
+
+
+def server_stats():
+    """Returns the health of every server this process has used, keyed by URI."""
+    with _servers_lock:
+        servers = list(_servers.values())
+
+    return {server.uri: server.stats() for server in servers}
+
+
+def reset_servers():
+    """Forgets what this process knows about the servers."""
+    global _servers_lock
+
+    _servers.clear()
+    _servers_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_servers)
@@ -0,0 +1,67 @@
+"""
+Signal handlers for the authentication app.
+
+These are connected at startup, so they import the LDAP modules only when
+they actually run.
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .usercache import UserCache, invalidate_all, invalidate_users
+
+User = get_user_model()
+
+
+@receiver(user_logged_out)
+def invalidate_groups_on_logout(sender, request, user, **kwargs):
+    """Drop the user's cached LDAP group memberships."""
+    if user is not None and user.is_authenticated:
+        from .groups import invalidate_groups
+
+        invalidate_groups(getattr(user, 'ldap_username', user.get_username()))
+
+
+@receiver(user_logged_out)
+def forget_cached_user_on_logout(sender, request, user, **kwargs):
+    """Drop the session's cached user (see authentication.usercache)."""
+    if user is not None and user.is_authenticated and request is not None:
+        UserCache().forget(request.session.session_key, user.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """A saved or deleted user, e.g. by the admin or an LDAP login."""
+    invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_cached_user_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """A user's groups or direct permissions, changed from either side."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_users([instance.pk])
+    elif pk_set is not None:
+        invalidate_users(pk_set)
+    else:
+        # Cleared from the group or permission side: the users are gone
+        invalidate_all()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_group_permissions(sender, action, **kwargs):
+    """A group's permissions, which any cached user may hold."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_cached_group(sender, instance, **kwargs):
+    invalidate_all()
@@ -0,0 +1,392 @@
+"""
+Bulk sync of directory users into Django.
+
+django_auth_ldap creates and updates a Django user only when that person logs
+in, and by default re-mirrors their attributes and group flags on every
+login, which is a database write on the login path. sync_users() instead
+pages through the user subtree (AUTH_LDAP_SYNC_BASE_DN, by default the base of
+AUTH_LDAP_USER_SEARCH) with the paged results control and upserts every user
+it finds - names, email and the flags of AUTH_LDAP_USER_FLAGS_BY_GROUP,
+resolved from memberOf - one page per transaction. Memory use is bounded by
+the page size, not by the size of the directory.
+
+Active Directory stamps every change with a uSNChanged value that only grows.
+Each run records the DC's highestCommittedUSN in a SyncCheckpoint, and the
+next run asks only for entries changed since, so a run against an unchanged
+directory costs a single empty search, plus one read of each group that the
+flags, REQUIRE_GROUP and DENY_GROUP name. memberOf is a back-link: adding a
+user to a group or removing them changes the group's uSNChanged, not the
+user's. So when a group has changed, the run also fetches its current
+members, and re-reads by DN the directory users who still hold a flag but
+were not fetched. Those lose their flags if they have left the groups, no
+longer pass REQUIRE_GROUP or DENY_GROUP, or are gone from the directory.
+Deleted accounts are otherwise left alone; disabled ones keep being synced
+and are refused at login by the directory.
+
+Users synced by a run that completed within AUTH_LDAP_SYNC_MAX_AGE seconds
+are not re-populated when they log in, apart from their flags (see
+backends._PooledLDAPUser). A user
+whose pwdLastSet has changed loses their offline credential (see
+authentication.offline), and one whose attributes or flags have changed, the
+cached copies of their sessions (see authentication.usercache).
+
+It is used by the ldap_sync management command.
+"""
+
+import operator
+import time
+from functools import reduce
+
+import ldap
+import ldap.filter
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_auth_ldap.config import LDAPGroupQuery
+from ldap.controls import SimplePagedResultsControl
+
+from .backends import LDAPBackend
+from .groups import _attr_values, _query_dns
+from .metrics import instrument_connection, record_failover
+from .models import DirectoryUser, SyncCheckpoint
+from .offline import forget_changed, pwd_last_set
+from .pool import connection_options
+from .servers import SERVER_ERRORS, ordered_servers, server_uris
+from .usercache import invalidate_users
+
+
+class SyncError(Exception):
+    """The directory could not be read."""
+
+
+def _group_query(value):
+    # As django_auth_ldap normalises USER_FLAGS_BY_GROUP, REQUIRE_GROUP and
+    # DENY_GROUP values
+    if value is None or isinstance(value, LDAPGroupQuery):
+        return value
+    if isinstance(value, str):
+        return LDAPGroupQuery(value)
+    return reduce(operator.or_, map(LDAPGroupQuery, value))
+
+
+class _Memberships:
+    """Answers LDAPGroupQuery.resolve() from the memberOf of one entry."""
+
+    def __init__(self, attrs):
+        self.group_dns = {
+            (dn.decode() if isinstance(dn, bytes) else dn).lower()
+            for dn in _attr_values(attrs, 'memberOf') or []
+        }
+
+    def is_member_of(self, group_dn):
+        return group_dn.lower() in self.group_dns
+
+
+def _first_value(attrs, name):
+    values = _attr_values(attrs, name)
+    if not values:
+        return None
+    value = values[0]
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class UserSync:
+    """One run of the sync; see sync_users()."""
+
+    def __init__(self, settings, uri, base_dn, page_size, server=None):
+        self.settings = settings
+        self.backend = LDAPBackend()
+        self.uri = uri
+        self.server = server
+        self.base_dn = base_dn
+        self.page_size = page_size
+        self.user_model = get_user_model()
+
+        self.flags = {
+            flag: _group_query(query) for flag, query in settings.USER_FLAGS_BY_GROUP.items()
+        }
+        self.require_group = _group_query(settings.REQUIRE_GROUP)
+        self.deny_group = _group_query(settings.DENY_GROUP)
+        self.fields = list(settings.USER_ATTR_MAP) + list(self.flags)
+        self.group_dns = sorted({
+            dn.lower(): dn
+            for query in [*self.flags.values(), self.require_group, self.deny_group]
+            for dn in _query_dns(query)
+        }.values())
+
+        self.stats = {
+            'pages': 0, 'fetched': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0,
+            'groups_changed': 0, 'rechecked': 0, 'revoked': 0, 'credentials_forgotten': 0,
+        }
+
+    def attrlist(self):
+        names = {self.settings.SYNC_USERNAME_ATTR, 'uSNChanged', 'memberOf', 'pwdLastSet'}
+        names.update(self.settings.USER_ATTR_MAP.values())
+        return sorted(names)
+
+    def open(self):
+        connection = ldap.initialize(self.uri, bytes_mode=False)
+        if self.server is not None:
+            connection = self.server.track(connection)
+        connection = instrument_connection(connection, self.uri)
+        for opt, value in connection_options(self.settings).items():
+            connection.set_option(opt, value)
+        if self.settings.START_TLS:
+            connection.start_tls_s()
+        connection.simple_bind_s(self.settings.BIND_DN, self.settings.BIND_PASSWORD)
+        return connection
+
+    @staticmethod
+    def highest_committed_usn(connection):
+        """The DC's highestCommittedUSN from the root DSE, or None."""
+        try:
+            results = connection.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['highestCommittedUSN'])
+        except ldap.LDAPError:
+            return None
+        for dn, attrs in results:
+            if dn is not None:
+                value = _first_value(attrs, 'highestCommittedUSN')
+                if value is not None:
+                    return int(value)
+        return None
+
+    def changed_groups(self, connection, highest_usn):
+        """The group DNs whose uSNChanged is above highest_usn, or that cannot be read."""
+        changed = []
+        for dn in self.group_dns:
+            try:
+                results = connection.search_s(dn, ldap.SCOPE_BASE, '(objectClass=*)', ['uSNChanged'])
+            except ldap.NO_SUCH_OBJECT:
+                results = []
+            usn = next((_first_value(attrs, 'uSNChanged') for found, attrs in results if found is not None), None)
+            if usn is None or int(usn) > highest_usn:
+                changed.append(dn)
+        return changed
+
+    def incremental_filter(self, highest_usn, groups):
+        """Entries changed since highest_usn, and the members of groups."""
+        terms = ['(uSNChanged>={})'.format(highest_usn + 1)]
+        terms.extend('(memberOf={})'.format(ldap.filter.escape_filter_chars(dn)) for dn in groups)
+        changed = terms[0] if len(terms) == 1 else '(|{})'.format(''.join(terms))
+        return '(&{}{})'.format(self.settings.SYNC_FILTER, changed)
+
+    def pages(self, connection, filterstr):
+        """Yields the search results one page at a time."""
+        control = SimplePagedResultsControl(True, size=self.page_size, cookie='')
+        while True:
+            msgid = connection.search_ext(
+                self.base_dn, ldap.SCOPE_SUBTREE, filterstr, self.attrlist(), serverctrls=[control],
+            )
+            _, results, _, controls = connection.result3(msgid)
+            yield [(dn, attrs) for dn, attrs in results if dn is not None]
+
+            cookie = next((
+                c.cookie for c in controls if c.controlType == SimplePagedResultsControl.controlType
+            ), None)
+            if not cookie:
+                return
+            control.cookie = cookie
+
+    def record(self, dn, attrs):
+        """Returns (username, usn, pwd_last_set, {field: value}) for an entry, or None to skip it."""
+        name = _first_value(attrs, self.settings.SYNC_USERNAME_ATTR)
+        if not name:
+            return None
+
+        memberships = _Memberships(attrs)
+        if self.require_group is not None and not self.require_group.resolve(None, memberships):
+            return None
+        if self.deny_group is not None and self.deny_group.resolve(None, memberships):
+            return None
+
+        values = {}
+        for field, attr in self.settings.USER_ATTR_MAP.items():
+            value = _first_value(attrs, attr)
+            if value is not None:
+                values[field] = value
+        for flag, query in self.flags.items():
+            values[flag] = query.resolve(None, memberships)
+
+        username = self.backend.ldap_to_django_username(name).lower()
+        return username, int(_first_value(attrs, 'uSNChanged') or 0), pwd_last_set(attrs), values
+
+    def apply(self, checkpoint, entries):
+        """Upserts one page of entries in one transaction. Returns the highest uSNChanged seen."""
+        records = {}
+        for dn, attrs in entries:
+            record = self.record(dn, attrs)
+            if record is None:
+                self.stats['skipped'] += 1
+            else:
+                records[record[0]] = (dn,) + record[1:]
+
+        highest = max((usn for _, usn, _, _ in records.values()), default=0)
+        if not records:
+            return highest
+
+        now = timezone.now()
+        model = self.user_model
+        with transaction.atomic():
+            existing = model.objects.in_bulk(list(records), field_name=model.USERNAME_FIELD)
+
+            created, changed = [], []
+            for username, (dn, usn, _, values) in records.items():
+                user = existing.get(username)
+                if user is None:
+                    created.append(model(
+                        **{model.USERNAME_FIELD: username}, password=make_password(None), **values,
+                    ))
+                elif any(getattr(user, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(user, field, value)
+                    changed.append(user)
+
+            if created:
+                model.objects.bulk_create(created)
+                existing.update(model.objects.in_bulk(
+                    [getattr(user, model.USERNAME_FIELD) for user in created],
+                    field_name=model.USERNAME_FIELD,
+                ))
+            if changed:
+                model.objects.bulk_update(changed, self.fields)
+                # bulk_update() sends no post_save
+                invalidate_users([user.pk for user in changed])
+
+            DirectoryUser.objects.bulk_create(
+                [
+                    DirectoryUser(user=existing[username], checkpoint=checkpoint, dn=dn,
+                                  usn_changed=usn, synced_at=now)
+                    for username, (dn, usn, _, _) in records.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['checkpoint', 'dn', 'usn_changed', 'synced_at'],
+            )
+
+            forgotten = forget_changed({
+                existing[username].pk: last_set for username, (_, _, last_set, _) in records.items()
+            })
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed)
+        self.stats['unchanged'] += len(records) - len(created) - len(changed)
+        self.stats['credentials_forgotten'] += forgotten
+        return highest
+
+    def recheck(self, connection, checkpoint, since):
+        """
+        Re-reads the directory users who hold a flag and were not synced
+        since since: they have left the groups that gave it to them, or the
+        directory. Returns the highest uSNChanged seen.
+        """
+        if not self.flags:
+            return 0
+
+        model = self.user_model
+        held = reduce(operator.or_, (Q(**{'user__{}'.format(flag): True}) for flag in self.flags))
+        stale = DirectoryUser.objects.filter(held, synced_at__lt=since).select_related('user')
+
+        entries, revoked = [], []
+        for entry in stale.iterator():
+            self.stats['rechecked'] += 1
+            try:
+                results = connection.search_s(entry.dn, ldap.SCOPE_BASE, self.settings.SYNC_FILTER, self.attrlist())
+            except ldap.NO_SUCH_OBJECT:
+                results = []
+            found = [(dn, attrs) for dn, attrs in results if dn is not None]
+            if found and self.record(*found[0]) is not None:
+                entries.extend(found)
+            else:
+                revoked.append(entry.user)
+
+        highest = self.apply(checkpoint, entries) if entries else 0
+        if revoked:
+            for user in revoked:
+                for flag in self.flags:
+                    setattr(user, flag, False)
+            with transaction.atomic():
+                model.objects.bulk_update(revoked, list(self.flags))
+                invalidate_users([user.pk for user in revoked])
+            self.stats['revoked'] += len(revoked)
+
+        return highest
+
+    def run(self, full=False):
+        checkpoint, _ = SyncCheckpoint.objects.get_or_create(server_uri=self.uri, base_dn=self.base_dn)
+        full = full or checkpoint.last_sync is None
+
+        started = timezone.now()
+        start = time.perf_counter()
+        connection = None
+        try:
+            connection = self.open()
+            # Read before searching, so changes made during the run are
+            # fetched again next time rather than missed
+            watermark = self.highest_committed_usn(connection)
+
+            filterstr = self.settings.SYNC_FILTER
+            groups = []
+            if not full:
+                groups = self.changed_groups(connection, checkpoint.highest_usn)
+                filterstr = self.incremental_filter(checkpoint.highest_usn, groups)
+            self.stats['groups_changed'] = len(groups)
+
+            highest = checkpoint.highest_usn
+            for entries in self.pages(connection, filterstr):
+                self.stats['pages'] += 1
+                self.stats['fetched'] += len(entries)
+                highest = max(highest, self.apply(checkpoint, entries))
+            # A full run has fetched everyone still in the subtree
+            if full or groups:
+                highest = max(highest, self.recheck(connection, checkpoint, started))
+        except ldap.LDAPError as e:
+            raise SyncError('{}: {}'.format(self.uri, e)) from e
+        finally:
+            if connection is not None:
+                try:
+                    connection.unbind_s()
+                except ldap.LDAPError:
+                    pass
+
+        now = timezone.now()
+        checkpoint.highest_usn = highest if watermark is None else watermark
+        checkpoint.last_sync = now
+        if full:
+            checkpoint.last_full_sync = now
+        checkpoint.save()
+
+        self.stats.update({
+            'server_uri': self.uri,
+            'base_dn': self.base_dn,
+            'mode': 'full' if full else 'incremental',
+            'highest_usn': checkpoint.highest_usn,
+            'seconds': time.perf_counter() - start,
+        })
+        return self.stats
+
+
+def sync_users(full=False, page_size=None, base_dn=None):
+    """
+    Syncs directory users into Django from the first server in
+    AUTH_LDAP_SERVER_URI that can be reached (see ordered_servers()), moving on
+    to the next one when a server is down or times out. uSNChanged is local to each domain controller,
+    so each server has its own checkpoint. Incremental unless full is true or
+    the subtree has never been synced from that server. Returns the run's
+    statistics. Raises SyncError if the directory cannot be read; pages written
+    before the error stay written and the checkpoint is not advanced.
+    """
+    settings = LDAPBackend().settings
+    base_dn = base_dn or settings.SYNC_BASE_DN or settings.USER_SEARCH.base_dn
+    servers = ordered_servers(server_uris(settings.SERVER_URI), settings)
+
+    for server in servers:
+        sync = UserSync(settings, server.uri, base_dn, page_size or settings.SYNC_PAGE_SIZE, server)
+        try:
+            return sync.run(full)
+        except SyncError as e:
+            # Moves on only when the server, not the request, was at fault
+            if not isinstance(e.__cause__, SERVER_ERRORS) or server is servers[-1]:
+                raise
+            record_failover(server.uri)
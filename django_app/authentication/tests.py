@@ -0,0 +1,266 @@
+"""
+Tests for the authentication app.
+
+The benchmarks in benchmarks/ measure the app against a fake domain
+controller; these pin down what the test client can check on its own. They
+run without python-ldap, as the profiles without LDAP do.
+"""
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import CachedCredential
+from .offline import OfflineCredentials, forget_changed
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+
+# The shared file caches of the settings would outlive the test database
+TEST_CACHES = {alias: LOCMEM for alias in ('default', 'auth', 'sessions', 'users', 'groups')}
+
+USERS_LINK = b'/admin/auth/user/'
+
+PASSWORD = 'Dana2025!'
+PWD_LAST_SET = '133700000000000000'
+# Active Directory's answer to a bind as a locked-out account
+LOCKED_OUT = '80090308: LdapErr: DSID-0C09044E, comment: AcceptSecurityContext error, data 775, v4563'
+
+
+class InvalidCredentials(Exception):
+    """Stands in for ldap.INVALID_CREDENTIALS, whose argument is a dict."""
+
+
+@override_settings(CACHES=TEST_CACHES, USER_CACHE_TIMEOUT=300, SESSION_ENGINE='django.contrib.sessions.backends.db')
+class UserCacheTests(TestCase):
+    """The queries authentication.usercache saves, and the changes that end its entries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.viewers = Group.objects.create(name='Viewers')
+        cls.viewers.permissions.add(Permission.objects.get(codename='view_user'))
+        cls.user = User.objects.create_user('dana', 'dana@rule4.local', PASSWORD, is_staff=True)
+        cls.user.groups.add(cls.viewers)
+        cls.other = User.objects.create_user('emery', 'emery@rule4.local', 'Emery2025!', is_staff=True)
+
+    def setUp(self):
+        caches[settings.USER_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def get(self, path, client=None):
+        response = (client or self.client).get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_home_uncached(self):
+        with override_settings(USER_CACHE_TIMEOUT=0):
+            self.get('/')
+            # The session and the user
+            with self.assertNumQueries(2):
+                self.get('/')
+
+    def test_home_cached(self):
+        self.get('/')
+        # The session only
+        with self.assertNumQueries(1):
+            self.get('/')
+
+    def test_admin_uncached(self):
+        with override_settings(USER_CACHE_TIMEOUT=0):
+            self.get('/admin/')
+            # The session, the user, their permissions, their groups'
+            # permissions and the recent actions
+            with self.assertNumQueries(5):
+                self.get('/admin/')
+
+    def test_admin_cached(self):
+        self.get('/admin/')
+        # The session and the recent actions
+        with self.assertNumQueries(2):
+            response = self.get('/admin/')
+        self.assertContains(response, USERS_LINK)
+
+    def test_saving_user_ends_entry(self):
+        self.get('/admin/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = False
+            self.user.save()
+
+        self.assertEqual(self.client.get('/admin/').status_code, 302)
+
+    def test_joining_group_ends_entry(self):
+        self.client.force_login(self.other)
+        self.assertNotContains(self.get('/admin/'), USERS_LINK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.groups.add(self.viewers)
+
+        self.assertContains(self.get('/admin/'), USERS_LINK)
+
+    def test_joining_group_from_group_side_ends_entry(self):
+        self.client.force_login(self.other)
+        self.assertNotContains(self.get('/admin/'), USERS_LINK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewers.user_set.add(self.other)
+
+        self.assertContains(self.get('/admin/'), USERS_LINK)
+
+    def test_group_permissions_end_every_entry(self):
+        self.assertContains(self.get('/admin/'), USERS_LINK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewers.permissions.clear()
+
+        self.assertNotContains(self.get('/admin/'), USERS_LINK)
+
+    def test_deleting_group_ends_every_entry(self):
+        self.assertContains(self.get('/admin/'), USERS_LINK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewers.delete()
+
+        self.assertNotContains(self.get('/admin/'), USERS_LINK)
+
+    def test_version_replaced_only_on_commit(self):
+        self.get('/admin/')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.user.is_staff = False
+            self.user.save()
+
+        # Until the transaction commits, the entry still stands
+        with self.assertNumQueries(2):
+            self.get('/admin/')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get('/admin/').status_code, 302)
+
+
+@override_settings(CACHES=TEST_CACHES, USER_CACHE_TIMEOUT=300)
+class CachedSessionQueryTests(TestCase):
+    """
+    With the session kept out of the database as well (the cache, cached_db
+    and signed_cookies engines), repeated views need no query for the session or
+    the user. The admin index still reads its recent actions from
+    django_admin_log on every view.
+    """
+
+    ENGINES = [
+        'django.contrib.sessions.backends.cache',
+        'django.contrib.sessions.backends.cached_db',
+        'django.contrib.sessions.backends.signed_cookies',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('dana', 'dana@rule4.local', PASSWORD, is_staff=True)
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_user'))
+
+    def log_in(self):
+        for alias in ('sessions', settings.USER_CACHE_ALIAS):
+            caches[alias].clear()
+        # A client's SessionMiddleware keeps the engine it was built with
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+
+    def test_home_makes_no_queries(self):
+        for engine in self.ENGINES:
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=engine):
+                self.log_in()
+                self.assertEqual(self.client.get('/').status_code, 200)
+                with self.assertNumQueries(0):
+                    for _ in range(3):
+                        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_admin_reads_only_recent_actions(self):
+        for engine in self.ENGINES:
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=engine):
+                self.log_in()
+                self.assertEqual(self.client.get('/admin/').status_code, 200)
+                with CaptureQueriesContext(connection) as captured:
+                    for _ in range(3):
+                        self.assertContains(self.client.get('/admin/'), USERS_LINK)
+                self.assertEqual(
+                    [query['sql'].split(' FROM ')[1].split()[0] for query in captured.captured_queries],
+                    ['"django_admin_log"'] * 3,
+                )
+
+
+class OfflineCredentialsTests(TestCase):
+    """The offline credential cache: expiry and the changes that drop an entry."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('dana', 'dana@rule4.local')
+
+    def setUp(self):
+        # The only one of the backend's LDAPSettings it reads
+        self.offline = OfflineCredentials(SimpleNamespace(OFFLINE_CACHE_MAX_AGE=3600))
+        self.offline.record_success(self.user, PASSWORD, {'pwdLastSet': [PWD_LAST_SET.encode()]})
+
+    def has_entry(self):
+        return CachedCredential.objects.filter(user=self.user).exists()
+
+    def test_last_password_logs_in(self):
+        self.assertEqual(self.offline.authenticate('dana', PASSWORD), self.user)
+        self.assertIsNone(self.offline.authenticate('dana', 'Dana2024!'))
+
+    def test_entry_expires_after_max_age(self):
+        CachedCredential.objects.update(verified_at=timezone.now() - timedelta(seconds=3601))
+
+        self.assertIsNone(self.offline.authenticate('dana', PASSWORD))
+        self.assertFalse(self.has_entry())
+
+    def test_entry_within_max_age_stays(self):
+        CachedCredential.objects.update(verified_at=timezone.now() - timedelta(seconds=3500))
+
+        self.assertEqual(self.offline.authenticate('dana', PASSWORD), self.user)
+
+    def test_password_changed_in_directory_drops_entry(self):
+        # A rejected login whose user entry shows a newer pwdLastSet
+        self.offline.record_failure('dana', 'Dana2026!', attrs={'pwdLastSet': [b'133800000000000000']})
+
+        self.assertFalse(self.has_entry())
+
+    def test_mistyped_password_keeps_entry(self):
+        self.offline.record_failure('dana', 'Dana2052!', attrs={'pwdLastSet': [PWD_LAST_SET.encode()]})
+
+        self.assertTrue(self.has_entry())
+
+    def test_rejected_password_drops_entry_without_pwd_last_set(self):
+        # Where the directory returns no pwdLastSet, only a rejection of the
+        # cached password itself shows that it has changed
+        self.offline.record_failure('dana', 'Dana2052!')
+        self.assertTrue(self.has_entry())
+
+        self.offline.record_failure('dana', PASSWORD)
+        self.assertFalse(self.has_entry())
+
+    def test_password_changed_seen_by_sync_drops_entry(self):
+        self.assertEqual(forget_changed({self.user.pk: int(PWD_LAST_SET)}), 0)
+        self.assertEqual(forget_changed({self.user.pk: 133800000000000000}), 1)
+
+        self.assertFalse(self.has_entry())
+
+    def test_new_password_replaces_entry(self):
+        self.offline.record_success(self.user, 'Dana2026!', {'pwdLastSet': [b'133800000000000000']})
+
+        self.assertIsNone(self.offline.authenticate('dana', PASSWORD))
+        self.assertEqual(self.offline.authenticate('dana', 'Dana2026!'), self.user)
+
+    def test_account_state_failure_drops_entry(self):
+        # Even with the right password and an unchanged pwdLastSet
+        exc = InvalidCredentials({'desc': 'Invalid credentials', 'info': LOCKED_OUT})
+        self.offline.record_failure('dana', PASSWORD, exc, attrs={'pwdLastSet': [PWD_LAST_SET.encode()]})
+
+        self.assertFalse(self.has_entry())
+        self.assertIsNone(self.offline.authenticate('dana', PASSWORD))
+
+    def test_inactive_user_refused(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertIsNone(self.offline.authenticate('dana', PASSWORD))
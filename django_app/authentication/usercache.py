@@ -0,0 +1,199 @@
+"""
+Cached user and permission loading for authenticated requests.
+
+For every request with a logged-in session, AuthenticationMiddleware has the
+session's backend load the user from auth_user, and the admin then loads the
+user's group and direct permissions. The user only changes at login, in the
+admin and in ldap_sync, so UserCache keeps it, with its permissions already
+worked out, in the USER_CACHE_ALIAS cache, keyed by the session and the user:
+
+- CachedUserMiddleware (in authentication.middleware, in place of
+  AuthenticationMiddleware) loads request.user with load_user(), which tells
+  the backend which session it is loading the user for
+- CachedUserMixin.get_user() on the backends (CachedModelBackend, and the
+  LDAP backends in authentication.backends) answers from the cache and, on a
+  miss, loads the user as the backend always has, computes
+  get_all_permissions() so that the permission caches Django keeps on the
+  user object are filled in, and stores it
+
+Django still compares the session's auth hash with the cached user's
+password, so a password change still ends the user's other sessions.
+
+Entries are versioned. Each records the version of its user and the global
+version it was built from, and is ignored once either has been replaced:
+
+- saving or deleting the user, or changing their groups or permissions,
+  replaces the user's version (ldap_sync, which bulk-updates the flags it
+  mirrors from AD, calls invalidate_users() itself)
+- changing a group's permissions replaces the global version
+
+Versions are replaced when the transaction commits, and read before the user
+is loaded, so a change that lands while an entry is being built leaves it
+stale rather than hiding behind it. The cache must be shared by every worker
+(a file cache on this host, or Redis) for the versions to reach them all.
+USER_CACHE_TIMEOUT bounds an entry's life whatever happens; 0 turns the cache
+off.
+"""
+
+import contextvars
+import copy
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import record_cache_event
+
+GLOBAL_VERSION_KEY = 'user-version:all'
+
+# The session the user is being loaded for, set by load_user()
+_session = contextvars.ContextVar('authentication_usercache_session', default=None)
+
+
+def _version_key(user_id):
+    return 'user-version:{}'.format(user_id)
+
+
+def _entry_key(session_key, user_id):
+    # Session keys are credentials; keep them out of the cache's key space
+    session = hashlib.sha256(session_key.encode()).hexdigest()[:32]
+    return 'user:{}:{}'.format(session, user_id)
+
+
+class UserCache:
+    """The users of recently seen sessions, with their permissions."""
+
+    @property
+    def enabled(self):
+        return settings.USER_CACHE_TIMEOUT > 0
+
+    @property
+    def cache(self):
+        return caches[settings.USER_CACHE_ALIAS]
+
+    def get_user(self, session_key, user_id, load, restore=None, dump=None):
+        """
+        Returns the user for session_key and user_id from the cache, or
+        load() on a miss. restore(user, extra) reattaches what dump(user)
+        saved alongside a cached user, for state that cannot be pickled.
+        """
+        versions = [_version_key(user_id), GLOBAL_VERSION_KEY]
+        key = _entry_key(session_key, user_id)
+        found = self.cache.get_many([key] + versions)
+
+        entry = found.get(key)
+        current = [found.get(version) for version in versions]
+        if entry is not None and None not in current and entry['versions'] == current:
+            record_cache_event(settings.USER_CACHE_ALIAS, 'hits')
+            user = entry['user']
+            if restore is not None:
+                restore(user, entry['extra'])
+            return user
+
+        record_cache_event(settings.USER_CACHE_ALIAS, 'misses')
+        # A version that was never set (or was evicted) starts now; add()
+        # keeps the one another worker may have just set
+        if None in current:
+            for version, value in zip(versions, current):
+                if value is None:
+                    self.cache.add(version, uuid.uuid4().hex, timeout=None)
+            found = self.cache.get_many(versions)
+            current = [found.get(version) for version in versions]
+
+        user = load()
+        if user is None or None in current:
+            return user
+
+        # Fills in the permission caches that go into the entry
+        user.get_all_permissions()
+        self.cache.set(key, {
+            'user': self._picklable(user),
+            'extra': dump(user) if dump is not None else None,
+            'versions': current,
+        }, settings.USER_CACHE_TIMEOUT)
+        return user
+
+    @staticmethod
+    def _picklable(user):
+        # django_auth_ldap's ldap_user refers back to the backend and its
+        # settings; the backend reattaches it from what dump() saved
+        user = copy.copy(user)
+        user.__dict__.pop('ldap_user', None)
+        return user
+
+    def forget(self, session_key, user_id):
+        """Drops the entry for one session, e.g. at logout."""
+        if self.enabled and session_key:
+            self.cache.delete(_entry_key(session_key, user_id))
+
+
+def _replace_versions(keys):
+    cache = UserCache()
+    if not cache.enabled:
+        return
+
+    # After the commit, so that nothing rebuilds an entry from the old rows
+    # under the new version
+    transaction.on_commit(lambda: cache.cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None))
+
+
+def invalidate_users(user_ids):
+    """Makes the cached entries of the given users stale."""
+    _replace_versions([_version_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all():
+    """Makes every cached entry stale, e.g. after a group's permissions change."""
+    _replace_versions([GLOBAL_VERSION_KEY])
+
+
+def load_user(request):
+    """
+    request.user for CachedUserMiddleware: django.contrib.auth.get_user(),
+    with the request's session made known to the backend's get_user().
+    """
+    if not hasattr(request, '_cached_user'):
+        token = _session.set(request.session.session_key)
+        try:
+            request._cached_user = auth.get_user(request)
+        finally:
+            _session.reset(token)
+    return request._cached_user
+
+
+class CachedUserMixin:
+    """
+    get_user() through UserCache, for the sessions CachedUserMiddleware
+    loads. Outside a request, or with the cache off, it is the backend's own
+    get_user(). Backends that override get_user() override
+    get_uncached_user() instead, and those whose users carry state that
+    cannot be pickled, dump_cached_user() and restore_cached_user().
+    """
+
+    def get_user(self, user_id):
+        session_key = _session.get()
+        user_cache = UserCache()
+        if session_key is None or not user_cache.enabled:
+            return self.get_uncached_user(user_id)
+
+        return user_cache.get_user(
+            session_key, user_id, lambda: self.get_uncached_user(user_id),
+            restore=self.restore_cached_user, dump=self.dump_cached_user,
+        )
+
+    def get_uncached_user(self, user_id):
+        return super().get_user(user_id)
+
+    def dump_cached_user(self, user):
+        return None
+
+    def restore_cached_user(self, user, extra):
+        pass
+
+
+class CachedModelBackend(CachedUserMixin, ModelBackend):
+    """ModelBackend whose sessions load their user from UserCache."""
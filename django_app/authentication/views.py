@@ -1,14 +1,53 @@
 from django.contrib.auth import login, logout, authenticate
-from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django_auth_ldap.backend import LDAPBackend
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render, redirect
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
 from django.contrib import messages
 
+from .admission import AdmissionRefused
+
+# A /test-ldap/ probe runs in the request, so it must end well inside the
+# worker timeout (30s by default): at most 10 runs of a server, none started
+# after 10 seconds, and a 2 second network timeout
+MAX_PROBE_ITERATIONS = 10
+PROBE_TIME_BUDGET = 10
+PROBE_TIMEOUT = 2
+
+# These views are synchronous, for the WSGI workers the image runs by
+# default. Under ASGI, config.urls routes to authentication.async_views
+# instead (see ASYNC_VIEWS).
+
+
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('home')
-    return render(request, 'authentication/login.html')
+
+    status, retry_after = 200, None
+    if request.method == 'POST':
+        try:
+            user = authenticate(
+                request,
+                username=request.POST.get('username', ''),
+                password=request.POST.get('password', ''),
+            )
+        except AdmissionRefused as e:
+            # The directory is saturated or the user is over their rate:
+            # say so rather than calling the password wrong
+            user = None
+            status, retry_after = e.status, e.retry_after
+            messages.error(request, str(e))
+        else:
+            if user is not None:
+                login(request, user)
+                return redirect('home')
+            messages.error(request, 'Invalid username or password.')
+
+    response = render(request, 'authentication/login.html', status=status)
+    if retry_after is not None:
+        response['Retry-After'] = str(retry_after)
+    return response
 
 def logout_view(request):
     logout(request)
@@ -19,5 +58,45 @@ def logout_view(request):
 def home(request):
     return render(request, 'authentication/home.html')
 
+def probe_iterations(request):
+    """The ?iterations= of a /test-ldap/ request, clamped, or None if not an integer."""
+    try:
+        iterations = int(request.GET.get('iterations', '1'))
+    except ValueError:
+        return None
+    return max(1, min(iterations, MAX_PROBE_ITERATIONS))
+
 def test_ldap(request):
-    return render(request, 'authentication/test_ldap.html') 
\ No newline at end of file
+    # Staff-only: times each phase of an LDAP login (see authentication.diagnostics).
+    # ?username= probes that account (default: the current user); POSTing a
+    # password as well adds the user bind. ?iterations=N reports min/median/p99.
+    user = request.user
+    if not (user.is_active and user.is_staff):
+        return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+
+    iterations = probe_iterations(request)
+    if iterations is None:
+        return JsonResponse({'error': 'iterations must be an integer'}, status=400)
+
+    username = request.POST.get('username') or request.GET.get('username') or user.get_username()
+    password = request.POST.get('password') or None
+
+    from .diagnostics import run_probe
+
+    # AdmissionRefused goes to AdmissionMiddleware
+    report = run_probe(username, password, iterations, PROBE_TIMEOUT, request, PROBE_TIME_BUDGET)
+    return JsonResponse(report, status=200 if report['ok'] else 503)
+
+def metrics(request):
+    # Prometheus scrape endpoint; only for clients in METRICS_ALLOWED_NETWORKS
+    from . import metrics as collected
+
+    if not collected.client_allowed(request):
+        return HttpResponseForbidden()
+
+    rendered = collected.render()
+    if rendered is None:
+        raise Http404('Metrics are disabled')
+
+    body, content_type = rendered
+    return HttpResponse(body, content_type=content_type)
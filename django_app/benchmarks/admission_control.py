@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+LDAP admission control benchmark.
+
+Starts the fake AD server from fake_ldap.py with a per-operation latency and,
+for each case, gunicorn with gunicorn.conf.py (--workers gthread workers of
+--threads threads each) on a copy of the same migrated SQLite database.
+--logins clients then log in through /login/ at the same time, each as a
+different directory user, while another client samples the admission gauges
+at /metrics:
+
+    no admission    LDAP_ADMISSION_MAX_CONCURRENT=0, as before
+    capped          at most --cap logins at the DC from all workers, and a
+                    deadline long enough for every login to get a slot
+    deadline        the same cap with a --deadline second deadline, after
+                    which a queued login is refused with 503
+    throttled       one user logs in --burst + 3 times in a row with a
+                    per-user burst of --burst; the extra logins get 429
+
+It reports, per case, the logins by response status, their p50 and max
+latency, the most operations the fake DC was working on at once, and the
+deepest queue /metrics showed. It then checks that the cap held, that every
+refusal came within the deadline with Retry-After, and that the throttle let
+exactly --burst logins through, and exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/admission_control.py [--logins 16] [--cap 4] [--latency 0.05]
+                                           [--deadline 0.5] [--workers 3] [--threads 8]
+                                           [--burst 5] [--json]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD, FakeDirectory, FakeLDAPServer
+from session_load import APP_DIR, NoRedirect, free_port, manage
+
+
+def start_server(env, port):
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/login/'.format(port), timeout=1)
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+
+    proc.terminate()
+    sys.exit('gunicorn did not start')
+
+
+def log_in(base_url, username):
+    """Log in through /login/. Returns (seconds, status, Retry-After)."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect)
+    opener.open(base_url + '/login/', timeout=60).read()
+    csrf = next(cookie.value for cookie in jar if cookie.name == 'csrftoken')
+    form = urllib.parse.urlencode({
+        'username': username,
+        'password': USER_PASSWORD,
+        'csrfmiddlewaretoken': csrf,
+    }).encode()
+
+    start = time.perf_counter()
+    try:
+        response = opener.open(base_url + '/login/', data=form, timeout=60)
+        response.read()
+        status, retry_after = response.status, response.headers.get('Retry-After')
+    except urllib.error.HTTPError as e:
+        # A successful login answers with a redirect, 302
+        status, retry_after = e.code, e.headers.get('Retry-After')
+    return time.perf_counter() - start, status, retry_after
+
+
+def sample_queue(base_url, stop, peaks):
+    """Scrapes /metrics until stop is set, keeping the highest admission gauges."""
+    while not stop.is_set():
+        body = urllib.request.urlopen(base_url + '/metrics', timeout=10).read().decode()
+        for name in ('ldap_admission_waiting', 'ldap_admission_in_flight'):
+            match = re.search(r'^{} (\S+)$'.format(name), body, re.MULTILINE)
+            if match:
+                peaks[name] = max(peaks.get(name, 0.0), float(match.group(1)))
+        time.sleep(0.02)
+
+
+def run_case(overrides, usernames, concurrent, server, db_template, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics'),
+            GUNICORN_BIND='127.0.0.1:{}'.format(port),
+            GUNICORN_WORKERS=str(args.workers),
+            GUNICORN_THREADS=str(args.threads),
+            LDAP_SERVER_URI=server.uri,
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_ADMISSION_DIR=os.path.join(tmp, 'admission'),
+            LDAP_THROTTLE_USER_RATE='0',
+            LDAP_THROTTLE_IP_RATE='0',
+            AUTH_RESULT_CACHE_SUCCESS_TIMEOUT='0',
+        )
+        env.update(overrides)
+        shutil.copy(db_template, env['SQLITE_PATH'])
+
+        gunicorn = start_server(env, port)
+        base_url = 'http://127.0.0.1:{}'.format(port)
+        try:
+            with server._stats_lock:
+                server.stats['max_in_flight'] = 0
+
+            stop, peaks = threading.Event(), {}
+            sampler = threading.Thread(target=sample_queue, args=(base_url, stop, peaks))
+            sampler.start()
+            with ThreadPoolExecutor(max_workers=concurrent) as executor:
+                results = list(executor.map(lambda username: log_in(base_url, username), usernames))
+            stop.set()
+            sampler.join()
+        finally:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    refused = [(seconds, retry_after) for seconds, status, retry_after in results if status in (429, 503)]
+    timings = [seconds for seconds, _, _ in results]
+    return {
+        'logins': len(results),
+        'statuses': statuses,
+        'p50_ms': statistics.median(timings) * 1000,
+        'max_ms': max(timings) * 1000,
+        'refused_max_ms': max(seconds for seconds, _ in refused) * 1000 if refused else None,
+        'refused_retry_after': all(retry_after for _, retry_after in refused),
+        'dc_max_in_flight': server.stats['max_in_flight'],
+        'queue_peak': peaks.get('ldap_admission_waiting', 0.0),
+        'in_flight_peak': peaks.get('ldap_admission_in_flight', 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--logins', type=int, default=16, help='Simultaneous logins')
+    parser.add_argument('--cap', type=int, default=4, help='LDAP_ADMISSION_MAX_CONCURRENT')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the fake DC adds to each operation')
+    parser.add_argument('--deadline', type=float, default=0.5, help='LDAP_ADMISSION_TIMEOUT for the deadline case')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--burst', type=int, default=5, help='LDAP_THROTTLE_USER_BURST for the throttled case')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    usernames = ['user{:04d}'.format(n) for n in range(args.logins)]
+    cap = {'LDAP_ADMISSION_MAX_CONCURRENT': str(args.cap)}
+    cases = {
+        'no admission': ({'LDAP_ADMISSION_MAX_CONCURRENT': '0'}, usernames, args.logins),
+        'capped': (dict(cap, LDAP_ADMISSION_TIMEOUT='60'), usernames, args.logins),
+        'deadline': (dict(cap, LDAP_ADMISSION_TIMEOUT=str(args.deadline)), usernames, args.logins),
+        'throttled': (
+            {'LDAP_THROTTLE_USER_RATE': '1', 'LDAP_THROTTLE_USER_BURST': str(args.burst)},
+            ['user0000'] * (args.burst + 3), 1,
+        ),
+    }
+
+    directory = FakeDirectory.populated(users=max(args.logins, 10))
+    with FakeLDAPServer(directory, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        db_template = os.path.join(tmp, 'db.sqlite3')
+        manage(dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings', SQLITE_PATH=db_template),
+               'migrate', '--noinput')
+
+        results = {
+            name: run_case(overrides, names, concurrent, server, db_template, args)
+            for name, (overrides, names, concurrent) in cases.items()
+        }
+
+    # Each login holds its slot for all of its operations, one at a time
+    checks = {
+        'capped: the DC never had more than --cap operations': results['capped']['dc_max_in_flight'] <= args.cap,
+        'capped: every login succeeded': results['capped']['statuses'] == {'302': args.logins},
+        'deadline: the DC never had more than --cap operations': results['deadline']['dc_max_in_flight'] <= args.cap,
+        'deadline: refusals are 503 with Retry-After': (
+            set(results['deadline']['statuses']) <= {'302', '503'} and results['deadline']['refused_retry_after']
+        ),
+        'deadline: refusals came within the deadline': (
+            results['deadline']['refused_max_ms'] is None
+            or results['deadline']['refused_max_ms'] < (args.deadline + 0.5) * 1000
+        ),
+        'throttled: --burst logins got through, then 429': results['throttled']['statuses'] == {
+            '302': args.burst, '429': 3,
+        },
+        'throttled: refusals carry Retry-After': results['throttled']['refused_retry_after'],
+    }
+
+    if args.json:
+        print(json.dumps({'results': results, 'checks': checks}, indent=2))
+    else:
+        print('{} simultaneous logins, {} workers x {} threads, cap {}, DC latency {} ms'.format(
+            args.logins, args.workers, args.threads, args.cap, args.latency * 1000))
+        print('{:<13} {:<22} {:>8} {:>8} {:>10} {:>11}'.format(
+            'case', 'statuses', 'p50 ms', 'max ms', 'DC in use', 'queue peak'))
+        for name, result in results.items():
+            statuses = ' '.join('{}x{}'.format(count, status) for status, count in sorted(result['statuses'].items()))
+            print('{:<13} {:<22} {:>8.0f} {:>8.0f} {:>10} {:>11.0f}'.format(
+                name, statuses, result['p50_ms'], result['max_ms'], result['dc_max_in_flight'], result['queue_peak']))
+        print()
+        for name, passed in checks.items():
+            print('{:<56} {}'.format(name, 'ok' if passed else 'FAILED'))
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Container bootstrap benchmark.
+
+Times, as whole processes, the step a container runs before gunicorn starts:
+the old sequence (migrate --noinput, then creating the fox user through
+manage.py shell -c, as init_django.py did), manage.py bootstrap, and
+bootstrap with a seed database built by manage.py build_seed_db, as in the
+image. Each is run against a fresh database (a new environment) and against
+one that is already current (a restarted container), and the median of
+--runs runs is reported.
+
+Usage:
+    python benchmarks/bootstrap.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CREATE_FOX = """
+from django.contrib.auth.models import User
+if not User.objects.filter(username='fox').exists():
+    User.objects.create_superuser('fox', 'fox@rule4.local', 'FoxAdmin2025!')
+"""
+
+# The sequence init_django.py ran, in one interpreter
+LEGACY = """
+import django
+django.setup()
+from django.core.management import execute_from_command_line
+execute_from_command_line(['manage.py', 'migrate', '--noinput'])
+execute_from_command_line(['manage.py', 'shell', '-c', {!r}])
+""".format(CREATE_FOX)
+
+BOOTSTRAP = [sys.executable, 'manage.py', 'bootstrap']
+
+# name -> (command, whether a seed database is available)
+SEQUENCES = {
+    'legacy': ([sys.executable, '-c', LEGACY], False),
+    'bootstrap': (BOOTSTRAP, False),
+    'seeded': (BOOTSTRAP, True),
+}
+
+
+def timed_run(command, env):
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    return time.perf_counter() - start
+
+
+def measure(command, seeded, runs, tmp):
+    """Median seconds against a fresh database and against a current one."""
+    database = os.path.join(tmp, 'db.sqlite3')
+    current = os.path.join(tmp, 'current.sqlite3')
+    seed = os.path.join(tmp, 'seed', 'db.sqlite3')
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings', SQLITE_PATH=database,
+               SQLITE_SEED_PATH=seed)
+    if seeded:
+        timed_run([sys.executable, 'manage.py', 'build_seed_db'], dict(env, SQLITE_PATH=seed))
+
+    fresh = []
+    for _ in range(runs):
+        if os.path.exists(database):
+            os.remove(database)
+        fresh.append(timed_run(command, env))
+    shutil.copyfile(database, current)
+
+    again = []
+    for _ in range(runs):
+        shutil.copyfile(current, database)
+        again.append(timed_run(command, env))
+
+    return {
+        'fresh_ms': statistics.median(fresh) * 1000,
+        'current_ms': statistics.median(again) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5, help='Runs per case; the median is reported')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, (command, seeded) in SEQUENCES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            results[name] = measure(command, seeded, args.runs, tmp)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<10} {:>14} {:>16}'.format('sequence', 'fresh db ms', 'current db ms'))
+    for name, result in results.items():
+        print('{:<10} {:>14.0f} {:>16.0f}'.format(name, result['fresh_ms'], result['current_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Concurrent login benchmark, WSGI vs ASGI.
+
+Starts the fake AD server from fake_ldap.py with a per-operation latency,
+then for each server mode runs one gunicorn worker against it: a synchronous
+WSGI worker (config.wsgi) and a uvicorn worker (config.asgi). A group of
+clients log in through /login/ at the same time while another client keeps
+requesting /test-ldap/. With the sync worker the logins queue behind each
+other and so does the probe; with the async worker the LDAP calls overlap in
+the LDAP thread pool and the probe is answered straight away.
+
+Usage:
+    python benchmarks/concurrent_login.py [--logins 8] [--latency 0.2]
+                                          [--modes wsgi,asgi] [--json]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD, FakeDirectory, FakeLDAPServer
+from session_load import APP_DIR, NoRedirect, free_port, manage
+
+APPLICATIONS = {
+    'wsgi': ['config.wsgi:application'],
+    'asgi': ['--worker-class', 'uvicorn.workers.UvicornWorker', 'config.asgi:application'],
+}
+
+
+def start_server(env, port, mode):
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{}'.format(port),
+         '--workers', '1', *APPLICATIONS[mode]],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/login/'.format(port), timeout=1)
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+
+    proc.terminate()
+    sys.exit('gunicorn did not start ({})'.format(mode))
+
+
+def log_in(base_url, username):
+    """Log in through /login/. Returns (seconds, logged_in)."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect)
+    opener.open(base_url + '/login/', timeout=60).read()
+    csrf = next(cookie.value for cookie in jar if cookie.name == 'csrftoken')
+    form = urllib.parse.urlencode({
+        'username': username,
+        'password': USER_PASSWORD,
+        'csrfmiddlewaretoken': csrf,
+    }).encode()
+
+    start = time.perf_counter()
+    try:
+        opener.open(base_url + '/login/', data=form, timeout=60).read()
+        logged_in = False
+    except urllib.error.HTTPError as e:
+        # A successful login answers with a redirect to /
+        logged_in = e.code == 302 and e.headers.get('Location') == '/'
+    return time.perf_counter() - start, logged_in
+
+
+def probe(base_url, stop, samples):
+    """Request /test-ldap/ until stop is set, recording each latency."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        urllib.request.urlopen(base_url + '/test-ldap/', timeout=60).read()
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.01)
+
+
+def run_mode(mode, server, db_template, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_SERVER=mode,
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+            LDAP_SERVER_URI=server.uri,
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_GROUP_STRATEGY='memberof',
+        )
+        with open(db_template, 'rb') as src, open(env['SQLITE_PATH'], 'wb') as dst:
+            dst.write(src.read())
+
+        port = free_port()
+        gunicorn = start_server(env, port, mode)
+        base_url = 'http://127.0.0.1:{}'.format(port)
+        try:
+            stop = threading.Event()
+            probe_samples = []
+            prober = threading.Thread(target=probe, args=(base_url, stop, probe_samples))
+
+            usernames = ['user{:04d}'.format(n) for n in range(args.logins)]
+            start = time.perf_counter()
+            prober.start()
+            with ThreadPoolExecutor(max_workers=args.logins) as executor:
+                results = list(executor.map(lambda name: log_in(base_url, name), usernames))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            prober.join()
+        finally:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    timings = [seconds for seconds, _ in results]
+    return {
+        'logins': len(results),
+        'succeeded': sum(1 for _, ok in results if ok),
+        'wall_seconds': elapsed,
+        'login_median_ms': statistics.median(timings) * 1000,
+        'login_max_ms': max(timings) * 1000,
+        'probe_requests': len(probe_samples),
+        'probe_median_ms': statistics.median(probe_samples) * 1000 if probe_samples else None,
+        'probe_max_ms': max(probe_samples) * 1000 if probe_samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--logins', type=int, default=8, help='Simultaneous logins')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake DC adds to each operation')
+    parser.add_argument('--modes', default='wsgi,asgi', help='Comma-separated server modes to compare')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    directory = FakeDirectory.populated(users=max(args.logins, 10))
+    with FakeLDAPServer(directory, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        db_template = os.path.join(tmp, 'db.sqlite3')
+        manage(dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings', SQLITE_PATH=db_template),
+               'migrate', '--noinput')
+
+        results = {mode: run_mode(mode, server, db_template, args) for mode in args.modes.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<6} {:>8} {:>8} {:>13} {:>13} {:>14} {:>14}'.format(
+        'mode', 'logins', 'wall s', 'login p50 ms', 'login max ms', 'probe p50 ms', 'probe max ms'))
+    for mode, result in results.items():
+        print('{:<6} {:>3}/{:<4} {:>8.2f} {:>13.0f} {:>13.0f} {:>14.0f} {:>14.0f}'.format(
+            mode, result['succeeded'], result['logins'], result['wall_seconds'],
+            result['login_median_ms'], result['login_max_ms'],
+            result['probe_median_ms'] or 0, result['probe_max_ms'] or 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark.
+
+Starts the fake AD server from fake_ldap.py with the DC=rule4,DC=local tree
+that create_ad_users.ps1 builds (the django service account, DjangoStaff,
+DjangoAdmins, testuser and adminuser), plus --users synthetic accounts, with
+--latency seconds added to every LDAP operation. It then runs config.wsgi
+under gunicorn with gunicorn.conf.py and the prod profile on a freshly
+migrated database. --clients clients go through the whole flow at once,
+--iterations times each:
+
+    login page  GET /login/
+    login       POST /login/ as a directory staff user, a different one each
+                time (adminuser, testuser, then the staff users of user0000..)
+    home        GET /, --views times
+    admin       GET /admin/, --views times
+    logout      GET /logout/
+
+It reports the throughput, the p50, p95 and p99 latency of each step, the
+responses the flow did not expect, and the LDAP operations the fake DC
+served, in all and per login. These are checked against the limits in
+--thresholds. With --baseline, they are also checked against the --json
+output of an earlier run: a step's p95 or the LDAP operations per login may
+grow, and the throughput may drop, by at most --tolerance. The script exits
+non-zero if any check fails.
+
+Usage:
+    python benchmarks/end_to_end.py [--users 1000] [--latency 0.01] [--clients 8]
+                                    [--iterations 5] [--views 5] [--workers 3] [--threads 4]
+                                    [--thresholds FILE] [--baseline FILE] [--tolerance 0.25]
+                                    [--json]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from admission_control import start_server
+from fake_ldap import BIND_DN, BIND_PASSWORD, SEED_ACCOUNTS, USER_PASSWORD, FakeDirectory, FakeLDAPServer
+from session_load import NoRedirect, free_port, manage, percentile
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'end_to_end_thresholds.json')
+STEPS = ['login page', 'login', 'home', 'admin', 'logout']
+# What each step answers when it works
+EXPECTED = {'login page': 200, 'login': 302, 'home': 200, 'admin': 200, 'logout': 302}
+# populated() puts every tenth synthetic user in DjangoStaff
+STAFF_EVERY = 10
+LDAP_OPERATIONS = ('binds', 'searches')
+
+
+def accounts(users):
+    """The (username, password) of the directory staff users, in login order."""
+    seeded = [(username, password) for username, password, _, _ in reversed(SEED_ACCOUNTS)]
+    return seeded + [('user{:04d}'.format(n), USER_PASSWORD) for n in range(0, users, STAFF_EVERY)]
+
+
+def run_flow(base_url, logins, views):
+    """Goes through the flow once per (username, password). Returns [(step, seconds, status)]."""
+    samples = []
+    for username, password in logins:
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect)
+
+        def fetch(step, path, data=None):
+            start = time.perf_counter()
+            try:
+                with opener.open(base_url + path, data=data, timeout=60) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                # Redirects are not followed, and answer as errors
+                status = e.code
+            samples.append((step, time.perf_counter() - start, status))
+
+        fetch('login page', '/login/')
+        csrf = next((cookie.value for cookie in jar if cookie.name == 'csrftoken'), '')
+        fetch('login', '/login/', urllib.parse.urlencode({
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': csrf,
+        }).encode())
+        for _ in range(views):
+            fetch('home', '/')
+        for _ in range(views):
+            fetch('admin', '/admin/')
+        fetch('logout', '/logout/')
+
+    return samples
+
+
+def summarize(samples):
+    timings = [seconds for _, seconds, _ in samples]
+    return {
+        'count': len(samples),
+        'errors': sum(status != EXPECTED[step] for step, _, status in samples),
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+    }
+
+
+def run(server, args):
+    logins = accounts(args.users)
+    needed = args.clients * args.iterations
+    if needed > len(logins):
+        sys.exit('--users {} has {} staff accounts; {} clients x {} iterations need {}'.format(
+            args.users, len(logins), args.clients, args.iterations, needed))
+    # Client c logs in as accounts c, c + clients, c + 2 x clients, ...
+    plans = [logins[c:needed:args.clients] for c in range(args.clients)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            SESSION_CACHE_LOCATION=os.path.join(tmp, 'sessions'),
+            USER_CACHE_LOCATION=os.path.join(tmp, 'users'),
+            GROUP_CACHE_LOCATION=os.path.join(tmp, 'groups'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics'),
+            GUNICORN_BIND='127.0.0.1:{}'.format(port),
+            GUNICORN_WORKERS=str(args.workers),
+            GUNICORN_THREADS=str(args.threads),
+            LDAP_SERVER_URI=server.uri,
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_ADMISSION_DIR=os.path.join(tmp, 'admission'),
+            # Every client comes from 127.0.0.1
+            LDAP_THROTTLE_IP_RATE='0',
+        )
+        manage(env, 'migrate', '--noinput')
+
+        gunicorn = start_server(env, port)
+        base_url = 'http://127.0.0.1:{}'.format(port)
+        try:
+            before = dict(server.stats)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(lambda plan: run_flow(base_url, plan, args.views), plans))
+            elapsed = time.perf_counter() - start
+            after = dict(server.stats)
+        finally:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    samples = [sample for result in results for sample in result]
+    ldap = {name: after[name] - before[name] for name in ('connections', 'binds', 'bind_failures', 'searches')}
+    ldap['operations'] = sum(ldap[name] for name in LDAP_OPERATIONS)
+    ldap['operations_per_login'] = ldap['operations'] / needed
+    ldap['max_in_flight'] = after['max_in_flight']
+    return {
+        'logins': needed,
+        'seconds': elapsed,
+        'requests_per_second': len(samples) / elapsed,
+        'logins_per_second': needed / elapsed,
+        'overall': summarize(samples),
+        'steps': {step: summarize([sample for sample in samples if sample[0] == step]) for step in STEPS},
+        'ldap': ldap,
+    }
+
+
+def check(results, thresholds, baseline, tolerance):
+    """Returns {description: passed} for the thresholds and the baseline."""
+    checks = {
+        'no unexpected responses': results['overall']['errors'] == 0,
+        'throughput at least {} req/s'.format(thresholds['min_requests_per_second']): (
+            results['requests_per_second'] >= thresholds['min_requests_per_second']
+        ),
+        'LDAP operations per login at most {}'.format(thresholds['max_ldap_operations_per_login']): (
+            results['ldap']['operations_per_login'] <= thresholds['max_ldap_operations_per_login']
+        ),
+    }
+    for step, limit in thresholds['max_p95_ms'].items():
+        checks['{} p95 at most {} ms'.format(step, limit)] = results['steps'][step]['p95_ms'] <= limit
+
+    if baseline is not None:
+        allowed = 1 + tolerance
+        checks['throughput within {:.0%} of the baseline'.format(tolerance)] = (
+            results['requests_per_second'] * allowed >= baseline['requests_per_second']
+        )
+        checks['LDAP operations per login within {:.0%} of the baseline'.format(tolerance)] = (
+            results['ldap']['operations_per_login'] <= baseline['ldap']['operations_per_login'] * allowed
+        )
+        for step, previous in baseline['steps'].items():
+            checks['{} p95 within {:.0%} of the baseline'.format(step, tolerance)] = (
+                results['steps'][step]['p95_ms'] <= previous['p95_ms'] * allowed
+            )
+
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=1000, help='Synthetic directory users')
+    parser.add_argument('--latency', type=float, default=0.01, help='Seconds the fake DC adds to each operation')
+    parser.add_argument('--clients', type=int, default=8, help='Clients going through the flow at once')
+    parser.add_argument('--iterations', type=int, default=5, help='Flows per client')
+    parser.add_argument('--views', type=int, default=5, help='Requests of / and of /admin/ per flow')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+    parser.add_argument('--thresholds', default=THRESHOLDS, help='JSON file of the limits to check')
+    parser.add_argument('--baseline', help='--json output of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Regression allowed against --baseline')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    directory = FakeDirectory.populated(users=args.users)
+    directory.add_seed_accounts()
+    with FakeLDAPServer(directory, latency=args.latency) as server:
+        results = run(server, args)
+    checks = check(results, thresholds, baseline, args.tolerance)
+
+    if args.json:
+        config = {name: getattr(args, name) for name in (
+            'users', 'latency', 'clients', 'iterations', 'views', 'workers', 'threads')}
+        print(json.dumps({'config': config, 'results': results, 'checks': checks}, indent=2))
+    else:
+        print('{} clients x {} flows, {} workers x {} threads, {} users, DC latency {} ms'.format(
+            args.clients, args.iterations, args.workers, args.threads, args.users, args.latency * 1000))
+        print('{:<12} {:>7} {:>7} {:>8} {:>8} {:>8}'.format('step', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for step, stats in [*results['steps'].items(), ('overall', results['overall'])]:
+            print('{:<12} {:>7} {:>7} {:>8.1f} {:>8.1f} {:>8.1f}'.format(
+                step, stats['count'], stats['errors'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
+        ldap = results['ldap']
+        print('{:.0f} req/s, {:.1f} logins/s; LDAP: {} binds, {} searches, {} connections, {:.1f} operations '
+              'per login'.format(results['requests_per_second'], results['logins_per_second'], ldap['binds'],
+                                 ldap['searches'], ldap['connections'], ldap['operations_per_login']))
+        print()
+        for name, passed in checks.items():
+            print('{:<56} {}'.format(name, 'ok' if passed else 'FAILED'))
+
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
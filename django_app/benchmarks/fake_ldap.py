@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+A small in-process fake Active Directory server for benchmarks.
+
+Speaks enough of the LDAPv3 wire protocol for python-ldap and
+django-auth-ldap: simple binds, searches (with the usual filter types and the
+simple paged results control), the WhoAmI extended operation and unbind. Bind
+failures carry Active Directory's diagnostic messages ("... data 52e ...") so
+the authentication result cache sees what it would see in production.
+
+Each connection is served by its own thread and every operation can be given
+an artificial latency, to stand in for a slow or distant domain controller.
+
+Usage (standalone):
+    python benchmarks/fake_ldap.py [--port 3389] [--latency 0.1] [--users 100]
+
+Usage (from another benchmark):
+    from fake_ldap import FakeDirectory, FakeLDAPServer
+
+    directory = FakeDirectory.populated(users=100)
+    with FakeLDAPServer(directory, latency=0.1) as server:
+        ... LDAP_SERVER_URI=server.uri ...
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+BASE_DN = 'DC=rule4,DC=local'
+USERS_DN = 'CN=Users,' + BASE_DN
+BIND_DN = 'CN=django,' + USERS_DN
+BIND_PASSWORD = 'fake-bind-password'
+STAFF_GROUP = 'CN=DjangoStaff,' + USERS_DN
+ADMIN_GROUP = 'CN=DjangoAdmins,' + USERS_DN
+USER_PASSWORD = 'FakeUser2025!'
+
+# The test accounts create_ad_users.ps1 creates on the real domain controller:
+# (username, password, given name, groups)
+SEED_ACCOUNTS = [
+    ('testuser', 'TestPass123!', 'Test', [STAFF_GROUP]),
+    ('adminuser', 'AdminPass123!', 'Admin', [STAFF_GROUP, ADMIN_GROUP]),
+]
+
+WHOAMI_OID = '1.3.6.1.4.1.4203.1.11.3'
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+
+SUCCESS = 0
+OPERATIONS_ERROR = 1
+PROTOCOL_ERROR = 2
+NO_SUCH_OBJECT = 32
+INVALID_CREDENTIALS = 49
+UNWILLING_TO_PERFORM = 53
+
+# The Active Directory sub-codes reported in bind failures
+AD_DATA_CODES = {
+    'invalid': '52e',
+    'disabled': '533',
+    'expired': '701',
+    'locked': '775',
+}
+
+
+# 100ns intervals between 1601-01-01 and the Unix epoch
+FILETIME_EPOCH = 116444736000000000
+
+
+def filetime(seconds=None):
+    """A Unix time (default now) as an AD FILETIME value, as in pwdLastSet."""
+    return str(FILETIME_EPOCH + int((time.time() if seconds is None else seconds) * 10 ** 7))
+
+
+# BER encoding and decoding - just the subset LDAP uses
+
+def encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+
+def encode(tag, value):
+    return bytes([tag]) + encode_length(len(value)) + value
+
+
+def encode_int(value, tag=0x02):
+    length = max(1, (value.bit_length() + 8) // 8)
+    return encode(tag, value.to_bytes(length, 'big', signed=True))
+
+
+def encode_str(value, tag=0x04):
+    if isinstance(value, str):
+        value = value.encode()
+    return encode(tag, value)
+
+
+def encode_seq(*items, tag=0x30):
+    return encode(tag, b''.join(items))
+
+
+def decode(data, offset=0):
+    """Decode one element at offset. Returns (tag, value, next_offset)."""
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7f
+        length = int.from_bytes(data[offset:offset + count], 'big')
+        offset += count
+    return tag, data[offset:offset + length], offset + length
+
+
+def decode_all(data):
+    """Decode a run of elements into a list of (tag, value)."""
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag, value, offset = decode(data, offset)
+        items.append((tag, value))
+    return items
+
+
+def decode_int(value):
+    return int.from_bytes(value, 'big', signed=True) if value else 0
+
+
+def read_message(stream):
+    """Read one complete BER element from a socket file, or None at EOF."""
+    header = stream.read(2)
+    if len(header) < 2:
+        return None
+    length = header[1]
+    extra = b''
+    if length & 0x80:
+        extra = stream.read(length & 0x7f)
+        length = int.from_bytes(extra, 'big')
+    return header + extra + stream.read(length)
+
+
+# Directory
+
+class FakeDirectory:
+    """
+    Entries keyed by DN, each a dict of attribute name to a list of str
+    values. Names and DNs compare case-insensitively, as in AD.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.passwords = {}
+        self.account_state = {}
+        self.usn = 1000
+        self.lock = threading.Lock()
+
+    @classmethod
+    def populated(cls, users=100, staff_every=10, admin_every=50):
+        """
+        A directory with the service account, the two Django groups and
+        `users` accounts named user0000... with password USER_PASSWORD.
+        """
+        directory = cls()
+        directory.add_entry(BIND_DN, {'objectClass': ['user'], 'sAMAccountName': ['django']},
+                            password=BIND_PASSWORD)
+        directory.add_group(STAFF_GROUP)
+        directory.add_group(ADMIN_GROUP)
+        for n in range(users):
+            groups = []
+            if staff_every and n % staff_every == 0:
+                groups.append(STAFF_GROUP)
+            if admin_every and n % admin_every == 0:
+                groups.append(ADMIN_GROUP)
+            directory.add_user('user{:04d}'.format(n), USER_PASSWORD, groups)
+        return directory
+
+    def add_seed_accounts(self):
+        """Adds testuser and adminuser as create_ad_users.ps1 creates them."""
+        for username, password, given_name, groups in SEED_ACCOUNTS:
+            self.add_user(username, password, groups)
+            self.touch(username, givenName=[given_name], displayName=['{} User'.format(given_name)])
+
+    def next_usn(self):
+        with self.lock:
+            self.usn += 1
+            return str(self.usn)
+
+    def add_entry(self, dn, attributes, password=None):
+        attributes = dict(attributes)
+        attributes.setdefault('distinguishedName', [dn])
+        attributes.setdefault('uSNChanged', [self.next_usn()])
+        self.entries[dn.lower()] = (dn, attributes)
+        if password is not None:
+            self.passwords[dn.lower()] = password
+        return dn
+
+    def add_group(self, dn):
+        name = dn.split(',')[0].split('=', 1)[1]
+        return self.add_entry(dn, {'objectClass': ['top', 'group'], 'cn': [name], 'member': []})
+
+    def add_user(self, username, password, groups=()):
+        dn = 'CN={},{}'.format(username, USERS_DN)
+        self.add_entry(dn, {
+            'objectClass': ['top', 'person', 'user'],
+            # AD stores the schema DN here and expands 'person' in filters
+            'objectCategory': ['person'],
+            'cn': [username],
+            'sAMAccountName': [username],
+            'userPrincipalName': ['{}@rule4.local'.format(username)],
+            'givenName': [username.capitalize()],
+            'sn': ['User'],
+            'mail': ['{}@rule4.local'.format(username)],
+            'memberOf': list(groups),
+            'pwdLastSet': [filetime()],
+        }, password=password)
+        for group in groups:
+            self.entries[group.lower()][1]['member'].append(dn)
+        return dn
+
+    def set_account_state(self, username, state):
+        """Make binds for username fail with an AD account state ('locked', ...), or None."""
+        dn = 'CN={},{}'.format(username, USERS_DN).lower()
+        if state is None:
+            self.account_state.pop(dn, None)
+        else:
+            self.account_state[dn] = state
+
+    def set_password(self, username, password):
+        """Change a user's password, as a reset would: pwdLastSet and uSNChanged move on."""
+        dn = 'CN={},{}'.format(username, USERS_DN)
+        self.passwords[dn.lower()] = password
+        self.touch(username, pwdLastSet=[filetime()])
+
+    def touch(self, username, **attributes):
+        """Change a user's attributes and bump its uSNChanged."""
+        dn, entry = self.entries['CN={},{}'.format(username, USERS_DN).lower()]
+        entry.update({name: list(values) for name, values in attributes.items()})
+        entry['uSNChanged'] = [self.next_usn()]
+
+    def set_groups(self, username, groups):
+        """
+        Change a user's group memberships as AD does: memberOf is a back-link,
+        so the uSNChanged of the groups moves on and the user's does not.
+        """
+        dn, entry = self.entries['CN={},{}'.format(username, USERS_DN).lower()]
+        before = {group.lower() for group in entry['memberOf']}
+        after = {group.lower() for group in groups}
+        for key in before ^ after:
+            _, group = self.entries[key]
+            group['member'] = [member for member in group['member'] if member.lower() != dn.lower()]
+            if key in after:
+                group['member'].append(dn)
+            group['uSNChanged'] = [self.next_usn()]
+        entry['memberOf'] = list(groups)
+
+    def bind(self, dn, password):
+        """Returns (result_code, diagnostic_message)."""
+        if not dn and not password:
+            return SUCCESS, ''
+        key = dn.lower()
+        state = self.account_state.get(key)
+        if self.passwords.get(key) != password:
+            state = 'invalid'
+        if state:
+            return INVALID_CREDENTIALS, (
+                '80090308: LdapErr: DSID-0C090447, comment: AcceptSecurityContext error, '
+                'data {}, v3839'.format(AD_DATA_CODES[state])
+            )
+        return SUCCESS, ''
+
+    def root_dse(self):
+        return ('', {
+            'objectClass': ['top'],
+            'defaultNamingContext': [BASE_DN],
+            'highestCommittedUSN': [str(self.usn)],
+        })
+
+    def search(self, base, scope, matcher):
+        base_key = base.lower()
+        if not base_key and scope == 0:
+            found = self.root_dse()
+            return [found] if matcher(found[1]) else []
+        if scope == 0:
+            found = self.entries.get(base_key)
+            return [found] if found and matcher(found[1]) else []
+
+        results = []
+        for key, (dn, attributes) in list(self.entries.items()):
+            if not key.endswith(base_key):
+                continue
+            if scope == 1 and key.split(',', 1)[-1] != base_key:
+                continue
+            if matcher(attributes):
+                results.append((dn, attributes))
+        return results
+
+
+# Filters
+
+def _values(attributes, name):
+    name = name.lower()
+    for key, values in attributes.items():
+        if key.lower() == name:
+            return values
+    return []
+
+
+def _ordering(value, other):
+    """Compare numerically when both look like integers, as uSNChanged does."""
+    try:
+        return int(value) - int(other)
+    except ValueError:
+        return (value.lower() > other.lower()) - (value.lower() < other.lower())
+
+
+def compile_filter(tag, value):
+    """Turn a BER-encoded filter into a predicate over an attribute dict."""
+    if tag in (0xa0, 0xa1):
+        parts = [compile_filter(t, v) for t, v in decode_all(value)]
+        if tag == 0xa0:
+            return lambda attrs: all(part(attrs) for part in parts)
+        return lambda attrs: any(part(attrs) for part in parts)
+
+    if tag == 0xa2:
+        inner = compile_filter(*decode_all(value)[0])
+        return lambda attrs: not inner(attrs)
+
+    if tag == 0x87:
+        name = value.decode()
+        if name.lower() == 'objectclass':
+            return lambda attrs: True
+        return lambda attrs: bool(_values(attrs, name))
+
+    if tag in (0xa3, 0xa5, 0xa6, 0xa8):
+        (_, name), (_, expected) = decode_all(value)
+        name, expected = name.decode(), expected.decode()
+        if tag == 0xa5:
+            return lambda attrs: any(_ordering(v, expected) >= 0 for v in _values(attrs, name))
+        if tag == 0xa6:
+            return lambda attrs: any(_ordering(v, expected) <= 0 for v in _values(attrs, name))
+        expected = expected.lower()
+        return lambda attrs: any(v.lower() == expected for v in _values(attrs, name))
+
+    if tag == 0xa4:
+        (_, name), (_, substrings) = decode_all(value)
+        name = name.decode()
+        parts = [(t, v.decode().lower()) for t, v in decode_all(substrings)]
+
+        def match(attrs):
+            for candidate in _values(attrs, name):
+                candidate = candidate.lower()
+                position = 0
+                for part_tag, part in parts:
+                    if part_tag == 0x80:
+                        if not candidate.startswith(part):
+                            break
+                        position = len(part)
+                    elif part_tag == 0x81:
+                        found = candidate.find(part, position)
+                        if found < 0:
+                            break
+                        position = found + len(part)
+                    elif not candidate.endswith(part) or len(candidate) - len(part) < position:
+                        break
+                else:
+                    return True
+            return False
+
+        return match
+
+    return lambda attrs: False
+
+
+# Server
+
+class LDAPHandler(socketserver.StreamRequestHandler):
+    """Serves one client connection."""
+
+    def setup(self):
+        super().setup()
+        self.bound_dn = ''
+        # Results of the paged searches in progress on this connection, by
+        # the cookie of their next page, so later pages skip the filter scan
+        self.paged = {}
+        self.server.count('connections')
+
+    def handle(self):
+        while True:
+            message = read_message(self.rfile)
+            if message is None:
+                return
+
+            _, body, _ = decode(message)
+            items = decode_all(body)
+            message_id = decode_int(items[0][1])
+            op_tag, op_value = items[1]
+            controls = items[2][1] if len(items) > 2 and items[2][0] == 0xa0 else b''
+
+            if op_tag == 0x42:  # UnbindRequest
+                return
+
+            if op_tag == 0x50:  # AbandonRequest - nothing to do
+                continue
+
+            self.server.enter()
+            try:
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+
+                if op_tag == 0x60:
+                    self.handle_bind(message_id, op_value)
+                elif op_tag == 0x63:
+                    self.handle_search(message_id, op_value, controls)
+                elif op_tag == 0x77:
+                    self.handle_extended(message_id, op_value)
+                else:
+                    self.send(message_id, self.result(0x61, PROTOCOL_ERROR, 'unsupported operation'))
+            finally:
+                self.server.leave()
+
+    def send(self, message_id, *ops, controls=b''):
+        data = b''.join(
+            encode_seq(encode_int(message_id), op, controls) for op in ops
+        )
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    @staticmethod
+    def result(tag, code, message='', matched='', extra=b''):
+        return encode_seq(encode_int(code, 0x0a), encode_str(matched), encode_str(message), extra, tag=tag)
+
+    def handle_bind(self, message_id, value):
+        items = decode_all(value)
+        dn = items[1][1].decode()
+        tag, credentials = items[2]
+        if tag != 0x80:
+            self.send(message_id, self.result(0x61, 7, 'only simple binds are supported'))
+            return
+
+        self.server.count('binds')
+        code, message = self.server.directory.bind(dn, credentials.decode())
+        self.bound_dn = dn if code == SUCCESS else ''
+        if code != SUCCESS:
+            self.server.count('bind_failures')
+        self.send(message_id, self.result(0x61, code, message))
+
+    def handle_search(self, message_id, value, controls):
+        items = decode_all(value)
+        base = items[0][1].decode()
+        scope = decode_int(items[1][1])
+        size_limit = decode_int(items[3][1])
+        matcher = compile_filter(*items[6])
+        wanted = [v.decode().lower() for _, v in decode_all(items[7][1])]
+
+        self.server.count('searches')
+        if not self.bound_dn:
+            self.send(message_id, self.result(0x65, OPERATIONS_ERROR,
+                                              '000004DC: LdapErr: DSID-0C090A5C, comment: '
+                                              'In order to perform this operation a successful bind '
+                                              'must be completed on the connection., data 0, v3839'))
+            return
+
+        page_size, cookie = self.paged_request(controls)
+        entries = self.paged.pop(cookie, None) if cookie else None
+        if entries is None:
+            entries = self.server.directory.search(base, scope, matcher)
+
+        response_controls = b''
+        if page_size:
+            start = int(cookie or b'0')
+            end = start + page_size
+            next_cookie = str(end).encode() if end < len(entries) else b''
+            if next_cookie:
+                self.paged[next_cookie] = entries
+            entries = entries[start:end]
+            self.server.count('pages')
+            response_controls = encode_seq(encode_seq(
+                encode_str(PAGED_RESULTS_OID),
+                encode_str(encode_seq(encode_int(0), encode_str(next_cookie))),
+            ), tag=0xa0)
+        elif size_limit:
+            entries = entries[:size_limit]
+
+        ops = [self.entry(dn, attributes, wanted) for dn, attributes in entries]
+        ops.append(self.result(0x65, SUCCESS))
+        if ops[:-1]:
+            self.send(message_id, *ops[:-1])
+        self.send(message_id, ops[-1], controls=response_controls)
+
+    @staticmethod
+    def paged_request(controls):
+        """Returns (page_size, cookie) from a paged results control, or (0, b'')."""
+        for _, control in decode_all(controls):
+            parts = decode_all(control)
+            if parts[0][1].decode() == PAGED_RESULTS_OID and parts[-1][0] == 0x04:
+                _, value, _ = decode(parts[-1][1])
+                (_, size), (_, cookie) = decode_all(value)
+                return decode_int(size), cookie
+        return 0, b''
+
+    @staticmethod
+    def entry(dn, attributes, wanted):
+        everything = not wanted or '*' in wanted
+        selected = [
+            encode_seq(encode_str(name), encode_seq(*(encode_str(v) for v in values), tag=0x31))
+            for name, values in attributes.items()
+            if values and (everything or name.lower() in wanted)
+        ]
+        return encode_seq(encode_str(dn), encode_seq(*selected), tag=0x64)
+
+    def handle_extended(self, message_id, value):
+        name = decode_all(value)[0][1].decode()
+        if name != WHOAMI_OID:
+            self.send(message_id, self.result(0x78, UNWILLING_TO_PERFORM, 'unsupported extended operation'))
+            return
+
+        authz = 'dn:{}'.format(self.bound_dn) if self.bound_dn else ''
+        self.send(message_id, self.result(0x78, SUCCESS, extra=encode_str(authz, 0x8b)))
+
+
+class FakeLDAPServer(socketserver.ThreadingTCPServer):
+    """
+    A threaded fake AD server. Use as a context manager, or call start() and
+    stop(). `latency` seconds are added to every bind, search and extended
+    operation. stats['max_in_flight'] is the most operations the server was
+    working on at once, across all connections.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, directory=None, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), LDAPHandler)
+        self.directory = directory or FakeDirectory.populated()
+        self.latency = latency
+        self.stats = {
+            'connections': 0, 'binds': 0, 'bind_failures': 0, 'searches': 0, 'pages': 0,
+            'in_flight': 0, 'max_in_flight': 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def uri(self):
+        host, port = self.server_address[:2]
+        return 'ldap://{}:{}'.format(host, port)
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def enter(self):
+        with self._stats_lock:
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def leave(self):
+        with self._stats_lock:
+            self.stats['in_flight'] -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-ldap', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3389)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every operation')
+    parser.add_argument('--users', type=int, default=100, help='Number of user0000... accounts')
+    args = parser.parse_args()
+
+    directory = FakeDirectory.populated(users=args.users)
+    directory.add_seed_accounts()
+    server = FakeLDAPServer(directory, args.host, args.port, args.latency)
+    print('Fake AD listening on {}'.format(server.uri))
+    print('  LDAP_BIND_DN={}'.format(BIND_DN))
+    print('  LDAP_BIND_PASSWORD={}'.format(BIND_PASSWORD))
+    print('  users user0000..user{:04d}, password {}'.format(args.users - 1, USER_PASSWORD))
+    for username, password, _, _ in SEED_ACCOUNTS:
+        print('  {}, password {}'.format(username, password))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
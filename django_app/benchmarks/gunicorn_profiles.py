@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+gunicorn runtime profile benchmark.
+
+Starts gunicorn with gunicorn.conf.py under several GUNICORN_* profiles on
+copies of the same migrated SQLite database and drives each with the
+logged-in clients from session_load.py (/, /login/ and /admin/ in turn).
+For each profile it reports the time from launch until the first page is
+served, throughput, p50/p99 latency, and the memory of the master and
+workers: their summed RSS, and their summed PSS, which splits pages shared
+copy-on-write between the processes sharing them and so shows what preload
+saves.
+
+Profiles:
+    single    one sync worker, no preload, no recycling (the old Dockerfile)
+    workers   the default: CPU-sized sync workers, preload, recycling
+    nopreload as workers, without preload
+    threads   half as many gthread workers with 4 threads each
+    asgi      CPU-sized uvicorn workers
+
+Usage:
+    python benchmarks/gunicorn_profiles.py [--profiles single,workers,...]
+                                           [--clients 16] [--requests 100] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from session_load import APP_DIR, client, free_port, percentile, prepare_database
+
+CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+DEFAULT_WORKERS = min(2 * CPUS + 1, 8)
+
+PROFILES = {
+    'single': {'GUNICORN_WORKERS': '1', 'GUNICORN_PRELOAD': 'false', 'GUNICORN_MAX_REQUESTS': '0'},
+    'workers': {},
+    'nopreload': {'GUNICORN_PRELOAD': 'false'},
+    'threads': {'GUNICORN_WORKERS': str(max(1, DEFAULT_WORKERS // 2)), 'GUNICORN_THREADS': '4'},
+    'asgi': {'DJANGO_SERVER': 'asgi'},
+}
+
+
+def start_server(env, port):
+    """Starts gunicorn; returns (process, seconds until it served a page)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/login/'.format(port), timeout=1)
+            return proc, time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+
+    proc.terminate()
+    sys.exit('gunicorn did not start')
+
+
+def _children(pid):
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kb(pid, field):
+    """A field of /proc/<pid>/smaps_rollup (Rss, Pss) in kB, or 0."""
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def memory(master_pid):
+    """Summed RSS and PSS in MB of the master and its workers."""
+    pids = [master_pid] + _children(master_pid)
+    return {
+        'processes': len(pids),
+        'rss_mb': sum(_memory_kb(pid, 'Rss') for pid in pids) / 1024,
+        'pss_mb': sum(_memory_kb(pid, 'Pss') for pid in pids) / 1024,
+    }
+
+
+def run_profile(name, db_template, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            DJANGO_SQLITE_PROFILE='production',
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+            PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics'),
+            GUNICORN_BIND='127.0.0.1:{}'.format(port),
+            **PROFILES[name],
+        )
+        shutil.copy(db_template, env['SQLITE_PATH'])
+
+        server, boot_seconds = start_server(env, port)
+        try:
+            base_url = 'http://127.0.0.1:{}'.format(port)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(lambda _: client(base_url, args.requests), range(args.clients)))
+            elapsed = time.perf_counter() - start
+            used = memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+    samples = [seconds for result in results for timings in result.values() for seconds in timings]
+    return dict(
+        boot_seconds=boot_seconds,
+        requests_per_second=len(samples) / elapsed,
+        p50_ms=statistics.median(samples) * 1000,
+        p99_ms=percentile(samples, 99) * 1000,
+        **used,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='Comma-separated profiles to compare')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent logged-in clients')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per client after login')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_template = os.path.join(tmp, 'db.sqlite3')
+        prepare_database(dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings', SQLITE_PATH=db_template))
+
+        results = {name: run_profile(name, db_template, args) for name in args.profiles.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{} CPUs, {} clients x {} requests'.format(CPUS, args.clients, args.requests))
+    print('{:<10} {:>6} {:>7} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'profile', 'procs', 'boot s', 'req/s', 'p50 ms', 'p99 ms', 'RSS MB', 'PSS MB'))
+    for name, result in results.items():
+        print('{:<10} {:>6} {:>7.2f} {:>8.0f} {:>8.1f} {:>8.1f} {:>8.0f} {:>8.0f}'.format(
+            name, result['processes'], result['boot_seconds'], result['requests_per_second'],
+            result['p50_ms'], result['p99_ms'], result['rss_mb'], result['pss_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Worker cold-start import-time measurement.
+
+Runs `python -X importtime -c "import config.wsgi"` in a fresh interpreter -
+the same imports a gunicorn worker performs before it can serve - and reports
+the total import time, the time per package and the slowest modules. With
+--compare it runs once with the default configuration and once with
+DJANGO_LEAN_STARTUP.
+
+Usage:
+    python benchmarks/import_time.py [--top 15] [--runs 3] [--compare] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def measure(module, settings_module, extra_env=None):
+    """
+    Import module in a fresh interpreter and return {module: (self_us,
+    cumulative_us, depth)} parsed from the -X importtime output.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, **(extra_env or {}))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+
+    return modules
+
+
+def summarise(runs, top):
+    """
+    Combine several runs into the median total, the time spent per top-level
+    package and the slowest individual modules (by their own import time).
+    """
+    totals = [sum(self_us for self_us, _, _ in run.values()) for run in runs]
+
+    per_module = {}
+    per_package = {}
+    for run in runs:
+        packages = {}
+        for name, (self_us, _, _) in run.items():
+            per_module.setdefault(name, []).append(self_us)
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+        for package, us in packages.items():
+            per_package.setdefault(package, []).append(us)
+
+    def slowest(samples):
+        medians = ((name, statistics.median(values)) for name, values in samples.items())
+        return sorted(medians, key=lambda item: item[1], reverse=True)[:top]
+
+    return {
+        'total_ms': statistics.median(totals) / 1000,
+        'modules': len(runs[-1]),
+        'packages': [{'package': name, 'ms': us / 1000} for name, us in slowest(per_package)],
+        'slowest': [{'module': name, 'self_ms': us / 1000} for name, us in slowest(per_module)],
+        'ldap_imported': any(
+            name == 'ldap' or name.startswith(('ldap.', 'django_auth_ldap')) for name in runs[-1]
+        ),
+    }
+
+
+def print_summary(label, summary):
+    print('{}: {:.1f} ms across {} modules (python-ldap imported: {})'.format(
+        label, summary['total_ms'], summary['modules'], 'yes' if summary['ldap_imported'] else 'no'))
+    print('  by package:')
+    for entry in summary['packages']:
+        print('  {:>8.1f} ms  {}'.format(entry['ms'], entry['package']))
+    print('  slowest modules:')
+    for entry in summary['slowest']:
+        print('  {:>8.1f} ms  {}'.format(entry['self_ms'], entry['module']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--module', default='config.wsgi', help='Module to import (default: config.wsgi)')
+    parser.add_argument('--settings', default='config.settings', help='DJANGO_SETTINGS_MODULE to use')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages and modules to list')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per configuration; the median is reported')
+    parser.add_argument('--compare', action='store_true', help='Also measure with DJANGO_LEAN_STARTUP=true')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    configurations = [('default', {'DJANGO_LEAN_STARTUP': 'false'})]
+    if args.compare:
+        configurations.append(('lean', {'DJANGO_LEAN_STARTUP': 'true'}))
+
+    results = {}
+    for label, extra_env in configurations:
+        runs = [measure(args.module, args.settings, extra_env) for _ in range(args.runs)]
+        results[label] = summarise(runs, args.top)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for label, summary in results.items():
+        print_summary(label, summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Key Vault startup-latency benchmark.
+
+Compares the time a worker spends loading its secrets with the sequential
+client, the concurrent async client and the encrypted cache file. Key Vault is
+replaced by local stub clients that answer each get_secret() after a fixed
+delay, so no Azure access is needed.
+
+Usage:
+    python benchmarks/keyvault_startup.py [--latency 0.15] [--secrets 4] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import keyvault  # noqa: E402
+
+
+class StubSecret:
+    def __init__(self, name):
+        self.name = name
+        self.value = 'value-of-{}'.format(name)
+
+
+class StubSecretClient:
+    """Synchronous stand-in for azure.keyvault.secrets.SecretClient."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get_secret(self, name):
+        time.sleep(self.latency)
+        return StubSecret(name)
+
+
+class AsyncStubSecretClient:
+    """Async stand-in for azure.keyvault.secrets.aio.SecretClient."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def get_secret(self, name):
+        await asyncio.sleep(self.latency)
+        return StubSecret(name)
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def report(label, samples):
+    print('{:<12} median {:8.1f} ms   min {:8.1f} ms'.format(
+        label, statistics.median(samples) * 1000, min(samples) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--latency', type=float, default=0.15, help='Seconds per stubbed get_secret() call')
+    parser.add_argument('--secrets', type=int, default=len(keyvault.SECRETS), help='Number of secrets to load')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    secrets = {'secret-{}'.format(i): 'SECRET_{}'.format(i) for i in range(args.secrets)}
+    print('{} secrets, {:.0f} ms per request, {} runs'.format(args.secrets, args.latency * 1000, args.runs))
+
+    sequential, samples = timed(
+        lambda: keyvault.fetch_secrets_sequential(StubSecretClient(args.latency), secrets), args.runs)
+    report('sequential', samples)
+
+    concurrent, samples = timed(
+        lambda: asyncio.run(keyvault.fetch_secrets_concurrent(AsyncStubSecretClient(args.latency), secrets)),
+        args.runs)
+    report('concurrent', samples)
+
+    assert sequential == concurrent
+
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        print('cached       skipped (cryptography is not installed)')
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['KEY_VAULT_CACHE_KEY'] = Fernet.generate_key().decode()
+        os.environ['KEY_VAULT_CACHE_FILE'] = os.path.join(tmp, 'keyvault.cache')
+        keyvault.write_cache('https://stub.vault.azure.net/', concurrent)
+
+        cached, samples = timed(lambda: keyvault.read_cache('https://stub.vault.azure.net/'), args.runs)
+        report('cached', samples)
+
+        assert cached == concurrent
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+LDAP failover benchmark.
+
+Starts two fake AD servers from fake_ldap.py, a primary and a secondary, and
+runs --logins sequential logins through the LDAP backend in a fresh
+interpreter for each scenario, with the primary:
+
+    down      stopped, so connections to it are refused
+    slow      answering every operation after --slow-latency seconds
+    degraded  answering after --degraded-latency seconds, still in time
+
+Each scenario is run with only the primary configured and with both. For
+the slow primary it is also run without the connect and operation timeouts,
+as before they existed (two logins only, as each waits for every operation).
+The script reports how many logins succeeded, their p50/p99/max latency, the
+share of LDAP binds each server answered, and what the worker's ServerHealth
+made of each server.
+
+Usage:
+    python benchmarks/ldap_failover.py [--logins 20] [--slow-latency 3]
+                                       [--operation-timeout 1] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD, FakeDirectory, FakeLDAPServer
+from session_load import APP_DIR, percentile
+
+# name -> (primary state, servers configured, timeouts on)
+CASES = {
+    'down, primary only': ('down', 'primary', True),
+    'down, failover': ('down', 'both', True),
+    'slow, primary only, no timeouts': ('slow', 'primary', False),
+    'slow, primary only': ('slow', 'primary', True),
+    'slow, failover': ('slow', 'both', True),
+    'degraded, failover': ('degraded', 'both', True),
+}
+
+
+def child(logins):
+    """Runs the logins in this interpreter and prints the results as JSON."""
+    sys.path.insert(0, APP_DIR)
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import authenticate
+    from django.core.management import call_command
+
+    from authentication.servers import server_stats
+
+    call_command('migrate', verbosity=0)
+
+    samples, succeeded = [], 0
+    for n in range(logins):
+        start = time.perf_counter()
+        user = authenticate(None, username='user{:04d}'.format(n), password=USER_PASSWORD)
+        samples.append(time.perf_counter() - start)
+        succeeded += user is not None
+
+    print(json.dumps({'samples': samples, 'succeeded': succeeded, 'servers': server_stats()}))
+
+
+def run_case(state, configured, timeouts, servers, args):
+    primary, secondary = servers
+    primary.latency = {'slow': args.slow_latency, 'degraded': args.degraded_latency}.get(state, 0.0)
+    uris = [primary.uri] + ([secondary.uri] if configured == 'both' else [])
+    before = {server.uri: server.stats['binds'] for server in servers}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            DJANGO_METRICS='false',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            LDAP_SERVER_URI=' '.join(uris),
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_CONNECT_TIMEOUT=str(args.operation_timeout) if timeouts else '0',
+            LDAP_OPERATION_TIMEOUT=str(args.operation_timeout) if timeouts else '0',
+            AUTH_RESULT_CACHE_SUCCESS_TIMEOUT='0',
+        )
+        if state == 'down':
+            # A stopped server: its port refuses connections
+            env['LDAP_SERVER_URI'] = ' '.join([args.down_uri] + uris[1:])
+
+        logins = args.logins if timeouts else min(args.logins, 2)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(logins)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    binds = {name: server.stats['binds'] - before[server.uri]
+             for name, server in zip(('primary', 'secondary'), servers)}
+    total = sum(binds.values()) or 1
+    samples = result['samples']
+    return {
+        'succeeded': result['succeeded'],
+        'logins': len(samples),
+        'p50_ms': statistics.median(samples) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+        'bind_share': {name: count / total for name, count in binds.items()},
+        'servers': result['servers'],
+    }
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--logins', type=int, default=20, help='Sequential logins per case')
+    parser.add_argument('--slow-latency', type=float, default=3.0, help='Seconds the slow primary takes per operation')
+    parser.add_argument('--degraded-latency', type=float, default=0.05,
+                        help='Seconds the degraded primary takes per operation')
+    parser.add_argument('--operation-timeout', type=float, default=1.0,
+                        help='LDAP_CONNECT_TIMEOUT and LDAP_OPERATION_TIMEOUT for the cases with timeouts')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    directory = FakeDirectory.populated(users=max(args.logins, 10))
+    down = FakeLDAPServer(directory)
+    args.down_uri = down.uri
+    down.server_close()
+
+    with FakeLDAPServer(directory) as primary, FakeLDAPServer(directory) as secondary:
+        results = {name: run_case(*case, (primary, secondary), args) for name, case in CASES.items()}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{} sequential logins per case, timeouts {}s'.format(args.logins, args.operation_timeout))
+    print('{:<32} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'case', 'ok', 'p50 ms', 'p99 ms', 'max ms', 'primary'))
+    for name, result in results.items():
+        print('{:<32} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>8.0f}%'.format(
+            name, '{}/{}'.format(result['succeeded'], result['logins']), result['p50_ms'],
+            result['p99_ms'], result['max_ms'], result['bind_share']['primary'] * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Bulk LDAP user sync benchmark.
+
+Starts the fake AD server from fake_ldap.py with --users accounts and runs
+manage.py ldap_sync against a fresh SQLite database three times: a full sync,
+an incremental sync with nothing changed, and an incremental sync after
+--changes accounts have had their name and staff group changed. Each run is
+a separate interpreter; the script reports its wall time, the entries it
+fetched and wrote, and its peak resident memory, which depends on the page
+size rather than on the number of users.
+
+Usage:
+    python benchmarks/ldap_sync.py [--users 100000] [--changes 100]
+                                   [--page-size 500] [--json]
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, STAFF_GROUP, USERS_DN, FakeDirectory, FakeLDAPServer
+from session_load import APP_DIR, manage
+
+
+def peak_rss_mb():
+    """This process's peak resident memory since exec, from /proc (Linux)."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def measure(args):
+    """Run ldap_sync in this interpreter. Returns its statistics plus peak RSS."""
+    sys.path.insert(0, APP_DIR)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    out = io.StringIO()
+    call_command('ldap_sync', '--json', *args, stdout=out)
+    stats = json.loads(out.getvalue())
+    stats['peak_rss_mb'] = peak_rss_mb()
+    return stats
+
+
+def run_sync(env, *args):
+    """
+    Runs ldap_sync in a fresh interpreter. Its peak RSS is read there: the
+    child's ru_maxrss would include the fork of this process, which holds
+    the whole fake directory.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', *args],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+
+    stats = json.loads(proc.stdout)
+    stats['wall_seconds'] = time.perf_counter() - start
+    return stats
+
+
+def change_users(directory, count, users):
+    """Renames count accounts spread over the directory and flips their staff membership."""
+    step = max(1, users // count)
+    for n in range(0, step * count, step)[:count]:
+        username = 'user{:04d}'.format(n)
+        dn, entry = directory.entries['CN={},{}'.format(username, USERS_DN).lower()]
+        groups = [group for group in entry['memberOf'] if group != STAFF_GROUP]
+        if len(groups) == len(entry['memberOf']):
+            groups.append(STAFF_GROUP)
+        directory.touch(username, givenName=['Renamed'], memberOf=groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=20000, help='Accounts in the fake directory')
+    parser.add_argument('--changes', type=int, default=100, help='Accounts changed before the last run')
+    parser.add_argument('--page-size', type=int, default=500, help='Entries per page')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--child', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child)))
+        return
+
+    directory = FakeDirectory.populated(users=args.users)
+    with FakeLDAPServer(directory) as server, tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            LDAP_SERVER_URI=server.uri,
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            DJANGO_METRICS='false',
+        )
+        manage(env, 'migrate', '--noinput')
+
+        page_size = ['--page-size', str(args.page_size)]
+        results = {
+            'full': run_sync(env, '--full', *page_size),
+            'unchanged': run_sync(env, *page_size),
+        }
+        change_users(directory, args.changes, args.users)
+        results['changed'] = run_sync(env, *page_size)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{} users, page size {}'.format(args.users, args.page_size))
+    print('{:<10} {:<12} {:>8} {:>8} {:>8} {:>8} {:>9} {:>8}'.format(
+        'run', 'mode', 'fetched', 'created', 'updated', 'pages', 'wall s', 'RSS MB'))
+    for run, stats in results.items():
+        print('{:<10} {:<12} {:>8} {:>8} {:>8} {:>8} {:>9.2f} {:>8.1f}'.format(
+            run, stats['mode'], stats['fetched'], stats['created'], stats['updated'],
+            stats['pages'], stats['wall_seconds'], stats['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
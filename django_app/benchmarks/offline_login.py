@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Offline credential cache benchmark.
+
+Runs, in a fresh interpreter with its own SQLite database, the fake AD server
+from fake_ldap.py and --logins users who log in once through it. The server is
+then hung (every operation takes longer than LDAP_OPERATION_TIMEOUT) and the
+same users log in again, with and without LDAP_OFFLINE_CACHE_MAX_AGE. The
+script reports how many logins succeeded and their p50/max latency, then
+checks that the cache refuses what it should: an expired entry, a password
+changed in AD (seen at a successful login, by ldap_sync, or at a rejected
+one) and a locked account, and that a mistyped password keeps the entry. It
+exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/offline_login.py [--logins 20] [--operation-timeout 1]
+                                       [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD
+from session_load import APP_DIR
+
+NEW_PASSWORD = 'FakeUser2026!'
+MAX_AGE = 3600
+
+
+def child(logins, operation_timeout):
+    """Runs the cases in this interpreter and prints the results as JSON."""
+    sys.path.insert(0, APP_DIR)
+
+    from fake_ldap import FakeDirectory, FakeLDAPServer
+
+    directory = FakeDirectory.populated(users=max(logins, 10))
+    server = FakeLDAPServer(directory).start()
+    os.environ['LDAP_SERVER_URI'] = server.uri
+
+    import django
+    django.setup()
+
+    from datetime import timedelta
+
+    from django.contrib.auth import authenticate
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from django.utils import timezone
+
+    from authentication.models import CachedCredential
+    from authentication.pool import reset_pools
+    from authentication.servers import reset_servers
+
+    call_command('migrate', verbosity=0)
+    call_command('ldap_sync', verbosity=0, stdout=open(os.devnull, 'w'))
+
+    def login(usernames, password=USER_PASSWORD):
+        samples, succeeded = [], 0
+        for username in usernames:
+            start = time.perf_counter()
+            user = authenticate(None, username=username, password=password)
+            samples.append(time.perf_counter() - start)
+            succeeded += user is not None
+        return {'succeeded': succeeded, 'logins': len(samples), 'samples': samples}
+
+    def cached(username):
+        return CachedCredential.objects.filter(user__username=username).exists()
+
+    def dc(up):
+        # A hung DC, not a stopped one: connections are accepted and then
+        # nothing is answered, which is what costs the timeouts
+        server.latency = 0.0 if up else operation_timeout * 3
+        reset_pools()
+        reset_servers()
+
+    users = ['user{:04d}'.format(n) for n in range(logins)]
+    results = {}
+
+    results['online, first login'] = login(users)
+    results['online, repeat login'] = login(users)
+
+    dc(up=False)
+    with override_settings(AUTH_LDAP_OFFLINE_CACHE_MAX_AGE=0):
+        results['DC hung, cache off'] = login(users[:3])
+    results['DC hung, cache on'] = login(users)
+
+    checks = {}
+
+    # Expired: verified longer ago than the maximum age
+    CachedCredential.objects.filter(user__username='user0000').update(
+        verified_at=timezone.now() - timedelta(seconds=MAX_AGE + 1),
+    )
+    checks['expired entry refused'] = login(['user0000'])['succeeded'] == 0
+
+    # Changed in AD, then used to log in while the DC was up
+    dc(up=True)
+    directory.set_password('user0001', NEW_PASSWORD)
+    login(['user0001'], NEW_PASSWORD)
+    dc(up=False)
+    checks['changed at login: old password refused'] = login(['user0001'])['succeeded'] == 0
+    checks['changed at login: new password accepted'] = login(['user0001'], NEW_PASSWORD)['succeeded'] == 1
+
+    # Changed in AD and picked up by ldap_sync
+    dc(up=True)
+    directory.set_password('user0002', NEW_PASSWORD)
+    call_command('ldap_sync', verbosity=0, stdout=open(os.devnull, 'w'))
+    dc(up=False)
+    checks['changed, seen by ldap_sync: entry dropped'] = not cached('user0002')
+    checks['changed, seen by ldap_sync: old password refused'] = login(['user0002'])['succeeded'] == 0
+
+    # Changed in AD, then the old password rejected while the DC was up: the
+    # user search returns the new pwdLastSet
+    dc(up=True)
+    directory.set_password('user0003', NEW_PASSWORD)
+    login(['user0003'])
+    checks['old password rejected by AD: entry dropped'] = not cached('user0003')
+
+    # Mistyped: rejected by AD, but the password has not changed
+    login(['user0006'], 'Mistyped2025!')
+    checks['mistyped password rejected by AD: entry kept'] = cached('user0006')
+
+    # Locked out in AD, which rejects even the right password
+    directory.set_account_state('user0004', 'locked')
+    login(['user0004'])
+    checks['account locked: entry dropped'] = not cached('user0004')
+
+    dc(up=False)
+    checks['unchanged user still accepted'] = login(['user0005'])['succeeded'] == 1
+
+    server.stop()
+    print(json.dumps({'results': results, 'checks': checks}))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]), float(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--logins', type=int, default=20, help='Users who log in')
+    parser.add_argument('--operation-timeout', type=float, default=1.0,
+                        help='LDAP_CONNECT_TIMEOUT and LDAP_OPERATION_TIMEOUT')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            DJANGO_METRICS='false',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_CONNECT_TIMEOUT=str(args.operation_timeout),
+            LDAP_OPERATION_TIMEOUT=str(args.operation_timeout),
+            LDAP_OFFLINE_CACHE_MAX_AGE=str(MAX_AGE),
+            AUTH_RESULT_CACHE_SUCCESS_TIMEOUT='0',
+        )
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(max(args.logins, 6)),
+             str(args.operation_timeout)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    output = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        print('{:<24} {:>7} {:>9} {:>9}'.format('case', 'ok', 'p50 ms', 'max ms'))
+        for name, result in output['results'].items():
+            print('{:<24} {:>7} {:>9.1f} {:>9.1f}'.format(
+                name, '{}/{}'.format(result['succeeded'], result['logins']),
+                statistics.median(result['samples']) * 1000, max(result['samples']) * 1000))
+        print()
+        for name, passed in output['checks'].items():
+            print('{:<48} {}'.format(name, 'ok' if passed else 'FAILED'))
+
+    if not all(output['checks'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
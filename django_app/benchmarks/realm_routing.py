@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Realm routing benchmark.
+
+Starts the fake AD server from fake_ldap.py and, in a fresh interpreter,
+logs in --attempts times per case with django.contrib.auth.authenticate(),
+once with the backends as they were (LDAPBackend, then ModelBackend) and once
+with RealmRoutingBackend in front of them:
+
+    local ok        the local admin account, right password
+    local bad       the local admin account, wrong password
+    ldap ok         a directory user, right password
+    ldap bad        a directory user, wrong password
+    unknown         a username neither realm knows
+
+It reports, per attempt, the median latency, the CPU time of the Django
+process (password hashing shows up here) and the LDAP operations the server
+answered. The authentication result cache is off so that every attempt does
+the full work, and so is the per-user rate limit.
+
+Usage:
+    python benchmarks/realm_routing.py [--attempts 20] [--latency 0.002] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD, FakeDirectory, FakeLDAPServer
+from session_load import APP_DIR
+
+LOCAL_PASSWORD = 'FoxAdmin2025!'
+
+CASES = {
+    'local ok': ('fox', LOCAL_PASSWORD),
+    'local bad': ('fox', 'wrong-password'),
+    'ldap ok': ('user0001', USER_PASSWORD),
+    'ldap bad': ('user0001', 'wrong-password'),
+    'unknown': ('nobody', 'wrong-password'),
+}
+
+BACKENDS = {
+    'before': [
+        'authentication.backends.LDAPBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+    'router': [
+        'authentication.backends.RealmRoutingBackend',
+        'authentication.backends.LDAPBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+}
+
+
+def child(attempts):
+    """Runs the logins in this interpreter and prints the samples as JSON lines."""
+    sys.path.insert(0, APP_DIR)
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import authenticate, get_user_model
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    call_command('migrate', verbosity=0)
+    get_user_model().objects.create_superuser('fox', 'fox@rule4.local', LOCAL_PASSWORD)
+    # The directory user's first login creates their Django user
+    authenticate(None, username='user0001', password=USER_PASSWORD)
+
+    for config, backends in BACKENDS.items():
+        with override_settings(AUTHENTICATION_BACKENDS=backends):
+            for case, (username, password) in CASES.items():
+                authenticate(None, username=username, password=password)  # Warm up
+                # The parent reads the server's counters between the lines
+                print(json.dumps({'config': config, 'case': case, 'phase': 'start'}), flush=True)
+                sys.stdin.readline()
+
+                samples, cpu, succeeded = [], 0.0, 0
+                for _ in range(attempts):
+                    start, start_cpu = time.perf_counter(), time.process_time()
+                    user = authenticate(None, username=username, password=password)
+                    samples.append(time.perf_counter() - start)
+                    cpu += time.process_time() - start_cpu
+                    succeeded += user is not None
+
+                print(json.dumps({
+                    'config': config, 'case': case, 'phase': 'end', 'samples': samples,
+                    'cpu': cpu / attempts, 'succeeded': succeeded,
+                }), flush=True)
+                sys.stdin.readline()
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--attempts', type=int, default=20, help='Logins per case')
+    parser.add_argument('--latency', type=float, default=0.002, help='Seconds the fake DC adds to each operation')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = {config: {} for config in BACKENDS}
+    with FakeLDAPServer(FakeDirectory.populated(users=10), latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            DJANGO_METRICS='false',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            LDAP_SERVER_URI=server.uri,
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            AUTH_RESULT_CACHE_FAILURE_TIMEOUT='0',
+            AUTH_RESULT_CACHE_SUCCESS_TIMEOUT='0',
+            LDAP_THROTTLE_USER_RATE='0',
+        )
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--child', str(args.attempts)],
+            cwd=APP_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        operations = 0
+        for line in proc.stdout:
+            message = json.loads(line)
+            count = server.stats['binds'] + server.stats['searches']
+            if message['phase'] == 'start':
+                operations = count
+            else:
+                samples = message['samples']
+                results[message['config']][message['case']] = {
+                    'succeeded': message['succeeded'],
+                    'p50_ms': statistics.median(samples) * 1000,
+                    'cpu_ms': message['cpu'] * 1000,
+                    'ldap_operations': (count - operations) / len(samples),
+                }
+            proc.stdin.write('\n')
+            proc.stdin.flush()
+        if proc.wait() != 0:
+            sys.exit('benchmark child failed')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{} attempts per case, DC latency {} ms'.format(args.attempts, args.latency * 1000))
+    print('{:<10} {:<8} {:>6} {:>9} {:>9} {:>9}'.format('case', 'backends', 'ok', 'p50 ms', 'cpu ms', 'ldap ops'))
+    for case in CASES:
+        for config in BACKENDS:
+            result = results[config][case]
+            print('{:<10} {:<8} {:>6} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+                case, config, '{}/{}'.format(result['succeeded'], args.attempts), result['p50_ms'],
+                result['cpu_ms'], result['ldap_operations']))
+
+
+if __name__ == '__main__':
+    main()
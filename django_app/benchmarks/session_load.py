@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Session engine load test.
+
+For each session engine (DJANGO_SESSION_ENGINE) this starts gunicorn on a
+fresh copy of a migrated SQLite database, logs a pool of concurrent clients in
+through the admin login form, and then has them request /, /login/ and
+/admin/ in turn. It reports p50 and p99 latency per path and per engine.
+
+A local superuser is created for the clients, so no domain controller is
+needed; LDAP is simply tried first and fails as it would without one.
+
+Usage:
+    python benchmarks/session_load.py [--engines db,cache,cached_db,signed_cookies]
+                                      [--clients 8] [--requests 50] [--workers 3] [--json]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USERNAME = 'loadtest'
+PASSWORD = 'LoadTest2025!'
+PATHS = ['/', '/login/', '/admin/']
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=APP_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def prepare_database(env):
+    """Migrate a database and add the load-test user."""
+    manage(env, 'migrate', '--noinput')
+    manage(env, 'shell', '-c', (
+        "from django.contrib.auth.models import User; "
+        "User.objects.create_superuser({!r}, 'loadtest@rule4.local', {!r})"
+    ).format(USERNAME, PASSWORD))
+
+
+def start_server(env, port, workers):
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{}'.format(port),
+         '--workers', str(workers), 'config.wsgi:application'],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/admin/login/'.format(port), timeout=1)
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+
+    proc.terminate()
+    sys.exit('gunicorn did not start')
+
+
+def client(base_url, requests):
+    """Log in, then request each path in turn. Returns {path: [seconds]}."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect)
+
+    def fetch(path, data=None):
+        start = time.perf_counter()
+        try:
+            with opener.open(base_url + path, data=data, timeout=30) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code >= 400:
+                raise
+        return time.perf_counter() - start
+
+    timings = {'login': []}
+    fetch('/admin/login/')
+    csrf = next(cookie.value for cookie in jar if cookie.name == 'csrftoken')
+    form = urllib.parse.urlencode({
+        'username': USERNAME,
+        'password': PASSWORD,
+        'csrfmiddlewaretoken': csrf,
+        'next': '/admin/',
+    }).encode()
+    timings['login'].append(fetch('/admin/login/', form))
+
+    for i in range(requests):
+        path = PATHS[i % len(PATHS)]
+        timings.setdefault(path, []).append(fetch(path))
+
+    return timings
+
+
+def percentile(samples, pct):
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def run_engine(engine, db_template, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_SESSION_ENGINE=engine,
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            SESSION_CACHE_LOCATION=os.path.join(tmp, 'sessions'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+        )
+        shutil.copy(db_template, env['SQLITE_PATH'])
+
+        port = free_port()
+        server = start_server(env, port, args.workers)
+        try:
+            base_url = 'http://127.0.0.1:{}'.format(port)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(lambda _: client(base_url, args.requests), range(args.clients)))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    merged = {}
+    for result in results:
+        for path, samples in result.items():
+            merged.setdefault(path, []).extend(samples)
+
+    total = sum(len(samples) for samples in merged.values())
+    return {
+        'requests_per_second': total / elapsed,
+        'paths': {
+            path: {
+                'count': len(samples),
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+            }
+            for path, samples in merged.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engines', default='db,cache,cached_db,signed_cookies',
+                        help='Comma-separated DJANGO_SESSION_ENGINE values to compare')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent logged-in clients')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client after login')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_template = os.path.join(tmp, 'db.sqlite3')
+        prepare_database(dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings', SQLITE_PATH=db_template))
+
+        results = {engine: run_engine(engine, db_template, args) for engine in args.engines.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<16} {:<10} {:>7} {:>10} {:>10}'.format('engine', 'path', 'count', 'p50 ms', 'p99 ms'))
+    for engine, result in results.items():
+        for path, stats in result['paths'].items():
+            print('{:<16} {:<10} {:>7} {:>10.1f} {:>10.1f}'.format(
+                engine, path, stats['count'], stats['p50_ms'], stats['p99_ms']))
+        print('{:<16} {:<10} {:>7.0f} req/s'.format(engine, 'total', result['requests_per_second']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrency stress test.
+
+Starts several worker processes against one SQLite file, each doing what a
+gunicorn worker does on login: create a session, update the user's last_login
+and occasionally create a user. Connections are closed between operations the
+way Django closes them at the end of a request (so CONN_MAX_AGE applies).
+Reports throughput and "database is locked" errors for the default SQLite
+settings and for DJANGO_SQLITE_PROFILE=production.
+
+Usage:
+    python benchmarks/sqlite_stress.py [--processes 6] [--operations 200] [--profiles default,production]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_path, profile):
+    sys.path.insert(0, APP_DIR)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'config.settings'
+    os.environ['DJANGO_SQLITE_PROFILE'] = profile
+    os.environ['DJANGO_SESSION_ENGINE'] = 'db'
+    os.environ['SQLITE_PATH'] = db_path
+
+    import django
+    django.setup()
+
+
+def prepare(db_path, profile):
+    setup_django(db_path, profile)
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    User.objects.create_user('stress', 'stress@rule4.local')
+
+
+def worker(db_path, profile, worker_id, operations, start_at, results):
+    setup_django(db_path, profile)
+
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import OperationalError, close_old_connections
+    from django.utils import timezone
+
+    ok = locked = other = 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+
+    for i in range(operations):
+        try:
+            session = SessionStore()
+            session['user'] = worker_id
+            session.save()
+
+            User.objects.filter(username='stress').update(last_login=timezone.now())
+
+            if i % 10 == 0:
+                User.objects.create_user('stress-{}-{}'.format(worker_id, i))
+            ok += 1
+        except OperationalError as e:
+            if 'locked' in str(e):
+                locked += 1
+            else:
+                other += 1
+        finally:
+            # What request_finished does: honours CONN_MAX_AGE
+            close_old_connections()
+
+    results.put((ok, locked, other))
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'db.sqlite3')
+
+        ctx = multiprocessing.get_context('spawn')
+        setup = ctx.Process(target=prepare, args=(db_path, profile))
+        setup.start()
+        setup.join()
+
+        results = ctx.Queue()
+        start_at = time.time() + 2  # Let every process finish booting first
+        processes = [
+            ctx.Process(target=worker, args=(db_path, profile, n, args.operations, start_at, results))
+            for n in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        counts = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.time() - start_at
+
+    ok = sum(count[0] for count in counts)
+    return {
+        'operations': ok,
+        'locked_errors': sum(count[1] for count in counts),
+        'other_errors': sum(count[2] for count in counts),
+        'operations_per_second': ok / elapsed,
+        'seconds': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--processes', type=int, default=6, help='Concurrent worker processes')
+    parser.add_argument('--operations', type=int, default=200, help='Login-like operations per process')
+    parser.add_argument('--profiles', default='default,production', help='DJANGO_SQLITE_PROFILE values to compare')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    results = {profile: run_profile(profile, args) for profile in args.profiles.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<12} {:>10} {:>8} {:>8} {:>10}'.format('profile', 'ops', 'locked', 'other', 'ops/s'))
+    for profile, result in results.items():
+        print('{:<12} {:>10} {:>8} {:>8} {:>10.0f}'.format(
+            profile, result['operations'], result['locked_errors'], result['other_errors'],
+            result['operations_per_second']))
+
+
+if __name__ == '__main__':
+    main()
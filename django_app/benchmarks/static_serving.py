@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Static file serving benchmark.
+
+Runs collectstatic, then requests the stylesheets and scripts the admin
+login page links to, in a fresh interpreter and straight through the WSGI
+applications (no server), --rounds times each:
+
+    django        Django's own static handler (what runserver uses), which
+                  finds each file through the staticfiles finders
+    static        config.static in front of Django, without compression
+    static gzip   the same, for a client that accepts gzip
+    static br     the same, for a client that accepts brotli (if installed)
+    revalidate    conditional requests with the ETag of the last response
+
+It reports the median time per request, the bytes sent for one page's
+assets, and the Cache-Control the responses carried.
+
+Usage:
+    python benchmarks/static_serving.py [--rounds 200] [--json]
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from session_load import APP_DIR
+
+
+def environ(path, **headers):
+    env = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    env.update(('HTTP_' + name.upper(), value) for name, value in headers.items())
+    return env
+
+
+def call(application, path, **headers):
+    """Returns (status, headers, body) for a GET through a WSGI application."""
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(response_headers)
+
+    result = application(environ(path, **headers), start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+def child(rounds):
+    """Runs the cases in this interpreter and prints the results as JSON."""
+    sys.path.insert(0, APP_DIR)
+
+    import django
+    django.setup()
+
+    from django.contrib.staticfiles.handlers import StaticFilesHandler
+    from django.core.wsgi import get_wsgi_application
+
+    from config.static import wrap_wsgi
+    from config.storage import brotli
+
+    django_app = get_wsgi_application()
+    static_app = wrap_wsgi(django_app)
+
+    _, _, page = call(static_app, '/admin/login/')
+    assets = sorted(set(re.findall(r'(?:href|src)="(/static/[^"]+)"', page.decode())))
+    # Django's handler finds files by their original names
+    originals = [re.sub(r'\.[0-9a-f]{12}(\.\w+)$', r'\1', asset) for asset in assets]
+
+    cases = {
+        'django': (StaticFilesHandler(django_app), originals, {}),
+        'static': (static_app, assets, {}),
+        'static gzip': (static_app, assets, {'accept_encoding': 'gzip, deflate'}),
+    }
+    if brotli is not None:
+        cases['static br'] = (static_app, assets, {'accept_encoding': 'gzip, deflate, br'})
+
+    results = {}
+    etags = {}
+    for name, (application, paths, headers) in cases.items():
+        samples, page_bytes, cache_control = [], 0, set()
+        for n in range(rounds):
+            for path in paths:
+                start = time.perf_counter()
+                status, response_headers, body = call(application, path, **headers)
+                samples.append(time.perf_counter() - start)
+                if n == 0:
+                    page_bytes += len(body)
+                    cache_control.add(response_headers.get('Cache-Control', '(none)'))
+                    etags[path] = response_headers.get('ETag')
+        results[name] = {
+            'requests': len(samples), 'status': status, 'p50_us': statistics.median(samples) * 1e6,
+            'page_bytes': page_bytes, 'cache_control': sorted(cache_control),
+        }
+
+    samples = []
+    for _ in range(rounds):
+        for path in assets:
+            start = time.perf_counter()
+            status, _, _ = call(static_app, path, accept_encoding='gzip, deflate, br', if_none_match=etags[path])
+            samples.append(time.perf_counter() - start)
+    results['revalidate'] = {
+        'requests': len(samples), 'status': status, 'p50_us': statistics.median(samples) * 1e6,
+        'page_bytes': 0, 'cache_control': [],
+    }
+
+    print(json.dumps({'assets': assets, 'results': results}))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rounds', type=int, default=200, help='Requests per asset and case')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='config.settings',
+        DJANGO_PROFILE='prod',
+        DJANGO_METRICS='false',
+        DJANGO_STATIC_SERVE='true',
+        SQLITE_PATH=':memory:',
+        LDAP_SERVER_URI='ldap://127.0.0.1:1',
+    )
+    subprocess.run([sys.executable, 'manage.py', 'collectstatic', '--noinput', '--verbosity', '0'],
+                   cwd=APP_DIR, env=env, check=True)
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', str(args.rounds)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    output = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+        return
+
+    print('{} assets on /admin/login/, {} rounds'.format(len(output['assets']), args.rounds))
+    print('{:<12} {:>16} {:>9} {:>11}  {}'.format('case', 'status', 'p50 us', 'page bytes', 'cache-control'))
+    for name, result in output['results'].items():
+        print('{:<12} {:>16} {:>9.0f} {:>11}  {}'.format(
+            name, result['status'], result['p50_us'], result['page_bytes'], ' | '.join(result['cache_control'])))
+
+
+if __name__ == '__main__':
+    main()
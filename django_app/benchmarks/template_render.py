@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Template render-time benchmark.
+
+Calls the login and home views directly with RequestFactory requests (no
+server, no LDAP; the synchronous views that WSGI serves) and reports
+the first ("cold") render and the median and p99 of the following renders for
+each view. With --compare it runs once with DJANGO_TEMPLATE_PERFORMANCE on,
+where templates are compiled at startup by config.warmup, and once with it
+off, in separate interpreters.
+
+Usage:
+    python benchmarks/template_render.py [--iterations 500] [--compare] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def measure(iterations):
+    """Render each view in this interpreter. Returns {view: stats}."""
+    sys.path.insert(0, APP_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ['SQLITE_PATH'] = ':memory:'
+
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import AnonymousUser, User
+    from django.contrib.messages.storage.cookie import CookieStorage
+    from django.test import RequestFactory
+
+    from authentication.views import home, login_view
+    from config.warmup import warm_templates
+
+    startup = time.perf_counter()
+    warm_templates()
+    warmup_ms = (time.perf_counter() - startup) * 1000
+
+    factory = RequestFactory()
+    user = User(username='bench', is_active=True)
+
+    def request(path, request_user):
+        req = factory.get(path)
+        req.user = request_user
+        req._messages = CookieStorage(req)
+        return req
+
+    views = [
+        ('login', login_view, '/login/', AnonymousUser()),
+        ('home', home, '/', user),
+    ]
+
+    results = {'warmup_ms': warmup_ms, 'views': {}}
+    for name, view, path, request_user in views:
+        samples = []
+        for _ in range(iterations + 1):
+            req = request(path, request_user)
+            start = time.perf_counter()
+            view(req)
+            samples.append(time.perf_counter() - start)
+
+        cold, warm = samples[0], samples[1:]
+        results['views'][name] = {
+            'cold_ms': cold * 1000,
+            'median_ms': statistics.median(warm) * 1000,
+            'p99_ms': percentile(warm, 99) * 1000,
+        }
+
+    return results
+
+
+def run_mode(performance, iterations):
+    """Measure in a fresh interpreter so nothing is cached beforehand."""
+    env = dict(os.environ, DJANGO_TEMPLATE_PERFORMANCE='true' if performance else 'false')
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--iterations', str(iterations)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    return json.loads(proc.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--iterations', type=int, default=500, help='Renders per view after the first')
+    parser.add_argument('--compare', action='store_true', help='Also measure with DJANGO_TEMPLATE_PERFORMANCE=false')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.iterations)))
+        return
+
+    results = {'performance': run_mode(True, args.iterations)}
+    if args.compare:
+        results['default'] = run_mode(False, args.iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<12} {:<10} {:>9} {:>10} {:>9}'.format('mode', 'view', 'cold ms', 'median ms', 'p99 ms'))
+    for mode, result in results.items():
+        for view, stats in result['views'].items():
+            print('{:<12} {:<10} {:>9.2f} {:>10.3f} {:>9.3f}'.format(
+                mode, view, stats['cold_ms'], stats['median_ms'], stats['p99_ms']))
+        print('{:<12} {:<10} {:>9.2f}'.format(mode, 'warm-up', result['warmup_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+User admin benchmark.
+
+Seeds, in a fresh interpreter with its own SQLite database, --users synthetic
+directory users (user names, first and last names and email as ldap_sync
+writes them), then requests the user changelist as the local admin fox with
+the stock django.contrib.auth UserAdmin and with authentication.admin's:
+
+    first page      /admin/auth/user/
+    middle page     page --users / 200, by page number (stock) or by cursor
+    search          q=smi, icontains (stock) or prefix search
+    sort            by last name
+    filter          staff users
+
+Both run on the indexes of migration 0003. The script reports, per case and
+admin, the median latency over --requests requests and the queries per
+request, and whether one of them counted the whole table.
+
+It then checks that the cursor links walk the same rows as the ORM's
+ordering, forwards and back, also where the sort column has ties; that the
+prefix search finds users by any of their attributes whatever the case; that
+no request of authentication.admin's counts the whole table; and that its
+middle page and search are faster than the stock ones. It exits non-zero if
+any check fails.
+
+Usage:
+    python benchmarks/user_admin.py [--users 100000] [--requests 10] [--json]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from session_load import APP_DIR
+
+LOCAL_PASSWORD = 'FoxAdmin2025!'
+FIRST_NAMES = [
+    'Alex', 'Blake', 'Casey', 'Dana', 'Drew', 'Eden', 'Emery', 'Finley', 'Harper', 'Jamie',
+    'Jordan', 'Kai', 'Logan', 'Morgan', 'Parker', 'Quinn', 'Reese', 'Riley', 'Rowan', 'Sage',
+    'Skyler', 'Taylor',
+]
+LAST_NAMES = [
+    'Adams', 'Baker', 'Brooks', 'Carter', 'Clark', 'Evans', 'Fisher', 'Garcia', 'Hughes', 'James',
+    'Kelly', 'Lopez', 'Martin', 'Morris', 'Nguyen', 'Patel', 'Price', 'Reed', 'Rivera', 'Smith',
+    'Stewart', 'Turner', 'Walker', 'Wright', 'Young',
+]
+CHANGELIST = '/admin/auth/user/'
+# Column 0 is the action checkbox
+LAST_NAME_COLUMN = 4
+
+
+def seed(User, count):
+    batch = []
+    for n in range(count):
+        first, last = FIRST_NAMES[n % len(FIRST_NAMES)], LAST_NAMES[n * 7 % len(LAST_NAMES)]
+        username = '{}.{}{}'.format(first, last, n).lower()
+        batch.append(User(
+            username=username, first_name=first, last_name=last, email=username + '@rule4.local',
+            password='!', is_staff=n % 10 == 0,
+        ))
+        if len(batch) == 5000:
+            User.objects.bulk_create(batch)
+            batch = []
+    User.objects.bulk_create(batch)
+
+
+def child(users, requests):
+    """Runs the cases in this interpreter and prints the results as JSON."""
+    sys.path.insert(0, APP_DIR)
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib import admin
+    from django.contrib.auth import admin as auth_admin
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import clear_url_caches
+
+    from authentication.admin import UserAdmin, encode_cursor, keyset_fields
+
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    seed(User, users)
+    fox = User.objects.create_superuser('fox', 'fox@rule4.local', LOCAL_PASSWORD)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE auth_user')
+
+    client = Client()
+    client.force_login(fox)
+
+    middle_page = max(1, users // 200)
+    middle_row = User.objects.order_by('username')[(middle_page - 1) * 100 - 1] if middle_page > 1 else None
+    middle_cursor = encode_cursor(middle_row, keyset_fields(User._meta, ['username'])) if middle_row else ''
+
+    def full_count(sql):
+        # A capped count is a COUNT over a LIMITed subquery
+        return 'COUNT(' in sql and 'LIMIT' not in sql
+
+    def measure(query):
+        client.get(CHANGELIST + query)  # Warm up
+        samples, db_samples, queries, counted = [], [], 0, False
+        for _ in range(requests):
+            db_time = [0.0]
+
+            def timed(execute, sql, params, many, context):
+                start = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                finally:
+                    db_time[0] += time.perf_counter() - start
+
+            with CaptureQueriesContext(connection) as captured, connection.execute_wrapper(timed):
+                start = time.perf_counter()
+                response = client.get(CHANGELIST + query)
+                samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, (query, response.status_code)
+            db_samples.append(db_time[0])
+            queries += len(captured.captured_queries)
+            counted = counted or any(full_count(q['sql']) for q in captured.captured_queries)
+        return {
+            'p50_ms': statistics.median(samples) * 1000,
+            'db_p50_ms': statistics.median(db_samples) * 1000,
+            'queries': queries / requests,
+            'full_count': counted,
+        }
+
+    cases = {
+        'first page': ('', ''),
+        'middle page': ('?p={}'.format(middle_page), '?after=' + middle_cursor),
+        'search': ('?q=smi', '?q=smi'),
+        'sort': ('?o={}'.format(LAST_NAME_COLUMN), '?o={}'.format(LAST_NAME_COLUMN)),
+        'filter': ('?is_staff__exact=1', '?is_staff__exact=1'),
+    }
+
+    def register(model_admin):
+        # The admin's URLs are bound to the instances registered when the
+        # URLconf is imported
+        admin.site.unregister(User)
+        admin.site.register(User, model_admin)
+        if settings.ROOT_URLCONF in sys.modules:
+            importlib.reload(sys.modules[settings.ROOT_URLCONF])
+            clear_url_caches()
+
+    results = {}
+    register(auth_admin.UserAdmin)
+    for name, (stock, _) in cases.items():
+        results['{} stock'.format(name)] = measure(stock)
+    register(UserAdmin)
+    for name, (_, ours) in cases.items():
+        results['{} authentication'.format(name)] = measure(ours)
+
+    def page(url):
+        response = client.get(url)
+        cl = response.context['cl']
+        return [user.pk for user in cl.result_list], cl.next_url, cl.previous_url
+
+    def walk(query, ordering):
+        """Follows Next three times and Previous once, against the ORM's ordering."""
+        expected = list(User.objects.order_by(*ordering).values_list('pk', flat=True)[:400])
+        rows, next_url, _ = page(CHANGELIST + query)
+        pages = [rows]
+        for _ in range(3):
+            rows, next_url, previous_url = page(CHANGELIST + next_url)
+            pages.append(rows)
+        back, _, _ = page(CHANGELIST + previous_url)
+        return sum(pages, []) == expected and back == pages[2]
+
+    def search(term):
+        response = client.get(CHANGELIST + '?' + urlencode({'q': term}))
+        return response.context['cl'].result_list
+
+    def starts(user, prefix):
+        values = [user.username, user.first_name, user.last_name, user.email]
+        return any(value.lower().startswith(prefix.lower()) for value in values)
+
+    sample = User.objects.filter(last_name='Smith').order_by('pk').first()
+    checks = {
+        'cursor links walk the username order, forwards and back': walk('', ['username']),
+        'cursor links walk the last name order, forwards and back': walk(
+            '?o={}'.format(LAST_NAME_COLUMN), ['last_name', 'username']),
+        'cursor links walk the reversed last name order': walk(
+            '?o=-{}'.format(LAST_NAME_COLUMN), ['-last_name', '-username']),
+        'search finds users by prefix, any case': (
+            bool(search('SMI')) and all(starts(user, 'smi') for user in search('SMI'))
+        ),
+        'search finds users by email prefix': sample in search(sample.email[:-len('@rule4.local')]),
+        'search matches every term': all(
+            user.first_name == sample.first_name and user.last_name == sample.last_name
+            for user in search('{} {}'.format(sample.first_name, sample.last_name))
+        ),
+        'a bad cursor is refused': client.get(CHANGELIST + '?after=x').status_code == 302,
+        'authentication: no request counts the whole table': not any(
+            result['full_count'] for name, result in results.items() if name.endswith('authentication')
+        ),
+        'authentication: middle page faster than stock': (
+            results['middle page authentication']['db_p50_ms'] < results['middle page stock']['db_p50_ms']
+        ),
+        'authentication: search faster than stock': (
+            results['search authentication']['db_p50_ms'] < results['search stock']['db_p50_ms']
+        ),
+    }
+
+    print(json.dumps({'results': results, 'checks': checks}))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]), int(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=100000, help='Synthetic users to seed')
+    parser.add_argument('--requests', type=int, default=10, help='Requests per case and admin')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            USER_CACHE_LOCATION=os.path.join(tmp, 'users'),
+            ALLOWED_HOSTS='testserver',
+            DJANGO_METRICS='false',
+            DJANGO_LOG_LEVEL='CRITICAL',
+        )
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(args.users), str(args.requests)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    output = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        print('{} users'.format(args.users))
+        print('{:<28} {:>8} {:>10} {:>12} {:>11}'.format('case', 'p50 ms', 'DB p50 ms', 'queries/req', 'full count'))
+        for name, result in output['results'].items():
+            print('{:<28} {:>8.1f} {:>10.2f} {:>12.1f} {:>11}'.format(
+                name, result['p50_ms'], result['db_p50_ms'], result['queries'], 'yes' if result['full_count'] else 'no'))
+        print()
+        for name, passed in output['checks'].items():
+            print('{:<60} {}'.format(name, 'ok' if passed else 'FAILED'))
+
+    if not all(output['checks'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
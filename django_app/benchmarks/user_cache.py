@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+User cache benchmark.
+
+Runs, in a fresh interpreter with its own SQLite database and the cache
+session engine, the fake AD server from fake_ldap.py and three logged-in
+clients: the local admin fox, a directory superuser (user0000) and a
+directory staff user (user0010). Each requests / and /admin/ --requests times,
+with the user cache off (USER_CACHE_TIMEOUT=0) and on. The script reports the
+median latency and the database queries per request, all of them and those
+that read from the auth_* tables.
+
+It then checks that repeated views of / make no queries at all and those of
+/admin/ none from auth_*, and that the cached users do not outlive a change:
+a flag saved on the user, a group joined, a permission added to or removed
+from that group, a staff group left in AD and brought in by an incremental
+ldap_sync, a password change, and a logout. It exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/user_cache.py [--requests 50] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_ldap import BIND_DN, BIND_PASSWORD, USER_PASSWORD
+from session_load import APP_DIR
+
+LOCAL_PASSWORD = 'FoxAdmin2025!'
+PATHS = ['/', '/admin/']
+
+
+def child(requests):
+    """Runs the cases in this interpreter and prints the results as JSON."""
+    sys.path.insert(0, APP_DIR)
+
+    from fake_ldap import FakeDirectory, FakeLDAPServer
+
+    directory = FakeDirectory.populated(users=20)
+    server = FakeLDAPServer(directory).start()
+    os.environ['LDAP_SERVER_URI'] = server.uri
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group, Permission
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    from authentication.usercache import UserCache, _entry_key
+
+    call_command('migrate', verbosity=0)
+    # The first run is a full one; the one below is incremental
+    call_command('ldap_sync', verbosity=0, stdout=open(os.devnull, 'w'))
+    User = get_user_model()
+    User.objects.create_superuser('fox', 'fox@rule4.local', LOCAL_PASSWORD)
+
+    clients = {}
+    for username, password in (('fox', LOCAL_PASSWORD), ('user0000', USER_PASSWORD),
+                               ('user0010', USER_PASSWORD)):
+        client = Client()
+        response = client.post('/login/', {'username': username, 'password': password})
+        assert response.status_code == 302, (username, response.status_code)
+        clients[username] = client
+
+    def measure(client, path):
+        client.get(path)  # Warm up, and fill the cache
+        samples, queries, auth_queries = [], 0, 0
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                client.get(path)
+                samples.append(time.perf_counter() - start)
+            queries += len(captured.captured_queries)
+            # The admin's recent actions join auth_user to django_admin_log
+            auth_queries += sum('FROM "auth_' in query['sql'] for query in captured.captured_queries)
+        return {
+            'p50_ms': statistics.median(samples) * 1000,
+            'queries': queries / requests,
+            'auth_queries': auth_queries / requests,
+        }
+
+    results = {}
+    for label, timeout in (('off', 0), ('on', 300)):
+        with override_settings(USER_CACHE_TIMEOUT=timeout):
+            for username, client in clients.items():
+                for path in PATHS:
+                    results['{} {} cache {}'.format(username, path, label)] = measure(clients[username], path)
+
+    def status(username, path='/admin/'):
+        return clients[username].get(path).status_code
+
+    def sees_users(username):
+        return b'/admin/auth/user/' in clients[username].get('/admin/').content
+
+    checks = {}
+    checks['/ makes no queries'] = all(
+        result['queries'] == 0 for name, result in results.items() if ' / cache on' in name
+    )
+    checks['/admin/ reads nothing from auth_*'] = all(
+        result['auth_queries'] == 0 for name, result in results.items() if ' /admin/ cache on' in name
+    )
+
+    # A flag saved on the user (post_save)
+    fox = User.objects.get(username='fox')
+    fox.is_staff = False
+    fox.save()
+    checks['is_staff turned off: admin refused'] = status('fox') == 302
+    fox.is_staff = True
+    fox.save()
+    checks['is_staff turned on: admin allowed'] = status('fox') == 200
+
+    # Group membership (user side) and the group's permissions (global)
+    viewers = Group.objects.create(name='Viewers')
+    checks['staff user without permissions: no Users link'] = not sees_users('user0010')
+    User.objects.get(username='user0010').groups.add(viewers)
+    viewers.permissions.add(Permission.objects.get(codename='view_user'))
+    checks['permission added to a group: Users link'] = sees_users('user0010')
+    viewers.permissions.clear()
+    checks['permission removed from the group: no Users link'] = not sees_users('user0010')
+
+    # A flag mirrored from AD by ldap_sync, which bulk-updates. Leaving a
+    # group moves the group's uSNChanged, not the user's.
+    directory.set_groups('user0010', [])
+    call_command('ldap_sync', verbosity=0, stdout=open(os.devnull, 'w'))
+    checks['staff group left in AD, ldap_sync run: admin refused'] = status('user0010') == 302
+
+    # A password change ends the other sessions
+    fox.set_password('FoxAdmin2026!')
+    fox.save()
+    checks['password changed: session ended'] = status('fox', '/') == 302
+
+    # A logout drops the session's entry
+    session_key = clients['user0000'].session.session_key
+    user_id = User.objects.get(username='user0000').pk
+    had_entry = UserCache().cache.get(_entry_key(session_key, user_id)) is not None
+    clients['user0000'].get('/logout/')
+    checks['logout: entry dropped'] = had_entry and UserCache().cache.get(_entry_key(session_key, user_id)) is None
+
+    server.stop()
+    print(json.dumps({'results': results, 'checks': checks}))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=50, help='Requests per user, path and case')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='config.settings',
+            DJANGO_PROFILE='prod',
+            SQLITE_PATH=os.path.join(tmp, 'db.sqlite3'),
+            DJANGO_SESSION_ENGINE='cache',
+            SESSION_CACHE_LOCATION=os.path.join(tmp, 'sessions'),
+            USER_CACHE_LOCATION=os.path.join(tmp, 'users'),
+            GROUP_CACHE_LOCATION=os.path.join(tmp, 'groups'),
+            ALLOWED_HOSTS='testserver',
+            DJANGO_METRICS='false',
+            DJANGO_LOG_LEVEL='CRITICAL',
+            LDAP_BIND_DN=BIND_DN,
+            LDAP_BIND_PASSWORD=BIND_PASSWORD,
+            LDAP_ADMISSION_DIR=os.path.join(tmp, 'admission'),
+            LDAP_SYNC_MAX_AGE='0',
+        )
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(args.requests)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    output = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        print('{:<30} {:>8} {:>14} {:>14}'.format('case', 'p50 ms', 'queries/req', 'auth_*/req'))
+        for name, result in output['results'].items():
+            print('{:<30} {:>8.2f} {:>14.1f} {:>14.1f}'.format(
+                name, result['p50_ms'], result['queries'], result['auth_queries']))
+        print()
+        for name, passed in output['checks'].items():
+            print('{:<56} {}'.format(name, 'ok' if passed else 'FAILED'))
+
+    if not all(output['checks'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
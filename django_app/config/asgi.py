@@ -0,0 +1,27 @@
+"""
+ASGI config for the project.
+
+Run with uvicorn workers, e.g.
+    gunicorn -k uvicorn.workers.UvicornWorker config.asgi:application
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the async views (see ASYNC_VIEWS). Assigned rather than defaulted:
+# the image sets DJANGO_SERVER=wsgi for its default workers.
+os.environ['DJANGO_SERVER'] = 'asgi'
+
+application = get_asgi_application()
+
+# Compile the hot templates now rather than on the first requests
+from config.warmup import warm_templates  # noqa: E402
+
+warm_templates()
+
+# Serve /static/ from STATIC_ROOT without going through Django
+from config.static import wrap_asgi  # noqa: E402
+
+application = wrap_asgi(application)
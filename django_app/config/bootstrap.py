@@ -0,0 +1,186 @@
+"""
+Container bootstrap: schema and bootstrap users.
+
+Every container start used to run the full migrate command and then start a
+second interpreter (manage.py shell) to create the admin user. The helpers
+here let the bootstrap command do the common case - an up-to-date database -
+with one query: unapplied_migrations() compares the migration files on disk
+with the django_migrations table, and migrate only runs when they differ.
+ensure_users() then creates or updates settings.BOOTSTRAP_USERS in the same
+process.
+
+A new environment has no database at all. The image therefore ships a
+migrated, vacuumed seed database built by build_snapshot() (manage.py
+build_seed_db), and restore_snapshot() copies it into place on the first
+start, once its checksum and migration state have been checked against the
+manifest written next to it. A snapshot that is behind the code is still
+used; the migration check then applies only what it lacks.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+
+# Fields of a BOOTSTRAP_USERS entry that are copied onto the user as is
+USER_FIELDS = ('email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def disk_migrations():
+    """The (app_label, name) of every migration in the code."""
+    return set(MigrationLoader(None, ignore_no_migrations=True).graph.nodes)
+
+
+def unapplied_migrations(database='default'):
+    """
+    Returns the (app_label, name) of every migration on disk that the
+    database has not recorded, in no particular order. The database is read
+    with a single query; a missing django_migrations table means nothing is
+    applied.
+
+    A squashed migration whose replaced migrations were applied one by one is
+    reported as unapplied, which only costs a migrate run that does nothing.
+    """
+    connection = connections[database]
+
+    table = connection.ops.quote_name(MigrationRecorder.Migration._meta.db_table)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT app, name FROM {}'.format(table))
+            applied = set(cursor.fetchall())
+    except DatabaseError:
+        applied = set()
+
+    return [key for key in disk_migrations() if key not in applied]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(snapshot):
+    return snapshot + '.json'
+
+
+def _migration_names(keys):
+    return sorted('{}.{}'.format(app, name) for app, name in keys)
+
+
+def build_snapshot(database='default'):
+    """
+    Vacuums the (just migrated) SQLite database and writes its manifest -
+    checksum and applied migrations - next to it. Returns the manifest.
+    """
+    connection = connections[database]
+    path = connection.settings_dict['NAME']
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT app, name FROM {}'.format(
+            connection.ops.quote_name(MigrationRecorder.Migration._meta.db_table)))
+        applied = cursor.fetchall()
+        cursor.execute('VACUUM')
+    connection.close()
+
+    manifest = {
+        'sha256': _sha256(path),
+        'migrations': _migration_names(applied),
+        'django': django.get_version(),
+        'created': timezone.now().isoformat(),
+    }
+    with open(_manifest_path(path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def restore_snapshot(snapshot, database='default'):
+    """
+    Copies the seed snapshot into place if the database file does not exist
+    yet. Returns (restored, reason).
+    """
+    connection = connections[database]
+    if connection.vendor != 'sqlite':
+        return False, 'not an SQLite database'
+
+    target = connection.settings_dict['NAME']
+    if str(target) == ':memory:' or (os.path.exists(target) and os.path.getsize(target) > 0):
+        return False, 'database already exists'
+
+    try:
+        with open(_manifest_path(snapshot)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False, 'no snapshot at {}'.format(snapshot)
+
+    if not os.path.exists(snapshot) or _sha256(snapshot) != manifest.get('sha256'):
+        return False, 'snapshot checksum does not match its manifest'
+
+    in_code = set(_migration_names(disk_migrations()))
+    in_snapshot = set(manifest.get('migrations', []))
+    if in_snapshot - in_code:
+        return False, 'snapshot has migrations this code does not know'
+
+    # Copy next to the target and rename, so a failed copy never leaves a
+    # partial database behind
+    partial = '{}.seed'.format(target)
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    shutil.copyfile(snapshot, partial)
+    os.replace(partial, target)
+
+    behind = len(in_code - in_snapshot)
+    if behind:
+        return True, 'restored, {} migrations behind'.format(behind)
+    return True, 'restored'
+
+
+def ensure_users(specs, reset_passwords=False):
+    """
+    Creates the users described by specs (dicts with a username, a password
+    and any of USER_FIELDS) and brings the fields of existing ones up to
+    date. Passwords are only set on creation, or with reset_passwords, as
+    hashing one takes a noticeable fraction of a second. Returns
+    {username: 'created' | 'updated' | 'unchanged'}.
+    """
+    model = get_user_model()
+    existing = model.objects.in_bulk(
+        [spec['username'] for spec in specs], field_name=model.USERNAME_FIELD,
+    )
+
+    results = {}
+    for spec in specs:
+        username = spec['username']
+        fields = {name: spec[name] for name in USER_FIELDS if name in spec}
+        user = existing.get(username)
+
+        if user is None:
+            user = model(**{model.USERNAME_FIELD: username}, **fields)
+            user.set_password(spec.get('password'))
+            user.save()
+            results[username] = 'created'
+            continue
+
+        changed = [name for name, value in fields.items() if getattr(user, name) != value]
+        for name in changed:
+            setattr(user, name, fields[name])
+        if reset_passwords:
+            user.set_password(spec.get('password'))
+            changed.append('password')
+
+        if changed:
+            user.save(update_fields=changed)
+            results[username] = 'updated'
+        else:
+            results[username] = 'unchanged'
+
+    return results
@@ -0,0 +1,104 @@
+"""
+Process configuration, resolved once.
+
+The settings used to call load_dotenv() and the Key Vault loader, which both
+wrote into os.environ, and then parsed os.environ value by value. load()
+instead merges the three sources into one read-only Environment the first
+time it is called and returns that same object afterwards:
+
+1. .env in the app directory (lowest; os.environ is not modified)
+2. the process environment
+3. Key Vault secrets when AZURE_KEY_VAULT_URL is set (highest, as before)
+
+Every settings profile reads its values through it. The gunicorn master
+calls load() before forking (see gunicorn.conf.py), so workers inherit the
+resolved values, secrets included, whether or not the application is
+preloaded.
+"""
+
+import functools
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from types import MappingProxyType
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+
+
+class Environment(Mapping):
+    """
+    Read-only mapping of variable names to string values, with typed getters.
+    Empty values count as unset for the typed getters.
+    """
+
+    __slots__ = ('_values', 'sources')
+
+    def __init__(self, values, sources=None):
+        object.__setattr__(self, '_values', MappingProxyType(dict(values)))
+        # Name -> '.env', 'environ' or 'keyvault'
+        object.__setattr__(self, 'sources', MappingProxyType(dict(sources or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Environment is read-only')
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def bool(self, name, default=False):
+        value = self.get(name)
+        if not value:
+            return default
+        return value.strip().lower() in TRUE_VALUES
+
+    def int(self, name, default=0):
+        value = self.get(name)
+        if not value:
+            return default
+        return int(value)
+
+    def float(self, name, default=0.0):
+        value = self.get(name)
+        if not value:
+            return default
+        return float(value)
+
+    def list(self, name, default=''):
+        """A comma-separated value as a list, without blank items."""
+        value = self.get(name) or default
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def read_dotenv(path):
+    """The variables in a .env file, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+
+    from dotenv import dotenv_values
+    return {name: value for name, value in dotenv_values(path).items() if value is not None}
+
+
+@functools.lru_cache(maxsize=None)
+def load():
+    """The Environment of this process, resolved on the first call."""
+    values, sources = {}, {}
+
+    def merge(layer, source):
+        values.update(layer)
+        sources.update(dict.fromkeys(layer, source))
+
+    merge(read_dotenv(os.path.join(BASE_DIR, '.env')), '.env')
+    merge(os.environ, 'environ')
+
+    if values.get('AZURE_KEY_VAULT_URL'):
+        from .keyvault import load_secrets
+        merge(load_secrets(values), 'keyvault')
+
+    return Environment(values, sources)
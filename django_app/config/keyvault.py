@@ -1,42 +1,248 @@
 """
 Azure Key Vault integration for Django settings.
 This module provides functionality to load sensitive configuration from Azure Key Vault.
+
+Secrets are fetched concurrently with the async Key Vault client, using the
+process's one credential and the token it caches, and the results are kept in a short-lived
+encrypted cache file so that gunicorn workers started later (and quick
+restarts) do not go back to the network. Without the async extras (aiohttp)
+the secrets are fetched one after another as before.
+
+Environment variables:
+- AZURE_KEY_VAULT_URL: vault to load from; nothing is loaded when unset
+- AZURE_KEY_VAULT_CREDENTIAL: 'managed-identity' skips DefaultAzureCredential's
+  probing of other credential sources
+- KEY_VAULT_CACHE_KEY: Fernet key for the cache file; no cache file is
+  written or read without it
+- KEY_VAULT_CACHE_FILE: cache file path (default: a per-user file in the
+  system temp directory)
+- KEY_VAULT_CACHE_TTL: seconds a cached secret stays valid (default: 300)
+
+These are read from the mapping passed as environ (config.environment passes
+the process environment merged with .env), or from os.environ.
 """
 
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+import asyncio
+import json
 import os
+import tempfile
+import time
+
+# Map of Key Vault secret names to environment variable names
+SECRETS = {
+    'ldap-bind-password': 'LDAP_BIND_PASSWORD',
+    'django-secret-key': 'DJANGO_SECRET_KEY'
+}
+
+# One credential per process; it caches the access token it obtains
+_credential = None
 
-def load_secrets():
+
+def load_secrets(environ=None):
     """
-    Load secrets from Azure Key Vault into environment variables.
+    Load secrets from Azure Key Vault and return them keyed by environment
+    variable name; os.environ is left untouched.
     Uses DefaultAzureCredential for authentication, which supports:
     - Managed Identity (when deployed to Azure)
     - Azure CLI credentials (for local development)
     """
-    vault_url = os.environ.get('AZURE_KEY_VAULT_URL')
+    environ = os.environ if environ is None else environ
+    vault_url = environ.get('AZURE_KEY_VAULT_URL')
     if not vault_url:
-        return
-        
+        return {}
+
     try:
-        # Initialize the Key Vault client
-        credential = DefaultAzureCredential()
-        client = SecretClient(vault_url=vault_url, credential=credential)
-        
-        # Map of Key Vault secret names to environment variable names
-        secrets = {
-            'ldap-bind-password': 'LDAP_BIND_PASSWORD',
-            'django-secret-key': 'DJANGO_SECRET_KEY'
-        }
-        
-        # Load each secret into environment variables
-        for vault_name, env_name in secrets.items():
-            try:
-                value = client.get_secret(vault_name).value
-                if value:
-                    os.environ[env_name] = value
-            except Exception:
-                pass  # Use environment variable/default if secret not found
-                
+        values = read_cache(vault_url, environ)
+        if values is None:
+            values = fetch_secrets(vault_url, environ=environ)
+            write_cache(vault_url, values, environ)
+
     except Exception:
-        pass  # Use environment variables/defaults if Key Vault not available 
\ No newline at end of file
+        return {}  # Use environment variables/defaults if Key Vault not available
+
+    return {env_name: value for env_name, value in values.items() if value}
+
+
+def fetch_secrets(vault_url, secrets=SECRETS, environ=None):
+    """
+    Fetch secrets from the vault and return them keyed by environment
+    variable name. Secrets that are missing or fail to load are left out.
+    """
+    try:
+        from azure.keyvault.secrets.aio import SecretClient as AsyncSecretClient
+    except ImportError:
+        AsyncSecretClient = None
+
+    if AsyncSecretClient is None or _event_loop_running():
+        from azure.keyvault.secrets import SecretClient
+
+        client = SecretClient(vault_url=vault_url, credential=get_credential(environ))
+        return fetch_secrets_sequential(client, secrets)
+
+    async def fetch():
+        credential = _AsyncCredential(get_credential(environ))
+        async with AsyncSecretClient(vault_url=vault_url, credential=credential) as client:
+            return await fetch_secrets_concurrent(client, secrets)
+
+    return asyncio.run(fetch())
+
+
+def fetch_secrets_sequential(client, secrets=SECRETS):
+    """
+    Fetch each secret in turn with a synchronous SecretClient.
+    """
+    values = {}
+    for vault_name, env_name in secrets.items():
+        try:
+            value = client.get_secret(vault_name).value
+        except Exception:
+            continue  # Use environment variable/default if secret not found
+        if value:
+            values[env_name] = value
+
+    return values
+
+
+async def fetch_secrets_concurrent(client, secrets=SECRETS):
+    """
+    Fetch all secrets at once with an async SecretClient.
+    """
+    names = list(secrets)
+    results = await asyncio.gather(
+        *(client.get_secret(name) for name in names),
+        return_exceptions=True,
+    )
+
+    values = {}
+    for vault_name, result in zip(names, results):
+        if isinstance(result, Exception):
+            continue  # Use environment variable/default if secret not found
+        if result.value:
+            values[secrets[vault_name]] = result.value
+
+    return values
+
+
+def get_credential(environ=None):
+    """
+    Return this process's synchronous credential, creating it on first use.
+    """
+    global _credential
+
+    if _credential is None:
+        _credential = _make_credential(environ)
+
+    return _credential
+
+
+class _AsyncCredential:
+    """
+    Lets the async SecretClient use the synchronous credential. An async
+    credential belongs to the event loop it was made in, and each
+    fetch_secrets() runs its own loop, so it could not be kept between calls.
+    """
+
+    def __init__(self, credential):
+        self._credential = credential
+
+    async def get_token(self, *scopes, **kwargs):
+        # Only the first call of the process goes to the network
+        return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+
+    async def close(self):
+        pass  # The credential outlives the client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def _make_credential(environ=None):
+    from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
+
+    environ = os.environ if environ is None else environ
+    if environ.get('AZURE_KEY_VAULT_CREDENTIAL') == 'managed-identity':
+        return ManagedIdentityCredential()
+
+    return DefaultAzureCredential()
+
+
+def _event_loop_running():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    return True
+
+
+def _cache_path(environ):
+    default = os.path.join(tempfile.gettempdir(), 'django-keyvault-{}.cache'.format(os.getuid()))
+    return environ.get('KEY_VAULT_CACHE_FILE', default)
+
+
+def _cache_fernet(environ):
+    key = environ.get('KEY_VAULT_CACHE_KEY')
+    if not key:
+        return None
+
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        return None
+
+    return Fernet(key.encode())
+
+
+def read_cache(vault_url, environ=None):
+    """
+    Return cached secrets for vault_url, or None if there is no valid cache.
+    """
+    environ = os.environ if environ is None else environ
+    fernet = _cache_fernet(environ)
+    if fernet is None:
+        return None
+
+    ttl = int(environ.get('KEY_VAULT_CACHE_TTL', '300'))
+    try:
+        with open(_cache_path(environ), 'rb') as f:
+            # decrypt() rejects tokens older than ttl seconds
+            payload = json.loads(fernet.decrypt(f.read(), ttl=ttl))
+    except Exception:
+        return None
+
+    if payload.get('vault_url') != vault_url:
+        return None
+
+    return payload['secrets']
+
+
+def write_cache(vault_url, values, environ=None):
+    """
+    Write secrets to the encrypted cache file, readable only by this user.
+    """
+    environ = os.environ if environ is None else environ
+    fernet = _cache_fernet(environ)
+    if fernet is None or not values:
+        return
+
+    path = _cache_path(environ)
+    token = fernet.encrypt(json.dumps({
+        'vault_url': vault_url,
+        'secrets': values,
+        'fetched_at': time.time(),
+    }).encode())
+
+    # Write to a private temp file and rename so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.keyvault-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(token)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,55 @@
+"""
+Lazily built django-auth-ldap configuration objects.
+
+LDAPSearch and the group types need python-ldap, which is slow to import and
+is only used once somebody actually authenticates. These helpers let the
+settings describe the searches without importing it: each returns a
+SimpleLazyObject that builds the real object on first use.
+"""
+
+from django.utils.functional import SimpleLazyObject, empty
+
+
+class LazyConfig(SimpleLazyObject):
+    """
+    A SimpleLazyObject whose repr describes the object it will build, so that
+    printing the settings (manage.py settings_diff) neither builds it nor shows
+    a function address.
+    """
+
+    def __init__(self, build, description):
+        super().__init__(build)
+        self.__dict__['_description'] = description
+
+    def __repr__(self):
+        if self._wrapped is empty:
+            return self._description
+        return repr(self._wrapped)
+
+
+def lazy_search(base_dn, scope, filterstr='(objectClass=*)', attrlist=None):
+    """
+    An LDAPSearch built on first use. scope is the name of the python-ldap
+    constant, e.g. 'SCOPE_SUBTREE'.
+    """
+    def build():
+        import ldap
+        from django_auth_ldap.config import LDAPSearch
+
+        return LDAPSearch(base_dn, getattr(ldap, scope), filterstr, attrlist)
+
+    return LazyConfig(build, 'LDAPSearch({!r}, {}, {!r}, {!r})'.format(base_dn, scope, filterstr, attrlist))
+
+
+def lazy_group_type(name, **kwargs):
+    """
+    An instance of the django_auth_ldap.config group type called name, built
+    on first use.
+    """
+    def build():
+        from django_auth_ldap import config
+
+        return getattr(config, name)(**kwargs)
+
+    return LazyConfig(build, '{}({})'.format(
+        name, ', '.join('{}={!r}'.format(key, value) for key, value in sorted(kwargs.items()))))
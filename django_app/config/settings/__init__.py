@@ -0,0 +1,30 @@
+"""
+Django settings for Rule4 POC project.
+
+The settings are layered:
+
+- base: everything every profile shares
+- dev / prod: profiles built on base
+- ldap: Active Directory authentication, applied by a profile
+
+DJANGO_SETTINGS_MODULE=config.settings loads the profile named by
+DJANGO_PROFILE (default: prod); config.settings.dev and config.settings.prod
+can also be named directly. All values come from config.environment, which
+resolves .env, the process environment and Azure Key Vault once per process.
+manage.py settings_diff compares the profiles.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from config.environment import load
+
+PROFILES = ('dev', 'prod')
+
+_profile = load().get('DJANGO_PROFILE', 'prod')
+
+if _profile == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif _profile == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured('DJANGO_PROFILE must be one of: {}'.format(', '.join(PROFILES)))
@@ -0,0 +1,283 @@
+"""
+Settings shared by every profile (see config.settings).
+
+Values come from config.environment, which has already merged .env, the
+process environment and Key Vault. Nothing LDAP-specific is configured here;
+that is the ldap overlay.
+"""
+
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+from config.environment import load
+from config.sqlite import production_profile
+
+env = load()
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Base Django settings - Retrieved from Key Vault in production
+SECRET_KEY = env.get('DJANGO_SECRET_KEY', 'dev-only-local-key')
+DEBUG = env.bool('DEBUG', False)
+
+ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', 'localhost')
+CSRF_TRUSTED_ORIGINS = env.list('CSRF_TRUSTED_ORIGINS')
+
+# Lean startup mode trims what a serving worker does not need, so that cold
+# start is faster when workers are scaled up (see benchmarks/import_time.py)
+LEAN_STARTUP = env.bool('DJANGO_LEAN_STARTUP', False)
+
+# Application definition - Standard Django apps
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'authentication',  # Custom authentication app
+]
+
+if LEAN_STARTUP:
+    # Only needed for collectstatic and runserver; {% static %} works without
+    # it, but returns the unhashed names
+    INSTALLED_APPS.remove('django.contrib.staticfiles')
+
+# Standard Django middleware for security and session management
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    # AuthenticationMiddleware with the user cache (see authentication.usercache)
+    'authentication.middleware.CachedUserMiddleware',
+    # 503/429 with Retry-After for logins refused by LDAP admission control
+    'authentication.middleware.AdmissionMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Metrics - per-view latency, DB and LDAP work and cache hit rates, served at
+# /metrics (see authentication.metrics). Each worker writes to METRICS_DIR so
+# that a scrape reports the sum over all gunicorn workers; empty = per process.
+METRICS_ENABLED = env.bool('DJANGO_METRICS', True)
+METRICS_DIR = env.get('PROMETHEUS_MULTIPROC_DIR', '/tmp/django_metrics')
+METRICS_ALLOWED_NETWORKS = env.list(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16',
+)
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'authentication.middleware.MetricsMiddleware')
+
+ROOT_URLCONF = 'config.urls'
+
+# Template performance mode - the hot templates are compiled at boot (see
+# config.warmup) into the cached loader, which Django's default loaders
+# already use (APP_DIRS, no 'loaders'), so that the first requests of a new
+# worker do not compile them
+TEMPLATE_PERFORMANCE = env.bool('DJANGO_TEMPLATE_PERFORMANCE', True)
+
+# Templates compiled when a worker boots, along with what they extend/include
+TEMPLATE_WARMUP = [
+    'authentication/login.html',
+    'authentication/home.html',
+    'admin/login.html',
+    'admin/index.html',
+    'admin/change_list.html',
+    'admin/auth/user/change_list.html',
+    'admin/change_form.html',
+] if TEMPLATE_PERFORMANCE else []
+
+# Template configuration with default Django backend
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [BASE_DIR / 'templates'],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',  # Dropped in lean mode
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+if LEAN_STARTUP:
+    TEMPLATES[0]['OPTIONS']['context_processors'].remove('django.template.context_processors.debug')
+
+WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Database configuration - Using SQLite for simplicity
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+    }
+}
+
+# Migrated seed database baked into the image (manage.py build_seed_db);
+# manage.py bootstrap copies it to SQLITE_PATH when that does not exist yet
+SQLITE_SEED_PATH = env.get('SQLITE_SEED_PATH', str(BASE_DIR / 'seed' / 'db.sqlite3'))
+
+# SQLite production profile - DJANGO_SQLITE_PROFILE=production (the default
+# of the prod profile) enables WAL so readers don't block the writer, waits on
+# locks instead of failing, and keeps one connection per worker. PRAGMAs are
+# applied by config.sqlite.
+SQLITE_PROFILE = env.get('DJANGO_SQLITE_PROFILE', 'default')
+SQLITE_PRAGMAS = {}
+if SQLITE_PROFILE == 'production':
+    SQLITE_PRAGMAS = production_profile(DATABASES['default'], env)
+
+# Authentication backends - the ldap overlay puts LDAP in front of this
+AUTHENTICATION_BACKENDS = [
+    'authentication.usercache.CachedModelBackend',  # ModelBackend with the user cache
+]
+
+
+def shared_cache(location, max_entries):
+    """
+    A cache all gunicorn workers see: Redis, or a file cache on this host.
+    The file cache deletes a random third of its entries once it holds
+    max_entries (Django's default is 300), and lists its directory on every
+    write, so past a few tens of thousands of entries use Redis.
+    """
+    if location.startswith(('redis://', 'rediss://')):
+        # Redis evicts by its own maxmemory policy, and takes no MAX_ENTRIES
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': location,
+        }
+
+    return {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': location,
+        'OPTIONS': {
+            'MAX_ENTRIES': max_entries,
+        },
+    }
+
+
+# Caches - the ldap overlay adds 'auth' for recent authentication results
+session_cache_location = env.get('SESSION_CACHE_LOCATION', '/tmp/django_sessions')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Session store for the cache and cached_db engines - must be shared by
+    # all gunicorn workers, so a file cache on this host or Redis
+    'sessions': shared_cache(session_cache_location, env.int('SESSION_CACHE_MAX_ENTRIES', 10000)),
+    # Users of logged-in sessions and their permissions - shared too, so that
+    # a change made in one worker reaches the entries of all of them
+    'users': shared_cache(
+        env.get('USER_CACHE_LOCATION', '/tmp/django_users'), env.int('USER_CACHE_MAX_ENTRIES', 10000),
+    ),
+    # Resolved LDAP group memberships (see authentication.groups) - shared so
+    # that a logout in one worker drops them for all of them
+    'groups': shared_cache(
+        env.get('GROUP_CACHE_LOCATION', '/tmp/django_groups'), env.int('GROUP_CACHE_MAX_ENTRIES', 10000),
+    ),
+}
+
+# User cache (see authentication.usercache) - seconds an entry lives at most,
+# 0 loads the user from the database on every request
+USER_CACHE_ALIAS = 'users'
+USER_CACHE_TIMEOUT = env.int('USER_CACHE_TIMEOUT', 300)
+
+# Group membership cache, kept for AUTH_LDAP_GROUP_CACHE_TIMEOUT seconds
+GROUP_CACHE_ALIAS = 'groups'
+
+# Session engine - db (default), cache, cached_db or signed_cookies
+session_engines = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+session_engine = env.get('DJANGO_SESSION_ENGINE', 'db')
+if session_engine not in session_engines:
+    raise ImproperlyConfigured(
+        'DJANGO_SESSION_ENGINE must be one of: {}'.format(', '.join(session_engines))
+    )
+SESSION_ENGINE = session_engines[session_engine]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Async views (authentication.async_views) under ASGI, sync views under WSGI,
+# where every async view would go through async_to_sync. config.asgi sets
+# DJANGO_SERVER=asgi whatever it was.
+ASYNC_VIEWS = env.get('DJANGO_SERVER', 'wsgi') == 'asgi'
+
+# Threads per worker for blocking LDAP calls made from the async views
+AUTH_LDAP_THREADS = env.int('LDAP_THREADS', 8)
+
+# Static files - collectstatic (run when the image is built) writes hashed
+# copies with .gz/.br variants to STATIC_ROOT (see config.storage), and the
+# WSGI/ASGI application serves them before Django (see config.static). Turn
+# DJANGO_STATIC_SERVE off where nginx serves /static/ (config/nginx.conf).
+STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'static'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'config.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_SERVE = env.bool('DJANGO_STATIC_SERVE', True)
+STATIC_MAX_AGE = env.int('DJANGO_STATIC_MAX_AGE', 60)  # Seconds, for files without a hash in their name
+
+# Security settings
+SECURE_SSL_REDIRECT = False  # SSL termination happens at Nginx
+SESSION_COOKIE_SECURE = False  # Set to True when using HTTPS
+CSRF_COOKIE_SECURE = False    # Set to True when using HTTPS
+X_FRAME_OPTIONS = 'DENY'  # Prevent clickjacking
+
+# Internationalization - translation catalogs are skipped in lean mode
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'UTC'
+USE_I18N = not LEAN_STARTUP
+USE_TZ = True
+
+# Default primary key field type
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Login settings
+LOGIN_URL = '/admin/login/'
+LOGIN_REDIRECT_URL = '/admin/'
+LOGOUT_REDIRECT_URL = '/admin/login/'
+
+# Password validation
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Local users created or updated by manage.py bootstrap at container start.
+# Passwords are only set when a user is created (or with --reset-passwords)
+BOOTSTRAP_USERS = [
+    {
+        'username': 'fox',
+        'password': env.get('FOX_ADMIN_PASSWORD', 'FoxAdmin2025!'),
+        'email': 'fox@rule4.local',
+        'first_name': 'Fox',
+        'last_name': 'Admin',
+        'is_staff': True,
+        'is_superuser': True,
+    },
+]
@@ -0,0 +1,41 @@
+"""
+Development profile: runserver and local work.
+
+DEBUG is on by default and the LDAP overlay is only applied when
+LDAP_SERVER_URI is set, so the local users work without a domain controller.
+"""
+
+from .base import *  # noqa: F401,F403
+from .base import env
+
+PROFILE = 'dev'
+
+DEBUG = env.bool('DEBUG', True)
+ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', 'localhost,127.0.0.1')
+
+# runserver serves static files from the apps, so edits show up without
+# running collectstatic
+STATIC_SERVE = env.bool('DJANGO_STATIC_SERVE', False)
+
+if env.get('LDAP_SERVER_URI'):
+    from .ldap import *  # noqa: F401,F403
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': env.get('DJANGO_LOG_LEVEL', 'INFO'),
+    },
+    'loggers': {
+        # Binds, searches and group lookups
+        'django_auth_ldap': {
+            'level': env.get('LDAP_LOG_LEVEL', 'DEBUG'),
+        },
+    },
+}
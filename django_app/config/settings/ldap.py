@@ -0,0 +1,130 @@
+"""
+LDAP overlay: Active Directory authentication on top of a profile.
+
+Star-imported by a profile after base (prod always, dev when LDAP_SERVER_URI
+is set). python-ldap and django_auth_ldap are imported on first
+authentication, not here.
+"""
+
+from config.environment import load
+from config.lazy_ldap import lazy_group_type, lazy_search
+
+from .base import BOOTSTRAP_USERS, CACHES
+
+env = load()
+
+# LDAP Authentication settings
+# All sensitive values are retrieved from Azure Key Vault in production
+# One or more domain controllers, separated by spaces or commas; logins go to
+# the fastest one that is up (see authentication.servers)
+AUTH_LDAP_SERVER_URI = ' '.join(env.get('LDAP_SERVER_URI', 'ldap://localhost').replace(',', ' ').split())
+AUTH_LDAP_BIND_DN = env.get('LDAP_BIND_DN', 'CN=django,CN=Users,DC=rule4,DC=local')
+AUTH_LDAP_BIND_PASSWORD = env.get('LDAP_BIND_PASSWORD', '')  # Retrieved from Key Vault
+
+# Base DN searched for users and groups
+LDAP_SEARCH_BASE = env.get('LDAP_SEARCH_BASE', 'DC=rule4,DC=local')
+
+# Every attribute, and memberOf by name so that an entry without it means
+# the user is in no group (see authentication.groups). The second is for
+# reloads of the entry once the user search is cached.
+AUTH_LDAP_USER_ATTRLIST = ['*', 'memberOf']
+
+# LDAP user search configuration
+AUTH_LDAP_USER_SEARCH = lazy_search(
+    LDAP_SEARCH_BASE,
+    'SCOPE_SUBTREE',      # Search entire subtree
+    "(sAMAccountName=%(user)s)",  # Filter by Windows username
+    AUTH_LDAP_USER_ATTRLIST,
+)
+
+# LDAP group search configuration
+AUTH_LDAP_GROUP_SEARCH = lazy_search(
+    LDAP_SEARCH_BASE,
+    'SCOPE_SUBTREE',
+    "(objectClass=group)",
+)
+
+AUTH_LDAP_GROUP_TYPE = lazy_group_type('GroupOfNamesType')
+
+# How group membership is resolved (see authentication.groups):
+# 'memberof' reads memberOf from the user entry, 'targeted' queries only the
+# groups below, 'search' uses AUTH_LDAP_GROUP_SEARCH/AUTH_LDAP_GROUP_TYPE
+AUTH_LDAP_GROUP_STRATEGY = env.get('LDAP_GROUP_STRATEGY', 'memberof')
+AUTH_LDAP_GROUP_CACHE_TIMEOUT = env.int('LDAP_GROUP_CACHE_TIMEOUT', 300)  # Seconds, 0 disables
+
+# Map LDAP attributes to Django user attributes
+AUTH_LDAP_USER_ATTR_MAP = {
+    "first_name": "givenName",
+    "last_name": "sn",
+    "email": "mail",
+}
+
+# Map LDAP groups to Django permissions
+AUTH_LDAP_USER_FLAGS_BY_GROUP = {
+    "is_staff": "CN=DjangoStaff,CN=Users,DC=rule4,DC=local",
+    "is_superuser": "CN=DjangoAdmins,CN=Users,DC=rule4,DC=local",
+}
+
+# Each login is checked by LDAP or by the local password, never both: the
+# router picks one from AUTH_LOCAL_USERS and the user's password state
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.RealmRoutingBackend',
+    'authentication.backends.LDAPBackend',  # django_auth_ldap with connection pooling
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Accounts that only ever log in with their local password (default: the
+# BOOTSTRAP_USERS); other users with a usable password are local too
+AUTH_LOCAL_USERS = env.list('AUTH_LOCAL_USERS') or [user['username'] for user in BOOTSTRAP_USERS]
+
+# Authentication result cache - repeated bad passwords are rejected without
+# contacting the DC; caching successes is opt-in
+AUTH_LDAP_RESULT_CACHE_ALIAS = 'auth'
+AUTH_LDAP_RESULT_CACHE_FAILURE_TIMEOUT = env.int('AUTH_RESULT_CACHE_FAILURE_TIMEOUT', 30)
+AUTH_LDAP_RESULT_CACHE_SUCCESS_TIMEOUT = env.int('AUTH_RESULT_CACHE_SUCCESS_TIMEOUT', 0)
+# Only the LDAP backend uses it, and Django's checks build every configured
+# cache, so profiles without LDAP do not get it
+CACHES[AUTH_LDAP_RESULT_CACHE_ALIAS] = {
+    'BACKEND': 'authentication.cache.LRUCache',
+    'OPTIONS': {
+        'MAX_ENTRIES': env.int('AUTH_RESULT_CACHE_MAX_ENTRIES', 10000),
+    },
+}
+
+# Timeouts and failover - a server that is unreachable or does not answer in
+# time is skipped for FAILOVER_BACKOFF seconds, doubling up to the maximum
+AUTH_LDAP_CONNECT_TIMEOUT = env.float('LDAP_CONNECT_TIMEOUT', 2)  # Seconds to open a connection
+AUTH_LDAP_OPERATION_TIMEOUT = env.float('LDAP_OPERATION_TIMEOUT', 5)  # Seconds to wait for a bind or search
+AUTH_LDAP_FAILOVER_BACKOFF = env.float('LDAP_FAILOVER_BACKOFF', 5)
+AUTH_LDAP_FAILOVER_MAX_BACKOFF = env.float('LDAP_FAILOVER_MAX_BACKOFF', 60)
+
+# Offline logins - passwords verified by the DC within OFFLINE_CACHE_MAX_AGE
+# seconds are accepted while no DC can be reached (see authentication.offline)
+AUTH_LDAP_OFFLINE_CACHE_MAX_AGE = env.int('LDAP_OFFLINE_CACHE_MAX_AGE', 0)  # Seconds, 0 disables
+
+# Admission control (see authentication.admission) - at most
+# ADMISSION_MAX_CONCURRENT logins and other LDAP work reach the DC at once from
+# all the workers on this host; the rest wait up to ADMISSION_TIMEOUT seconds
+# for a slot and are then refused with 503. ADMISSION_DIR holds the slots and
+# the rate limit buckets and must be shared by the workers of this host only.
+AUTH_LDAP_ADMISSION_MAX_CONCURRENT = env.int('LDAP_ADMISSION_MAX_CONCURRENT', 8)  # 0 disables
+AUTH_LDAP_ADMISSION_TIMEOUT = env.float('LDAP_ADMISSION_TIMEOUT', 3)
+AUTH_LDAP_ADMISSION_DIR = env.get('LDAP_ADMISSION_DIR', '/tmp/django_ldap_admission')
+# Password checks per minute per username and per client address, with bursts;
+# over the rate a login is refused with 429 before the DC is contacted
+AUTH_LDAP_THROTTLE_USER_RATE = env.float('LDAP_THROTTLE_USER_RATE', 10)  # 0 disables
+AUTH_LDAP_THROTTLE_USER_BURST = env.int('LDAP_THROTTLE_USER_BURST', 5)
+AUTH_LDAP_THROTTLE_IP_RATE = env.float('LDAP_THROTTLE_IP_RATE', 300)  # 0 disables
+AUTH_LDAP_THROTTLE_IP_BURST = env.int('LDAP_THROTTLE_IP_BURST', 60)
+
+# LDAP connection pool - kept per gunicorn worker
+AUTH_LDAP_POOL_SIZE = env.int('LDAP_POOL_SIZE', 4)  # Idle connections kept per server
+AUTH_LDAP_POOL_IDLE_TIMEOUT = env.int('LDAP_POOL_IDLE_TIMEOUT', 300)  # Seconds before an idle connection is closed
+AUTH_LDAP_POOL_HEALTH_CHECK_INTERVAL = env.int('LDAP_POOL_HEALTH_CHECK_INTERVAL', 30)  # Idle seconds before a whoami check
+AUTH_LDAP_POOL_RETRY_MAX = env.int('LDAP_POOL_RETRY_MAX', 1)  # Reconnect attempts after the server drops a connection
+
+# Bulk user sync (manage.py ldap_sync, see authentication.sync) - users synced
+# by a run completed within SYNC_MAX_AGE seconds only have their flags updated
+# at login
+AUTH_LDAP_SYNC_PAGE_SIZE = env.int('LDAP_SYNC_PAGE_SIZE', 500)  # AD returns at most 1000 per page
+AUTH_LDAP_SYNC_MAX_AGE = env.int('LDAP_SYNC_MAX_AGE', 3600)  # Seconds, 0 always re-populates
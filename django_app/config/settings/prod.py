@@ -0,0 +1,32 @@
+"""
+Production profile: the container and the systemd unit.
+
+LDAP is always on, the SQLite production profile is the default, and
+warnings and errors are logged to stderr for gunicorn to collect.
+"""
+
+from config.sqlite import production_profile
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, SQLITE_PRAGMAS, env
+from .ldap import *  # noqa: F401,F403
+
+PROFILE = 'prod'
+
+SQLITE_PROFILE = env.get('DJANGO_SQLITE_PROFILE', 'production')
+if SQLITE_PROFILE == 'production' and not SQLITE_PRAGMAS:
+    SQLITE_PRAGMAS = production_profile(DATABASES['default'], env)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': env.get('DJANGO_LOG_LEVEL', 'WARNING'),
+    },
+}
@@ -0,0 +1,42 @@
+"""
+SQLite connection tuning.
+
+apply_pragmas() is connected to Django's connection_created signal (see
+authentication.apps) and runs the PRAGMA statements from the SQLITE_PRAGMAS
+setting on every new SQLite connection. production_profile() builds the
+settings' production profile: WAL journaling, a busy timeout, larger caches
+and persistent connections.
+"""
+
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def production_profile(database, env):
+    """
+    Makes the connections of the database settings dict persistent and
+    returns the PRAGMAs of the production profile.
+    """
+    database['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', 600)
+    database['CONN_HEALTH_CHECKS'] = True
+
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable in WAL mode except on power loss
+        'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -20000,  # Negative means KiB, so ~20 MB per connection
+        'temp_store': 'MEMORY',
+    }
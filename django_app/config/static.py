@@ -0,0 +1,237 @@
+"""
+Static files served in front of Django.
+
+The container has no nginx, so gunicorn serves /static/ itself. StaticFiles
+indexes STATIC_ROOT, as collectstatic left it, once when the application is
+loaded, and answers requests under STATIC_URL before they reach Django: no
+middleware, URL resolution or view runs for them.
+
+- files under the hashed names in staticfiles.json never change, so they are
+  sent with a year's max-age and immutable; anything else with
+  STATIC_MAX_AGE, after which the client revalidates
+- every representation has a strong ETag and a Last-Modified date, so
+  If-None-Match and If-Modified-Since are answered with 304
+- the .br or .gz variant written by collectstatic (see config.storage) is sent
+  to clients that accept it
+- a path that is not in the index gets 404, and only GET and HEAD are allowed
+
+If STATIC_ROOT has not been collected the index is empty and requests pass
+through to Django, as before. wrap_wsgi() and wrap_asgi() put StaticFiles in
+front of the two applications (see config.wsgi and config.asgi).
+"""
+
+import json
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+
+from django.conf import settings
+
+# Suffix of a precompressed variant -> its content-coding, in order of
+# preference (see config.storage)
+ENCODINGS = {'.br': 'br', '.gz': 'gzip'}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+MANIFEST_NAME = 'staticfiles.json'
+
+
+class StaticFile:
+    """One file in the index and its precompressed variants."""
+
+    __slots__ = ('path', 'mtime', 'headers', 'variants')
+
+    def __init__(self, path, cache_control):
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(path)
+
+        self.path = path
+        self.mtime = int(stat.st_mtime)
+        self.headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control', cache_control),
+            ('Last-Modified', formatdate(self.mtime, usegmt=True)),
+            ('X-Content-Type-Options', 'nosniff'),
+        ]
+        # Content-coding -> (path, size, ETag), None for the file itself
+        etag = '{:x}-{:x}'.format(self.mtime, stat.st_size)
+        self.variants = {None: (path, stat.st_size, '"{}"'.format(etag))}
+        for suffix, coding in ENCODINGS.items():
+            if os.path.isfile(path + suffix):
+                self.variants[coding] = (
+                    path + suffix, os.path.getsize(path + suffix), '"{}-{}"'.format(etag, coding),
+                )
+
+        if len(self.variants) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    def variant(self, accept_encoding):
+        """The coding of the variant to send for an Accept-Encoding header."""
+        accepted = set()
+        for item in (accept_encoding or '').split(','):
+            coding, _, params = item.partition(';')
+            name, _, value = params.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    if float(value) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            accepted.add(coding.strip().lower())
+
+        # ENCODINGS is in order of preference
+        for coding in ENCODINGS.values():
+            if coding in self.variants and (coding in accepted or '*' in accepted):
+                return coding
+        return None
+
+    def not_modified(self, etag, if_none_match, if_modified_since):
+        """Whether the conditional headers of a request match the variant."""
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or 'W/' + etag in tags
+
+        if if_modified_since is not None:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+
+class StaticFiles:
+    """The index of STATIC_ROOT and the responses for requests under STATIC_URL."""
+
+    def __init__(self, root, prefix, max_age=60):
+        self.prefix = prefix
+        self.files = {}
+
+        if not os.path.isdir(root):
+            return
+
+        hashed = set()
+        manifest = os.path.join(root, MANIFEST_NAME)
+        if os.path.isfile(manifest):
+            with open(manifest) as f:
+                hashed.update(json.load(f).get('paths', {}).values())
+
+        revalidate = 'public, max-age={}'.format(max_age)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name == MANIFEST_NAME or self._is_variant(path):
+                    continue
+                self.files[prefix + name] = StaticFile(path, IMMUTABLE if name in hashed else revalidate)
+
+    @staticmethod
+    def _is_variant(path):
+        base, suffix = os.path.splitext(path)
+        return suffix in ENCODINGS and os.path.isfile(base)
+
+    def handles(self, path):
+        """Whether a request for path is answered here rather than by Django."""
+        return bool(self.files) and path.startswith(self.prefix)
+
+    def respond(self, method, path, header):
+        """
+        Returns (status, headers, file to send or None) for a request that
+        handles() accepted. header(name) returns a request header or None.
+        """
+        static_file = self.files.get(path)
+        if static_file is None:
+            return HTTPStatus.NOT_FOUND, [('Content-Length', '0')], None
+        if method not in ('GET', 'HEAD'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, [('Allow', 'GET, HEAD'), ('Content-Length', '0')], None
+
+        coding = static_file.variant(header('Accept-Encoding'))
+        path, size, etag = static_file.variants[coding]
+        headers = static_file.headers + [('ETag', etag)]
+
+        if static_file.not_modified(etag, header('If-None-Match'), header('If-Modified-Since')):
+            return HTTPStatus.NOT_MODIFIED, headers, None
+
+        headers.append(('Content-Length', str(size)))
+        if coding is not None:
+            headers.append(('Content-Encoding', coding))
+        return HTTPStatus.OK, headers, None if method == 'HEAD' else path
+
+
+def from_settings():
+    """A StaticFiles for the settings, or None if static serving is off."""
+    if not getattr(settings, 'STATIC_SERVE', False) or not settings.STATIC_URL.startswith('/'):
+        return None
+
+    static = StaticFiles(str(settings.STATIC_ROOT), settings.STATIC_URL, settings.STATIC_MAX_AGE)
+    return static if static.files else None
+
+
+def _read_chunks(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def wrap_wsgi(application):
+    """Returns the WSGI application with static files served in front of it."""
+    static = from_settings()
+    if static is None:
+        return application
+
+    def static_application(environ, start_response):
+        # PATH_INFO holds the URL's bytes as latin-1
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', 'replace')
+        if not static.handles(path):
+            return application(environ, start_response)
+
+        status, headers, filename = static.respond(
+            environ['REQUEST_METHOD'], path,
+            lambda name: environ.get('HTTP_' + name.upper().replace('-', '_')),
+        )
+        start_response('{} {}'.format(status.value, status.phrase), headers)
+        if filename is None:
+            return []
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            # sendfile() under gunicorn
+            return file_wrapper(open(filename, 'rb'), CHUNK_SIZE)
+        return _read_chunks(filename)
+
+    return static_application
+
+
+def wrap_asgi(application):
+    """Returns the ASGI application with static files served in front of it."""
+    static = from_settings()
+    if static is None:
+        return application
+
+    async def static_application(scope, receive, send):
+        if scope['type'] != 'http' or not static.handles(scope['path']):
+            return await application(scope, receive, send)
+
+        headers = {}
+        for name, value in scope['headers']:
+            headers[name.decode('latin-1').lower()] = value.decode('latin-1')
+
+        status, response_headers, filename = static.respond(
+            scope['method'], scope['path'], lambda name: headers.get(name.lower()),
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status.value,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers],
+        })
+        if filename is not None:
+            # Small files, usually in the page cache: read on the event loop
+            for chunk in _read_chunks(filename):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    return static_application
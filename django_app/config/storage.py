@@ -0,0 +1,92 @@
+"""
+Static files storage for collectstatic.
+
+CompressedManifestStaticFilesStorage is Django's ManifestStaticFilesStorage
+(content-hashed copies of every file, e.g. admin/css/base.5af66c1b1797.css,
+and staticfiles.json mapping the original names to them) that then writes a
+gzip and, if the brotli package is installed, a brotli variant next to each
+compressible file. config.static serves the variants to clients that accept
+them, so nothing is compressed per request.
+
+Without a manifest, i.e. before collectstatic has run (development,
+benchmarks), {% static %} returns the original names instead of failing.
+"""
+
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = frozenset([
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.eot', '.ttf', '.otf',
+])
+
+# Smaller files fit in a packet either way
+MIN_COMPRESS_SIZE = 256
+
+
+def compress(data):
+    """Yields (suffix, compressed data) for each variant worth keeping."""
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        yield '.gz', compressed
+
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            yield '.br', compressed
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br variants."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest_found = self.manifest_storage.exists(self.manifest_name)
+
+    def stored_name(self, name):
+        if not self.manifest_found:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        for name in sorted(names):
+            self.compress(name)
+
+        self.manifest_found = True
+
+    def compress(self, name):
+        """Writes the variants of name worth keeping. Returns their names."""
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return []
+
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+
+        written = []
+        for suffix, compressed in compress(data):
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            written.append(compressed_name)
+        return written
@@ -0,0 +1,210 @@
+"""
+Tests for config.keyvault.
+
+Key Vault is replaced by stub clients like those of
+benchmarks/keyvault_startup.py, so neither Azure access nor the Azure SDK is
+needed. The cache tests need cryptography.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from config import keyvault
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+VAULT_URL = 'https://rule4.vault.azure.net/'
+OTHER_VAULT_URL = 'https://other.vault.azure.net/'
+
+SECRETS = {'ldap-bind-password': 'LDAP_BIND_PASSWORD', 'django-secret-key': 'DJANGO_SECRET_KEY'}
+VALUES = {'LDAP_BIND_PASSWORD': 'value-of-ldap-bind-password', 'DJANGO_SECRET_KEY': 'value-of-django-secret-key'}
+
+
+class NotFound(Exception):
+    """Stands in for azure.core.exceptions.ResourceNotFoundError."""
+
+
+class StubSecret:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class StubSecretClient:
+    """Synchronous stand-in for azure.keyvault.secrets.SecretClient."""
+
+    def __init__(self, missing=(), failing=(), empty=()):
+        self.missing = missing
+        self.failing = failing
+        self.empty = empty
+        self.requested = []
+
+    def secret(self, name):
+        self.requested.append(name)
+        if name in self.missing:
+            raise NotFound(name)
+        if name in self.failing:
+            raise OSError('connection reset')
+        return StubSecret(name, '' if name in self.empty else 'value-of-{}'.format(name))
+
+    def get_secret(self, name):
+        return self.secret(name)
+
+
+class AsyncStubSecretClient(StubSecretClient):
+    """Async stand-in for azure.keyvault.secrets.aio.SecretClient; counts requests in flight."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = self.max_in_flight = 0
+
+    async def get_secret(self, name):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return self.secret(name)
+        finally:
+            self.in_flight -= 1
+
+
+class FetchSecretsTests(SimpleTestCase):
+    """The sequential and concurrent fetches, with secrets that are missing or fail."""
+
+    def fetch_concurrent(self, client):
+        return asyncio.run(keyvault.fetch_secrets_concurrent(client, SECRETS))
+
+    def test_concurrent_matches_sequential(self):
+        sequential = keyvault.fetch_secrets_sequential(StubSecretClient(), SECRETS)
+        client = AsyncStubSecretClient()
+
+        self.assertEqual(sequential, VALUES)
+        self.assertEqual(self.fetch_concurrent(client), sequential)
+        # Every request was in flight at once
+        self.assertEqual(client.max_in_flight, len(SECRETS))
+
+    def test_missing_secret_left_out(self):
+        expected = {'DJANGO_SECRET_KEY': VALUES['DJANGO_SECRET_KEY']}
+
+        client = StubSecretClient(missing={'ldap-bind-password'})
+        self.assertEqual(keyvault.fetch_secrets_sequential(client, SECRETS), expected)
+        # The rest are still fetched
+        self.assertEqual(client.requested, list(SECRETS))
+        self.assertEqual(self.fetch_concurrent(AsyncStubSecretClient(missing={'ldap-bind-password'})), expected)
+
+    def test_failing_secret_left_out(self):
+        expected = {'LDAP_BIND_PASSWORD': VALUES['LDAP_BIND_PASSWORD']}
+
+        client = StubSecretClient(failing={'django-secret-key'})
+        self.assertEqual(keyvault.fetch_secrets_sequential(client, SECRETS), expected)
+        self.assertEqual(self.fetch_concurrent(AsyncStubSecretClient(failing={'django-secret-key'})), expected)
+
+    def test_empty_secret_left_out(self):
+        expected = {'LDAP_BIND_PASSWORD': VALUES['LDAP_BIND_PASSWORD']}
+
+        client = StubSecretClient(empty={'django-secret-key'})
+        self.assertEqual(keyvault.fetch_secrets_sequential(client, SECRETS), expected)
+        self.assertEqual(self.fetch_concurrent(AsyncStubSecretClient(empty={'django-secret-key'})), expected)
+
+
+@skipUnless(Fernet, 'cryptography is not installed')
+class SecretCacheTests(SimpleTestCase):
+    """load_secrets() and the encrypted cache file."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.environ = {
+            'AZURE_KEY_VAULT_URL': VAULT_URL,
+            'KEY_VAULT_CACHE_KEY': Fernet.generate_key().decode(),
+            'KEY_VAULT_CACHE_FILE': os.path.join(tmp.name, 'keyvault.cache'),
+        }
+        patcher = mock.patch.object(keyvault, 'fetch_secrets', return_value=VALUES)
+        self.fetch_secrets = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_hit_skips_fetch(self):
+        self.assertEqual(keyvault.load_secrets(self.environ), VALUES)
+        self.assertEqual(self.fetch_secrets.call_count, 1)
+
+        self.assertEqual(keyvault.load_secrets(self.environ), VALUES)
+        self.assertEqual(self.fetch_secrets.call_count, 1)
+
+    def test_expired_cache_ignored(self):
+        keyvault.write_cache(VAULT_URL, {'LDAP_BIND_PASSWORD': 'stale'}, self.environ)
+        self.environ['KEY_VAULT_CACHE_TTL'] = '300'
+
+        # Fernet dates its tokens, and decrypt() checks them against the clock
+        with mock.patch('time.time', return_value=time.time() + 301):
+            self.assertIsNone(keyvault.read_cache(VAULT_URL, self.environ))
+            self.assertEqual(keyvault.load_secrets(self.environ), VALUES)
+        self.assertEqual(self.fetch_secrets.call_count, 1)
+
+    def test_other_vaults_cache_ignored(self):
+        keyvault.write_cache(OTHER_VAULT_URL, {'LDAP_BIND_PASSWORD': 'other'}, self.environ)
+
+        self.assertIsNone(keyvault.read_cache(VAULT_URL, self.environ))
+        self.assertEqual(keyvault.load_secrets(self.environ), VALUES)
+        self.assertEqual(self.fetch_secrets.call_count, 1)
+
+    def test_cache_under_another_key_ignored(self):
+        keyvault.write_cache(VAULT_URL, {'LDAP_BIND_PASSWORD': 'other'}, self.environ)
+        self.environ['KEY_VAULT_CACHE_KEY'] = Fernet.generate_key().decode()
+
+        self.assertEqual(keyvault.load_secrets(self.environ), VALUES)
+        self.assertEqual(self.fetch_secrets.call_count, 1)
+
+    def test_no_cache_without_key(self):
+        del self.environ['KEY_VAULT_CACHE_KEY']
+
+        keyvault.load_secrets(self.environ)
+        keyvault.load_secrets(self.environ)
+        self.assertEqual(self.fetch_secrets.call_count, 2)
+        self.assertFalse(os.path.exists(self.environ['KEY_VAULT_CACHE_FILE']))
+
+    def test_failed_fetch_loads_nothing(self):
+        self.fetch_secrets.side_effect = OSError('vault unreachable')
+
+        self.assertEqual(keyvault.load_secrets(self.environ), {})
+        self.assertFalse(os.path.exists(self.environ['KEY_VAULT_CACHE_FILE']))
+
+
+class CredentialTests(SimpleTestCase):
+    """One credential per process, shared by the async clients."""
+
+    def setUp(self):
+        patcher = mock.patch.object(keyvault, '_credential', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_credential_per_process(self):
+        with mock.patch.object(keyvault, '_make_credential', side_effect=lambda environ: object()) as make:
+            credential = keyvault.get_credential()
+
+            self.assertIs(keyvault.get_credential(), credential)
+            self.assertIs(keyvault.get_credential({'AZURE_KEY_VAULT_CREDENTIAL': 'managed-identity'}), credential)
+        self.assertEqual(make.call_count, 1)
+
+    def test_async_credential_uses_process_credential(self):
+        credential = mock.Mock()
+        credential.get_token.return_value = 'token'
+
+        async def get_tokens():
+            # A new wrapper per fetch, as each fetch_secrets() runs its own loop
+            async with keyvault._AsyncCredential(credential) as first:
+                token = await first.get_token('https://vault.azure.net/.default')
+            async with keyvault._AsyncCredential(credential) as second:
+                await second.get_token('https://vault.azure.net/.default')
+            return token
+
+        self.assertEqual(asyncio.run(get_tokens()), 'token')
+        self.assertEqual(credential.get_token.call_count, 2)
+        credential.close.assert_not_called()
@@ -1,8 +1,14 @@
 """URL configuration for the project."""
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from authentication.views import login_view, logout_view, home, test_ldap
+from authentication.views import metrics
+
+if settings.ASYNC_VIEWS:
+    from authentication.async_views import login_view, logout_view, home, test_ldap
+else:
+    from authentication.views import login_view, logout_view, home, test_ldap
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,4 +16,5 @@ urlpatterns = [
     path('login/', login_view, name='login'),
     path('logout/', logout_view, name='logout'),
     path('test-ldap/', test_ldap, name='test-ldap'),
+    path('metrics', metrics, name='metrics'),
 ] 
\ No newline at end of file
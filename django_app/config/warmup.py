@@ -0,0 +1,50 @@
+"""
+Template warm-up at worker boot.
+
+With the cached template loader each worker compiles a template the first
+time it is rendered, so the first visitors after a (re)start pay for it.
+warm_templates() compiles everything in settings.TEMPLATE_WARMUP up front,
+following {% extends %} and {% include %} tags with literal template names so
+that the base templates are compiled too.
+"""
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, engines
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+
+def _referenced_templates(template):
+    """Yield the literal template names a compiled template extends or includes."""
+    for node_type, attr in ((ExtendsNode, 'parent_name'), (IncludeNode, 'template')):
+        for node in template.nodelist.get_nodes_by_type(node_type):
+            expression = getattr(node, attr)
+            if isinstance(expression.var, str):
+                yield expression.var
+
+
+def warm_templates(names=None):
+    """
+    Compile the given templates (default: settings.TEMPLATE_WARMUP) and
+    everything they extend or include. Returns the number compiled.
+    """
+    if names is None:
+        names = getattr(settings, 'TEMPLATE_WARMUP', [])
+
+    engine = engines['django'].engine
+    pending = list(names)
+    seen = set()
+
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+
+        try:
+            template = engine.get_template(name)
+        except TemplateDoesNotExist:
+            continue
+
+        pending.extend(_referenced_templates(template))
+
+    return len(seen)
@@ -8,4 +8,14 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_wsgi_application() 
\ No newline at end of file
+application = get_wsgi_application()
+
+# Compile the hot templates now rather than on the first requests
+from config.warmup import warm_templates  # noqa: E402
+
+warm_templates()
+
+# Serve /static/ from STATIC_ROOT without going through Django
+from config.static import wrap_wsgi  # noqa: E402
+
+application = wrap_wsgi(application) 
\ No newline at end of file
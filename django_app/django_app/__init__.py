@@ -1 +0,0 @@
-# Django app package 
\ No newline at end of file
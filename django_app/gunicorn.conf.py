@@ -0,0 +1,123 @@
+"""
+gunicorn runtime profile.
+
+gunicorn reads this file from the working directory (or --config). Every
+value can be set from the environment, so the Docker image, the systemd unit
+and the benchmarks share one configuration:
+
+- GUNICORN_BIND: address to listen on (default 0.0.0.0:8000)
+- DJANGO_SERVER: 'wsgi' for sync/gthread workers, 'asgi' for uvicorn workers
+- GUNICORN_WORKERS: worker processes (default 2 x CPUs + 1, at most 8)
+- GUNICORN_THREADS: threads per WSGI worker; above 1 uses gthread workers
+- GUNICORN_PRELOAD: load the application once in the master (default true)
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER: recycle a worker
+  after this many requests, give or take the jitter so that the workers do
+  not all restart together (default 1000 / 100; 0 disables)
+- GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT / GUNICORN_KEEPALIVE
+
+With preload the master imports Django, the settings and (in when_ready)
+the LDAP backend, and freezes them out of the garbage collector, so the
+workers share those pages copy-on-write instead of each importing them.
+Either way the master resolves config.environment before forking. Forked
+workers must not use what the master had open: the hooks below drop the
+inherited database handles, LDAP connection pools and LDAP thread pool.
+"""
+
+import gc
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    # Honours CPU affinity (e.g. docker --cpuset-cpus)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+SERVER = os.environ.get('DJANGO_SERVER', 'wsgi')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Capped because each worker keeps its own LDAP and SQLite connections
+workers = _env_int('GUNICORN_WORKERS', min(2 * _cpu_count() + 1, 8))
+threads = _env_int('GUNICORN_THREADS', 1)
+
+if SERVER == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100) if max_requests else 0
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Worker heartbeat files go to memory: on a slow container filesystem the
+# master can mistake a healthy worker for a stuck one
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def on_starting(server):
+    # Resolve .env, the environment and Key Vault once, before any fork, so
+    # that workers inherit the result even without preload
+    from config.environment import load
+    load()
+
+    # Samples left by a previous run would be added to this one's
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+
+    # Import the LDAP backend (python-ldap, django_auth_ldap, the pools) once
+    # here rather than in every worker on its first login
+    import authentication.backends  # noqa: F401
+
+    # Nothing in the master should have touched the database, but a
+    # connection carried across fork would be shared by every worker
+    from django.db import connections
+    connections.close_all()
+
+    # Keep the collector from writing to the shared objects in the workers,
+    # which would copy their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+
+    # Inherited handles belong to the master: forget them without closing
+    from django.db import connections
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+    # Also registered with os.register_at_fork; repeated here so that the
+    # reset does not depend on how the worker was forked
+    from authentication.executor import reset_executor
+    from authentication.pool import reset_pools
+    reset_pools()
+    reset_executor()
+
+
+def child_exit(server, worker):
+    from authentication.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -2,13 +2,45 @@
 """
 Django Environment Setup Script
 Retrieves secrets from Azure Key Vault and sets up Django environment
+
+Secrets are fetched in one batch with the Key Vault SDK, in-process and
+concurrently, instead of starting an `az` CLI process per secret. If the SDK
+is not installed, the `az` CLI is used as before, with the calls run in
+parallel. Pass --timing to see how long each phase took.
 """
 
+import argparse
 import os
-import sys
+import socket
 import subprocess
-import json
-from pathlib import Path
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+ENV_FILE_PATH = '/opt/django/app/.env'
+
+# Define secrets to retrieve
+SECRETS = {
+    'DJANGO_SECRET_KEY': 'django-secret-key-1',
+    'DJANGO_ADMIN_PASSWORD': 'django-admin-password-1',
+    'DOMAIN_ADMIN_PASSWORD': 'domain-admin-password-1',
+    'LDAP_BIND_PASSWORD': 'ldap-bind-password-1'
+}
+
+timings = []
+
+
+@contextmanager
+def phase(name):
+    """Record how long a setup phase takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, time.perf_counter() - start))
+
 
 def run_command(cmd, check=True):
     """Run a shell command and return the result"""
@@ -22,8 +54,9 @@ def run_command(cmd, check=True):
             raise
         return None
 
+
 def get_azure_secret(vault_name, secret_name):
-    """Retrieve a secret from Azure Key Vault"""
+    """Retrieve a secret from Azure Key Vault with the az CLI"""
     try:
         # Use managed identity to authenticate
         cmd = f"az keyvault secret show --vault-name {vault_name} --name {secret_name} --query value -o tsv"
@@ -33,58 +66,92 @@ def get_azure_secret(vault_name, secret_name):
         print(f"Failed to retrieve secret {secret_name}: {e}")
         return None
 
-def setup_environment():
+
+def get_azure_secrets(vault_name, secrets):
+    """
+    Retrieve several secrets at once. Returns a dict keyed by environment
+    variable name; secrets that could not be retrieved are left out.
+    """
+    try:
+        from config.keyvault import fetch_secrets
+        import azure.keyvault.secrets  # noqa: F401
+    except ImportError:
+        fetch_secrets = None
+
+    if fetch_secrets is not None:
+        vault_url = f"https://{vault_name}.vault.azure.net/"
+        return fetch_secrets(vault_url, {secret: env for env, secret in secrets.items()})
+
+    # No SDK available - fall back to the az CLI, one process per secret in parallel
+    with ThreadPoolExecutor(max_workers=len(secrets)) as executor:
+        values = dict(zip(secrets, executor.map(
+            lambda secret_name: get_azure_secret(vault_name, secret_name), secrets.values())))
+
+    return {env_name: value for env_name, value in values.items() if value}
+
+
+def detect_workspace():
+    """Determine the POC workspace from the hostname"""
+    hostname = socket.gethostname()
+    if "poc1" in hostname:
+        return "poc1"
+    elif "poc2" in hostname:
+        return "poc2"
+    elif "poc3" in hostname:
+        return "poc3"
+    return "poc1"  # default
+
+
+def write_env_file(path, env_vars):
+    """Write the environment file atomically via a temp file and rename"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.env.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for key, value in env_vars.items():
+                f.write(f"{key}={value}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def setup_environment(env_file_path=ENV_FILE_PATH):
     """Setup Django environment with secrets from Key Vault"""
-    
+
     # Get Key Vault name from environment or metadata
     vault_name = os.environ.get('KEY_VAULT_NAME')
     if not vault_name:
-        # Try to get from Azure metadata
-        try:
-            # Get the workspace from hostname or other method
-            hostname = run_command("hostname")
-            if "poc1" in hostname:
-                workspace = "poc1"
-            elif "poc2" in hostname:
-                workspace = "poc2"
-            elif "poc3" in hostname:
-                workspace = "poc3"
-            else:
-                workspace = "poc1"  # default
-            
-            # Try to find the key vault
-            vaults = run_command(f"az keyvault list --query \"[?contains(name, '{workspace}')].name\" -o tsv")
-            if vaults:
-                vault_name = vaults.split('\n')[0]
-        except:
-            print("Could not determine Key Vault name")
-            return False
-    
+        with phase('vault discovery'):
+            try:
+                # Get the workspace from hostname and find the key vault
+                workspace = detect_workspace()
+                vaults = run_command(f"az keyvault list --query \"[?contains(name, '{workspace}')].name\" -o tsv")
+                if vaults:
+                    vault_name = vaults.split('\n')[0]
+            except Exception:
+                print("Could not determine Key Vault name")
+                return False
+
     if not vault_name:
         print("Key Vault name not found")
         return False
-    
+
     print(f"Using Key Vault: {vault_name}")
-    
-    # Define secrets to retrieve
-    secrets = {
-        'DJANGO_SECRET_KEY': 'django-secret-key-1',
-        'DJANGO_ADMIN_PASSWORD': 'django-admin-password-1',
-        'DOMAIN_ADMIN_PASSWORD': 'domain-admin-password-1',
-        'LDAP_BIND_PASSWORD': 'ldap-bind-password-1'
-    }
-    
+
     # Retrieve secrets
-    env_vars = {}
-    for env_name, secret_name in secrets.items():
-        secret_value = get_azure_secret(vault_name, secret_name)
-        if secret_value:
-            env_vars[env_name] = secret_value
+    with phase('secret fetch'):
+        env_vars = get_azure_secrets(vault_name, SECRETS)
+
+    for env_name in SECRETS:
+        if env_name in env_vars:
             print(f"Retrieved {env_name}")
         else:
             print(f"Failed to retrieve {env_name}")
             return False
-    
+
     # Add other environment variables
     env_vars.update({
         'DJANGO_DEBUG': 'False',
@@ -95,23 +162,22 @@ def setup_environment():
         'LDAP_GROUP_SEARCH_BASE': 'CN=Users,DC=rule4,DC=local',
         'DATABASE_URL': 'sqlite:///db.sqlite3'
     })
-    
+
     # Write environment file
-    env_file_path = '/opt/django/app/.env'
-    with open(env_file_path, 'w') as f:
-        for key, value in env_vars.items():
-            f.write(f"{key}={value}\n")
-    
+    with phase('env file write'):
+        write_env_file(env_file_path, env_vars)
+
     print(f"Environment file created: {env_file_path}")
-    
+
     return True
 
+
 def create_superuser():
     """Create Django superuser"""
     try:
         # Change to Django directory
         os.chdir('/opt/django/app')
-        
+
         print("Secrets setup completed successfully!")
         return True
     except Exception as e:
@@ -119,8 +185,28 @@ def create_superuser():
         print(f"Error: {e}")
         return False
 
+
+def print_timings():
+    """Report how long each phase took"""
+    for name, seconds in timings:
+        print(f"  {name:<16} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<16} {sum(seconds for _, seconds in timings) * 1000:8.1f} ms")
+
+
 if __name__ == "__main__":
-    if setup_environment():
+    parser = argparse.ArgumentParser(description="Retrieve Key Vault secrets and write the Django .env file")
+    parser.add_argument('--timing', action='store_true', help="Report how long each phase took")
+    parser.add_argument('--env-file', default=ENV_FILE_PATH, help=f"Environment file to write (default: {ENV_FILE_PATH})")
+    args = parser.parse_args()
+
+    # Make config.keyvault importable when run from another directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    ok = setup_environment(args.env_file)
+    if args.timing:
+        print_timings()
+
+    if ok:
         create_superuser()
     else:
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
@@ -94,19 +94,10 @@ resource "azurerm_virtual_machine_extension" "django_setup" {
       log "Installing Azure CLI..."
       curl -sL https://aka.ms/InstallAzureCLIDeb | bash
       
-      # Create django user if it doesn't exist - fix the user creation
-      log "Creating django user..."
-      if ! getent passwd django > /dev/null 2>&1; then
-        useradd --system --shell /bin/bash --home /opt/django --create-home django
-        log "Django user created successfully"
-      else
-        log "Django user already exists"
-      fi
-      
-      # Setup Django application
+      # The shipped gunicorn.service and nginx.conf expect the app in
+      # /home/azureadmin/django_app, run by azureadmin from /home/azureadmin/venv
       log "Setting up Django application..."
-      mkdir -p /opt/django
-      cd /opt/django
+      cd /home/azureadmin
       
       # Clone or update repository
       if [ ! -d "app" ]; then
@@ -116,8 +107,7 @@ resource "azurerm_virtual_machine_extension" "django_setup" {
         log "Updating repository..."
         cd app && git pull && cd ..
       fi
-      
-      cd app/django_app
+      ln -sfn /home/azureadmin/app/django_app /home/azureadmin/django_app
       
       # Create virtual environment if it doesn't exist
       log "Creating Python virtual environment..."
@@ -125,12 +115,11 @@ resource "azurerm_virtual_machine_extension" "django_setup" {
         python3 -m venv venv
       fi
       
-      # Activate virtual environment and install dependencies - use . instead of source for sh compatibility
+      # requirements.txt has gunicorn, uvicorn, django-auth-ldap and python-ldap
       log "Installing Python dependencies..."
       . venv/bin/activate
       pip install --upgrade pip
-      pip install -r requirements.txt gunicorn
-      pip install django-auth-ldap python-ldap  # Install LDAP packages
+      pip install -r app/django_app/requirements.txt
       
       # Get LDAP bind password from Key Vault using managed identity
       log "Retrieving LDAP bind password from Key Vault..."
@@ -149,103 +138,36 @@ resource "azurerm_virtual_machine_extension" "django_setup" {
       
       log "Successfully retrieved LDAP bind password"
       
-      # Create environment file with all required variables
+      # config.environment reads .env from the app directory; the profile,
+      # bind address and static serving come from gunicorn.service
       log "Creating environment configuration..."
-      cat > /opt/django/.env << EOL
+      cd /home/azureadmin/django_app
+      cat > .env << EOL
 DJANGO_SECRET_KEY=${random_password.django_admin.result}
-DEBUG=False
 ALLOWED_HOSTS=${local.django_instance_ips[0]},localhost,${azurerm_public_ip.django.ip_address}
 LDAP_SERVER_URI=ldap://${local.domain_controller_ip}:389
 LDAP_BIND_DN=CN=django,CN=Users,DC=rule4,DC=local
 LDAP_BIND_PASSWORD=$LDAP_BIND_PASSWORD
-RUNNING_IN_PRODUCTION=1
-EOL
-      
-      # Django setup
-      log "Running Django migrations and collecting static files..."
-      python manage.py collectstatic --noinput
-      python manage.py migrate
-      
-      # Create Django superuser and test LDAP connection
-      log "Creating Django superuser and testing LDAP..."
-      python manage.py shell << PYTHON_EOF
-from django.contrib.auth.models import User
-import os
-
-# Create local Django superuser 'fox' with hardcoded password
-if not User.objects.filter(username='fox').exists():
-    User.objects.create_superuser('fox', 'fox@rule4.local', 'FoxAdmin2025!')
-    print("Created Django superuser 'fox' with password 'FoxAdmin2025!'")
-else:
-    print("Django superuser 'fox' already exists")
-
-# Test LDAP connection
-try:
-    import ldap
-    from django_auth_ldap.config import LDAPSearch
-    
-    # Test basic LDAP connection
-    ldap_uri = os.environ.get('LDAP_SERVER_URI')
-    bind_dn = os.environ.get('LDAP_BIND_DN')
-    bind_password = os.environ.get('LDAP_BIND_PASSWORD')
-    
-    print(f"Testing LDAP connection to {ldap_uri}")
-    conn = ldap.initialize(ldap_uri)
-    conn.simple_bind_s(bind_dn, bind_password)
-    print("LDAP connection successful!")
-    conn.unbind()
-    
-except Exception as e:
-    print(f"LDAP connection test failed: {e}")
-    print("Django will fall back to local authentication")
-
-PYTHON_EOF
-      
-      # Set ownership
-      log "Setting file permissions..."
-      chown -R django:django /opt/django
-      
-      # Create systemd service
-      log "Creating Django systemd service..."
-      cat > /etc/systemd/system/django.service << EOL
-[Unit]
-Description=Django Gunicorn Application Server
-After=network.target
-
-[Service]
-User=django
-Group=django
-WorkingDirectory=/opt/django/app/django_app
-Environment="PATH=/opt/django/app/django_app/venv/bin"
-EnvironmentFile=/opt/django/.env
-ExecStart=/opt/django/app/django_app/venv/bin/gunicorn --workers 3 --bind 0.0.0.0:8000 config.wsgi:application
-Restart=always
-RestartSec=3
-
-[Install]
-WantedBy=multi-user.target
 EOL
+      chmod 600 .env
+      chown -R azureadmin:azureadmin /home/azureadmin/app /home/azureadmin/venv
+      
+      # bootstrap migrates if the schema is out of date and creates or
+      # updates BOOTSTRAP_USERS (the local superuser 'fox')
+      log "Collecting static files and bootstrapping the database..."
+      sudo -u azureadmin DJANGO_PROFILE=prod ../venv/bin/python manage.py collectstatic --noinput
+      sudo -u azureadmin DJANGO_PROFILE=prod ../venv/bin/python manage.py bootstrap --check
+      
+      # Times each phase of a login against the domain controller
+      log "Testing LDAP..."
+      if ! sudo -u azureadmin DJANGO_PROFILE=prod ../venv/bin/python manage.py ldap_probe; then
+        log "WARNING: LDAP probe failed; only local accounts can log in"
+      fi
       
-      # Create nginx configuration
-      log "Creating Nginx configuration..."
-      cat > /etc/nginx/sites-available/django << EOL
-server {
-    listen 80;
-    server_name _;
-    
-    location / {
-        proxy_pass http://127.0.0.1:8000;
-        proxy_set_header Host \$host;
-        proxy_set_header X-Real-IP \$remote_addr;
-        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto \$scheme;
-    }
-    
-    location /static/ {
-        alias /opt/django/app/django_app/static/;
-    }
-}
-EOL
+      # Workers, threads, preload and recycling come from gunicorn.conf.py
+      log "Installing gunicorn and Nginx configuration..."
+      cp config/gunicorn.service /etc/systemd/system/gunicorn.service
+      cp config/nginx.conf /etc/nginx/sites-available/django
       
       # Enable and start services
       log "Enabling and starting services..."
@@ -253,8 +175,8 @@ EOL
       rm -f /etc/nginx/sites-enabled/default
       
       systemctl daemon-reload
-      systemctl enable django
-      systemctl start django
+      systemctl enable gunicorn
+      systemctl start gunicorn
       systemctl enable nginx
       systemctl restart nginx
       
@@ -264,11 +186,11 @@ EOL
       
       # Test Django application
       log "Testing Django application..."
-      if curl -f http://localhost:8000/ > /dev/null 2>&1; then
+      if curl -f http://localhost/login/ > /dev/null 2>&1; then
         log "Django application is running successfully!"
       else
         log "WARNING: Django application may not be running properly"
-        systemctl status django
+        systemctl status gunicorn
       fi
       
       log "Django setup completed successfully!"